@@ -0,0 +1,58 @@
+"""Formatação de logs em JSON (uma linha por registro) usando orjson."""
+import logging
+import orjson
+
+# Atributos padrão de um LogRecord; os demais vêm de extra= e viram campos do JSON
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Serializa cada registro como um objeto JSON com os campos passados em extra=."""
+    
+    def __init__(self, service: str):
+        """
+        Inicializa o formatter.
+        
+        Args:
+            service: Nome do serviço incluído em todos os registros
+        """
+        super().__init__()
+        self.service = service
+    
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Formata o registro como JSON.
+        
+        Args:
+            record: Registro de log
+        
+        Returns:
+            Linha JSON (mensagem e campos escapados corretamente)
+        """
+        entry = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "service": self.service,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+def configure_logging(service: str, level: int = logging.INFO):
+    """
+    Configura o logger raiz com um handler JSON no stderr.
+    
+    Args:
+        service: Nome do serviço incluído em todos os registros
+        level: Nível mínimo de log
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter(service))
+    logging.basicConfig(level=level, handlers=[handler])
+    # basicConfig não altera um logger raiz já configurado
+    logging.getLogger().setLevel(level)
@@ -1,21 +1,143 @@
 """Carregador de arquivos (PDFs e imagens) do S3."""
+import functools
 import hashlib
 import logging
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import boto3
 from botocore.exceptions import ClientError
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Union
+import numpy as np
 from PIL import Image
 import io
-from ..settings import settings
+from ..settings import get_settings
 
 logger = logging.getLogger(__name__)
 
+# Tamanho dos blocos usados para alimentar o hash (1 MiB cabe no cache L2)
+HASH_CHUNK_SIZE = 1 << 20
+
+# Download em faixas (ranged GET): o primeiro GET traz até RANGE_CHUNK_SIZE bytes e
+# revela o tamanho total; o restante é baixado em paralelo em faixas do mesmo tamanho
+RANGE_CHUNK_SIZE = 8 << 20
+RANGE_MAX_WORKERS = 8
+
+# Memória máxima das imagens decodificadas mantidas em cache (retries reaproveitam)
+IMAGE_CACHE_MAX_BYTES = 256 << 20
+
+# Assinaturas (magic bytes) suportadas: (offset, tamanho, assinatura) -> tipo
+_SIGS = {
+    (0, 5, b'%PDF-'): 'pdf',
+    (0, 8, b'\x89PNG\r\n\x1a\n'): 'png',
+    (0, 3, b'\xff\xd8\xff'): 'jpeg',
+}
+_IMAGE_KINDS = frozenset({'png', 'jpeg'})
+
+# Tipo de processamento por extensão do object_key e por content type (MIME)
+_EXT_TO_TYPE = {'pdf': 'pdf', 'png': 'image', 'jpg': 'image', 'jpeg': 'image'}
+_CONTENT_TYPE_TO_TYPE = {
+    'application/pdf': 'pdf',
+    'application/x-pdf': 'pdf',
+    'image/png': 'image',
+    'image/jpeg': 'image',
+    'image/jpg': 'image',
+    'image/pjpeg': 'image',
+}
+
+
+# Cache LRU de imagens decodificadas: (object_key, image_max_size) -> (ETag, array, sha256).
+# Compartilhado entre instâncias e limitado pelo tamanho dos arrays, não pelo número de itens
+_image_cache: 'OrderedDict[Tuple[str, int], Tuple[str, np.ndarray, str]]' = OrderedDict()
+_image_cache_bytes = 0
+_image_cache_lock = threading.Lock()
+
+
+def _image_cache_get(key: Tuple[str, int]) -> Optional[Tuple[str, np.ndarray, str]]:
+    """
+    Busca uma imagem decodificada no cache, marcando-a como usada.
+    
+    Args:
+        key: Tupla (object_key, image_max_size)
+    
+    Returns:
+        Tupla (ETag, array, sha256) ou None se ausente
+    """
+    with _image_cache_lock:
+        entry = _image_cache.get(key)
+        if entry is not None:
+            _image_cache.move_to_end(key)
+        return entry
+
+
+def _image_cache_put(key: Tuple[str, int], entry: Tuple[str, np.ndarray, str]):
+    """
+    Armazena uma imagem decodificada, descartando as menos usadas além do limite.
+    
+    Args:
+        key: Tupla (object_key, image_max_size)
+        entry: Tupla (ETag da resposta do GET, array, sha256)
+    """
+    global _image_cache_bytes
+    
+    size = entry[1].nbytes
+    if size > IMAGE_CACHE_MAX_BYTES:
+        return
+    with _image_cache_lock:
+        previous = _image_cache.pop(key, None)
+        if previous is not None:
+            _image_cache_bytes -= previous[1].nbytes
+        _image_cache[key] = entry
+        _image_cache_bytes += size
+        while _image_cache_bytes > IMAGE_CACHE_MAX_BYTES:
+            _, (_, evicted, _) = _image_cache.popitem(last=False)
+            _image_cache_bytes -= evicted.nbytes
+
+
+def _is_not_modified(error: ClientError) -> bool:
+    """
+    Indica se o erro é a resposta 304 de um GET condicional (If-None-Match).
+    
+    Args:
+        error: Erro retornado pelo botocore
+    
+    Returns:
+        True se o objeto não mudou desde o ETag informado
+    """
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return status == 304 or error.response.get('Error', {}).get('Code') in ('304', 'NotModified')
+
+
+def _total_size(content_range: Optional[str], default: int) -> int:
+    """
+    Extrai o tamanho total do objeto do cabeçalho Content-Range.
+    
+    Args:
+        content_range: Valor no formato 'bytes 0-8388607/12345678' (ou None)
+        default: Tamanho a usar quando o cabeçalho está ausente ou inválido
+    
+    Returns:
+        Tamanho total do objeto em bytes
+    """
+    if not content_range or '/' not in content_range:
+        return default
+    total = content_range.rsplit('/', 1)[1]
+    return int(total) if total.isdigit() else default
+
 
 class FileLoader:
     """Carrega arquivos (PDFs e imagens) do DigitalOcean Spaces."""
     
-    def __init__(self):
-        """Inicializa o cliente S3."""
+    def __init__(self, image_max_size: Optional[int] = None):
+        """
+        Inicializa o cliente S3.
+        
+        Args:
+            image_max_size: Lado maior mínimo preservado ao decodificar JPEGs
+                (padrão: settings.image_decode_max_size; 0 desativa a redução)
+        """
+        settings = get_settings()
         self.s3_client = boto3.client(
             's3',
             endpoint_url=settings.s3_endpoint,
@@ -24,59 +146,310 @@ class FileLoader:
             aws_secret_access_key=settings.s3_secret_key
         )
         self.bucket = settings.s3_bucket
+        self.image_max_size = settings.image_decode_max_size if image_max_size is None else image_max_size
     
     def download_file(self, object_key: str) -> Optional[bytes]:
         """
         Baixa um arquivo do Spaces.
         
+        O primeiro GET pede apenas os RANGE_CHUNK_SIZE bytes iniciais; arquivos
+        maiores têm as faixas restantes baixadas em paralelo (várias conexões
+        TCP) e montadas em um buffer pré-alocado, nas posições corretas.
+        
         Args:
             object_key: Chave do objeto no S3
-            
+        
         Returns:
             Dados binários do arquivo ou None em caso de erro
         """
+        return self._download(object_key, None)
+    
+    def download_file_with_hash(self, object_key: str) -> Optional[Tuple[bytes, str]]:
+        """
+        Baixa um arquivo do Spaces calculando o SHA256 durante o download.
+        
+        O corpo da resposta é lido em blocos de HASH_CHUNK_SIZE e o hash é
+        atualizado à medida que os bytes chegam, evitando uma segunda
+        passada sobre os dados.
+        
+        Args:
+            object_key: Chave do objeto no S3
+        
+        Returns:
+            Tupla (dados, sha256 em hexadecimal) ou None em caso de erro
+        """
+        h = hashlib.sha256()
+        data = self._download(object_key, h)
+        if data is None:
+            return None
+        return data, h.hexdigest()
+    
+    def _download(self, object_key: str, h) -> Optional[bytes]:
+        """
+        Executa o download em faixas, atualizando o hash se fornecido.
+        
+        Args:
+            object_key: Chave do objeto no S3
+            h: Objeto hash a ser atualizado (ou None)
+        
+        Returns:
+            Dados binários do arquivo (bytearray quando baixado em faixas)
+            ou None em caso de erro
+        """
         try:
-            response = self.s3_client.get_object(Bucket=self.bucket, Key=object_key)
-            data = response['Body'].read()
-            logger.info(f"Arquivo baixado: {object_key} ({len(data)} bytes)")
+            data, _ = self._fetch(object_key, h)
             return data
-        except ClientError as e:
+        except (ClientError, IOError) as e:
             logger.error(f"Erro ao baixar arquivo {object_key}: {e}")
             return None
     
+    def _fetch(
+        self,
+        object_key: str,
+        h,
+        if_none_match: Optional[str] = None
+    ) -> Tuple[Union[bytes, bytearray], Optional[str]]:
+        """
+        Baixa o objeto em faixas e devolve os dados com o ETag do GET.
+        
+        Args:
+            object_key: Chave do objeto no S3
+            h: Objeto hash a ser atualizado (ou None)
+            if_none_match: ETag já conhecido; se o objeto não mudou, o S3
+                responde 304 sem corpo (ClientError)
+        
+        Returns:
+            Tupla (dados, ETag da primeira resposta)
+        
+        Raises:
+            ClientError: Se o GET falhar (incluindo 304 com if_none_match)
+            IOError: Se uma faixa vier incompleta
+        """
+        conditions = {'IfNoneMatch': if_none_match} if if_none_match else {}
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket,
+                Key=object_key,
+                Range=f"bytes=0-{RANGE_CHUNK_SIZE - 1}",
+                **conditions
+            )
+        except ClientError as e:
+            # Objeto vazio não aceita Range: baixar sem faixa
+            if e.response.get('Error', {}).get('Code') != 'InvalidRange':
+                raise
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=object_key, **conditions)
+        
+        body = response['Body']
+        if h is None:
+            first = body.read()
+        else:
+            buf = io.BytesIO()
+            for chunk in iter(lambda: body.read(HASH_CHUNK_SIZE), b''):
+                h.update(chunk)
+                buf.write(chunk)
+            first = buf.getvalue()
+        
+        etag = response.get('ETag')
+        total_size = _total_size(response.get('ContentRange'), len(first))
+        if total_size > len(first):
+            data = self._download_remaining_ranges(object_key, first, total_size, etag, h)
+        else:
+            data = first
+        
+        logger.info(f"Arquivo baixado: {object_key} ({len(data)} bytes)")
+        return data, etag
+    
+    def _download_remaining_ranges(
+        self,
+        object_key: str,
+        first: bytes,
+        total_size: int,
+        etag: Optional[str] = None,
+        h=None
+    ) -> bytearray:
+        """
+        Baixa em paralelo as faixas restantes de um objeto grande.
+        
+        Cada faixa é pedida com If-Match no ETag da primeira resposta: se o
+        objeto for sobrescrito durante o download, o S3 responde 412 em vez
+        de misturar bytes de duas versões.
+        
+        Args:
+            object_key: Chave do objeto no S3
+            first: Bytes iniciais já baixados
+            total_size: Tamanho total do objeto
+            etag: ETag da primeira resposta (opcional)
+            h: Objeto hash a ser atualizado na ordem dos bytes (opcional)
+        
+        Returns:
+            Buffer com os dados completos do arquivo (sem cópia final)
+        
+        Raises:
+            ClientError: Se uma faixa falhar (incluindo 412 por mudança de ETag)
+            IOError: Se uma faixa vier incompleta
+        """
+        buf = bytearray(total_size)
+        buf[:len(first)] = first
+        ranges = [
+            (start, min(start + RANGE_CHUNK_SIZE, total_size) - 1)
+            for start in range(len(first), total_size, RANGE_CHUNK_SIZE)
+        ]
+        
+        conditions = {'IfMatch': etag} if etag else {}
+        
+        def fetch(byte_range):
+            start, end = byte_range
+            response = self.s3_client.get_object(
+                Bucket=self.bucket,
+                Key=object_key,
+                Range=f"bytes={start}-{end}",
+                **conditions
+            )
+            return response['Body'].read()
+        
+        with ThreadPoolExecutor(max_workers=min(RANGE_MAX_WORKERS, len(ranges))) as executor:
+            # map devolve as faixas em ordem: o hash avança enquanto as seguintes chegam
+            for (start, end), chunk in zip(ranges, executor.map(fetch, ranges)):
+                if len(chunk) != end - start + 1:
+                    raise IOError(f"Faixa incompleta de {object_key}: bytes={start}-{end}")
+                buf[start:end + 1] = chunk
+                if h is not None:
+                    h.update(chunk)
+        
+        return buf
+    
     def download_pdf(self, object_key: str) -> Optional[bytes]:
         """
         Baixa um PDF do Spaces (método de compatibilidade).
         
         Args:
             object_key: Chave do objeto no S3
-            
+        
         Returns:
             Dados binários do PDF ou None em caso de erro
         """
         return self.download_file(object_key)
     
+    def _draft_size(self, size: Tuple[int, int]) -> Tuple[int, int]:
+        """
+        Calcula o tamanho pedido ao draft do JPEG.
+        
+        O draft escolhe a maior redução cujo resultado ainda cobre o tamanho
+        pedido, então o lado maior nunca fica abaixo de image_max_size
+        (por padrão, A4 a 300 DPI, para não prejudicar o OCR).
+        
+        Args:
+            size: Tamanho original (largura, altura)
+        
+        Returns:
+            Tamanho mínimo desejado (largura, altura)
+        """
+        width, height = size
+        longest = max(width, height)
+        if not self.image_max_size or longest <= self.image_max_size:
+            return size
+        ratio = self.image_max_size / longest
+        return max(1, math.ceil(width * ratio)), max(1, math.ceil(height * ratio))
+    
+    def _fetch_and_decode(self, object_key: str) -> Tuple[np.ndarray, str]:
+        """
+        Baixa e decodifica uma imagem, mantendo o resultado em cache.
+        
+        Com uma imagem em cache, o GET é condicional (If-None-Match no ETag
+        guardado): 304 reaproveita o array sem baixar o corpo, e um objeto
+        sobrescrito com a mesma chave volta com o novo ETag e é decodificado
+        de novo, no mesmo round trip. Guarda o array HWC uint8 (somente
+        leitura) e não o objeto PIL, que é mutável. Erros geram exceção e,
+        portanto, não são cacheados.
+        
+        Args:
+            object_key: Chave do objeto no S3
+        
+        Returns:
+            Tupla (array RGB HWC uint8, sha256 dos bytes originais)
+        """
+        cache_key = (object_key, self.image_max_size)
+        cached = _image_cache_get(cache_key)
+        
+        h = hashlib.sha256()
+        try:
+            data, etag = self._fetch(object_key, h, if_none_match=cached[0] if cached else None)
+        except ClientError as e:
+            if cached is not None and _is_not_modified(e):
+                return cached[1], cached[2]
+            raise
+        sha256 = h.hexdigest()
+        
+        is_valid, error_msg = self.validate_image(data)
+        if not is_valid:
+            raise ValueError(f"Imagem inválida: {error_msg}")
+        
+        img = Image.open(io.BytesIO(data))
+        if img.format == 'JPEG':
+            # Deixar o libjpeg entregar RGB direto e, para fotos muito grandes,
+            # reduzir por 1/2, 1/4 ou 1/8 no domínio DCT durante a decodificação
+            img.draft('RGB', self._draft_size(img.size))
+            img.load()
+        # Converter para RGB se necessário
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        arr = np.asarray(img)
+        arr.setflags(write=False)
+        if etag:
+            _image_cache_put(cache_key, (etag, arr, sha256))
+        return arr, sha256
+    
     def download_image(self, object_key: str) -> Optional[Image.Image]:
         """
         Baixa uma imagem do Spaces e retorna como PIL Image.
         
         Args:
             object_key: Chave do objeto no S3
-            
+        
         Returns:
             Imagem PIL ou None em caso de erro
         """
-        data = self.download_file(object_key)
-        if not data:
+        downloaded = self.download_image_with_hash(object_key)
+        return downloaded[0] if downloaded else None
+    
+    def download_image_with_hash(self, object_key: str) -> Optional[Tuple[Image.Image, str]]:
+        """
+        Baixa uma imagem do Spaces junto com o SHA256 dos bytes originais.
+        
+        Os dados são validados (PNG ou JPEG) antes da decodificação; o hash é
+        calculado durante o download e reaproveitado do cache em retries.
+        
+        Args:
+            object_key: Chave do objeto no S3
+        
+        Returns:
+            Tupla (imagem PIL, sha256) ou None em caso de erro
+        """
+        downloaded = self.download_image_array_with_hash(object_key)
+        if downloaded is None:
             return None
+        arr, sha256 = downloaded
+        return Image.fromarray(arr), sha256
+    
+    def download_image_array_with_hash(self, object_key: str) -> Optional[Tuple[np.ndarray, str]]:
+        """
+        Baixa uma imagem como array, no formato usado pelo restante do pipeline.
+        
+        O array decodificado (ou em cache) é devolvido sem cópia e sem passar
+        por um objeto PIL, que o pré-processamento e o HTR converteriam de
+        volta para numpy.
+        
+        Args:
+            object_key: Chave do objeto no S3
         
+        Returns:
+            Tupla (array RGB HWC uint8 somente leitura, sha256) ou None em caso de erro
+        """
         try:
-            img = Image.open(io.BytesIO(data))
-            # Converter para RGB se necessário
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            logger.info(f"Imagem carregada: {object_key} ({img.size})")
-            return img
+            arr, sha256 = self._fetch_and_decode(object_key)
+            logger.info(f"Imagem carregada: {object_key} ({arr.shape[1]}x{arr.shape[0]})")
+            return arr, sha256
         except Exception as e:
             logger.error(f"Erro ao carregar imagem {object_key}: {e}")
             return None
@@ -87,25 +460,41 @@ class FileLoader:
         
         Args:
             data: Dados binários
-            
+        
         Returns:
             Hash SHA256 em hexadecimal
         """
         return hashlib.sha256(data).hexdigest()
     
+    def classify(
+        self, data: Union[bytes, bytearray, memoryview]
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Identifica o formato dos dados pelos magic bytes, em uma única passada.
+        
+        Args:
+            data: Dados binários
+        
+        Returns:
+            Tupla (tipo, mensagem_erro), onde tipo é 'pdf', 'png', 'jpeg' ou None
+        """
+        mv = memoryview(data)
+        for (offset, length, sig), kind in _SIGS.items():
+            if len(mv) >= offset + length and mv[offset:offset + length] == sig:
+                return kind, None
+        return None, "Formato de arquivo não reconhecido"
+    
     def is_pdf(self, data: bytes) -> bool:
         """
         Verifica se os dados são um PDF.
         
         Args:
             data: Dados binários
-            
+        
         Returns:
             True se for PDF, False caso contrário
         """
-        if len(data) < 4:
-            return False
-        return data[:4].startswith(b'%PDF')
+        return self.classify(data)[0] == 'pdf'
     
     def is_image(self, data: bytes) -> bool:
         """
@@ -113,38 +502,28 @@ class FileLoader:
         
         Args:
             data: Dados binários
-            
+        
         Returns:
             True se for imagem, False caso contrário
         """
         if len(data) < 8:
             return False
-        
-        # PNG signature: 89 50 4E 47 0D 0A 1A 0A
-        if data[:8] == b'\x89PNG\r\n\x1a\n':
-            return True
-        
-        # JPEG signature: FF D8 FF
-        if data[:3] == b'\xff\xd8\xff':
-            return True
-        
-        return False
+        return self.classify(data)[0] in _IMAGE_KINDS
     
-    def validate_pdf(self, data: bytes) -> Tuple[bool, Optional[str]]:
+    def validate_pdf(self, data: Union[bytes, bytearray, memoryview]) -> Tuple[bool, Optional[str]]:
         """
-        Valida se os dados são um PDF válido.
+        Valida se os dados são um PDF válido (cabeçalho %PDF-), sem copiá-los.
         
         Args:
-            data: Dados binários
-            
+            data: Dados binários (qualquer objeto com protocolo de buffer)
+        
         Returns:
             Tupla (é_válido, mensagem_erro)
         """
-        if len(data) < 4:
+        if len(memoryview(data)) < 5:
             return False, "Arquivo muito pequeno"
         
-        # Verificar assinatura PDF (%PDF)
-        if not data[:4].startswith(b'%PDF'):
+        if self.classify(data)[0] != 'pdf':
             return False, "Arquivo não é um PDF válido"
         
         return True, None
@@ -155,44 +534,53 @@ class FileLoader:
         
         Args:
             data: Dados binários
-            
+        
         Returns:
             Tupla (é_válido, mensagem_erro)
         """
         if len(data) < 8:
             return False, "Arquivo muito pequeno"
         
-        # Verificar PNG
-        if data[:8] == b'\x89PNG\r\n\x1a\n':
-            return True, None
+        if self.classify(data)[0] not in _IMAGE_KINDS:
+            return False, "Arquivo não é uma imagem válida (PNG ou JPEG)"
         
-        # Verificar JPEG
-        if data[:3] == b'\xff\xd8\xff':
-            return True, None
-        
-        return False, "Arquivo não é uma imagem válida (PNG ou JPEG)"
+        return True, None
     
-    def get_file_type(self, object_key: str) -> Optional[str]:
+    def get_file_type(self, object_key: str, content_type: Optional[str] = None) -> Optional[str]:
         """
-        Determina o tipo de arquivo baseado na extensão.
+        Determina o tipo de arquivo pela extensão ou, sem extensão conhecida,
+        pelo content type.
         
         Args:
             object_key: Chave do objeto no S3
-            
+            content_type: Content type informado no upload (opcional)
+        
         Returns:
             'pdf', 'image' ou None se não reconhecido
         """
-        ext = object_key.lower().split('.')[-1]
-        if ext == 'pdf':
-            return 'pdf'
-        elif ext in ['png', 'jpg', 'jpeg']:
-            return 'image'
-        return None
+        file_type = _EXT_TO_TYPE.get(object_key.rpartition('.')[2].lower())
+        if file_type is None and content_type:
+            mime = content_type.partition(';')[0].strip().lower()
+            file_type = _CONTENT_TYPE_TO_TYPE.get(mime)
+            if file_type is None and mime.startswith('image/'):
+                file_type = 'image'
+        return file_type
 
 
-# Instância global
-file_loader = FileLoader()
+@functools.cache
+def get_file_loader() -> FileLoader:
+    """
+    Retorna a instância global, criada no primeiro uso.
+    
+    Returns:
+        Instância compartilhada de FileLoader
+    """
+    return FileLoader()
 
-# Alias para compatibilidade
-pdf_loader = file_loader
 
+# Instância global resolvida sob demanda: importar o módulo não a constrói
+# (pdf_loader é alias para compatibilidade)
+def __getattr__(name: str):
+    if name in ('file_loader', 'pdf_loader'):
+        return get_file_loader()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
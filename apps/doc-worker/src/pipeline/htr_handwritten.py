@@ -1,15 +1,17 @@
 """HTR para texto manuscrito usando TrOCR (ONNX)."""
 import logging
 import os
-from typing import Optional, Tuple, TYPE_CHECKING
+import weakref
+from typing import Callable, Dict, List, Optional, Tuple, Union, TYPE_CHECKING
 
 if TYPE_CHECKING:
     import onnxruntime as ort
     from transformers import AutoProcessor
 
+import numpy as np
+from PIL import Image
+
 try:
-    import numpy as np
-    from PIL import Image
     import onnxruntime as ort
     from transformers import AutoProcessor
     ONNX_AVAILABLE = True
@@ -21,15 +23,123 @@ except ImportError as e:
     ort = type('Module', (), {'InferenceSession': _StubInferenceSession})()
     AutoProcessor = None
 
-from ..settings import settings
+try:
+    from scipy.special import logsumexp as _scipy_logsumexp
+except ImportError:
+    _scipy_logsumexp = None
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+from ..settings import get_settings
 
 logger = logging.getLogger(__name__)
 
+# Normalização ImageNet (padrão do TrOCR) pré-escalada para pixels uint8, em layout CHW:
+# (pixel - mean*255) * 1/(std*255) == (pixel/255 - mean) / std
+_MEAN_255 = (np.array([0.485, 0.456, 0.406], dtype=np.float32) * 255.0).reshape(3, 1, 1)
+_INV_STD_255 = (1.0 / (np.array([0.229, 0.224, 0.225], dtype=np.float32) * 255.0)).reshape(3, 1, 1)
+# Valor normalizado do padding branco
+_PAD_VALUE = (255.0 - _MEAN_255) * _INV_STD_255
+
+# Sufixo dos modelos quantizados em INT8 (gerados por src.quantize_htr)
+INT8_SUFFIX = ".int8"
+
 # Cache global para modelos e tokenizer
 _onnx_encoder_session: Optional['ort.InferenceSession'] = None
 _onnx_decoder_session: Optional['ort.InferenceSession'] = None
+_onnx_decoder_with_past_session: Optional['ort.InferenceSession'] = None
+_decoder_with_past_loaded = False
 _tokenizer: Optional['AutoProcessor'] = None
 
+# Nomes de entradas/saídas resolvidos uma vez por sessão (chamados a cada passo do decoder)
+_decoder_feed_names: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+_io_names: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
+# Função de decode e tokens especiais resolvidos uma vez por tokenizer
+_tokenizer_specs: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
+
+def _model_path(path: str) -> str:
+    """
+    Resolve o caminho do modelo ONNX, usando a variante INT8 quando habilitada.
+    
+    Args:
+        path: Caminho do modelo FP32
+    
+    Returns:
+        Caminho do modelo a ser carregado (com sufixo .int8 se htr_onnx_int8)
+    """
+    if get_settings().htr_onnx_int8:
+        return f"{path}{INT8_SUFFIX}"
+    return path
+
+
+def _physical_core_count() -> int:
+    """
+    Conta os núcleos físicos da CPU (sem hyperthreading).
+    
+    Returns:
+        Número de núcleos físicos, ou os.cpu_count() se não for possível determinar
+    """
+    cores = set()
+    physical_id = None
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            for line in f:
+                if line.startswith('physical id'):
+                    physical_id = line.split(':', 1)[1].strip()
+                elif line.startswith('core id'):
+                    cores.add((physical_id, line.split(':', 1)[1].strip()))
+    except OSError:
+        pass
+    return len(cores) or os.cpu_count() or 1
+
+
+def _cpu_budget() -> int:
+    """
+    Calcula quantas threads o ONNX Runtime pode usar neste processo.
+    
+    Considera a afinidade de CPU do processo (cpuset do container) limitada
+    aos núcleos físicos e dividida entre os worker_concurrency processos do
+    Celery, que carregam cada um as próprias sessões ONNX.
+    
+    Returns:
+        Número de CPUs disponíveis para este processo (mínimo 1)
+    """
+    try:
+        available = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        available = os.cpu_count() or 1
+    cores = min(available, _physical_core_count())
+    return max(1, cores // max(1, get_settings().worker_concurrency))
+
+
+def _session_options(intra_threads: int, parallel: bool = False) -> 'ort.SessionOptions':
+    """
+    Cria as opções de sessão ONNX para CPU.
+    
+    Args:
+        intra_threads: Threads intra-op calculadas (ignoradas se htr_onnx_intra_threads > 0)
+        parallel: Se True, usa ORT_PARALLEL (operadores independentes em paralelo)
+    
+    Returns:
+        SessionOptions configurado
+    """
+    sess_options = ort.SessionOptions()
+    sess_options.intra_op_num_threads = get_settings().htr_onnx_intra_threads or max(1, intra_threads)
+    if parallel:
+        sess_options.inter_op_num_threads = 2
+        sess_options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    else:
+        sess_options.inter_op_num_threads = 1
+        sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return sess_options
+
 
 def _load_onnx_models() -> Tuple['ort.InferenceSession', 'ort.InferenceSession']:
     """
@@ -39,12 +149,13 @@ def _load_onnx_models() -> Tuple['ort.InferenceSession', 'ort.InferenceSession']
         Tupla (encoder_session, decoder_session)
     """
     global _onnx_encoder_session, _onnx_decoder_session
+    settings = get_settings()
     
     if _onnx_encoder_session is not None and _onnx_decoder_session is not None:
         return _onnx_encoder_session, _onnx_decoder_session
     
-    encoder_path = settings.htr_onnx_encoder_path
-    decoder_path = settings.htr_onnx_decoder_path
+    encoder_path = _model_path(settings.htr_onnx_encoder_path)
+    decoder_path = _model_path(settings.htr_onnx_decoder_path)
     
     # Verificar se os arquivos existem
     if not os.path.exists(encoder_path):
@@ -52,12 +163,11 @@ def _load_onnx_models() -> Tuple['ort.InferenceSession', 'ort.InferenceSession']
     if not os.path.exists(decoder_path):
         raise FileNotFoundError(f"Modelo decoder ONNX não encontrado: {decoder_path}")
     
-    # Configurações otimizadas para CPU
-    sess_options = ort.SessionOptions()
-    sess_options.intra_op_num_threads = 4
-    sess_options.inter_op_num_threads = 2
-    sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
-    sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # Configurações otimizadas para CPU: o encoder recebe páginas em lote e usa
+    # todas as CPUs; o decoder faz muitas chamadas pequenas e sequenciais
+    cpus = _cpu_budget()
+    encoder_options = _session_options(cpus, parallel=True)
+    sess_options = _session_options(cpus // 2)
     
     # Providers: CPU apenas (conforme requisito do projeto)
     providers = ['CPUExecutionProvider']
@@ -66,7 +176,7 @@ def _load_onnx_models() -> Tuple['ort.InferenceSession', 'ort.InferenceSession']
         logger.info(f"Carregando encoder ONNX de {encoder_path}")
         _onnx_encoder_session = ort.InferenceSession(
             encoder_path,
-            sess_options=sess_options,
+            sess_options=encoder_options,
             providers=providers
         )
         
@@ -79,12 +189,74 @@ def _load_onnx_models() -> Tuple['ort.InferenceSession', 'ort.InferenceSession']
         
         logger.info("Modelos TrOCR ONNX carregados com sucesso")
         return _onnx_encoder_session, _onnx_decoder_session
-        
+    
     except Exception as e:
         logger.error(f"Erro ao carregar modelos ONNX: {e}")
         raise
 
 
+def _load_decoder_with_past(decoder_session: 'ort.InferenceSession') -> Optional['ort.InferenceSession']:
+    """
+    Carrega o decoder ONNX com KV-cache (past_key_values) de forma lazy.
+    
+    O modelo é opcional: se o arquivo não existir, o beam search usa o
+    decoder padrão reprocessando a sequência completa a cada passo. O
+    primeiro passo usa o decoder padrão para preencher o cache, então suas
+    saídas present.* precisam cobrir as entradas past_key_values.* do
+    decoder com past; caso contrário o modelo é descartado.
+    
+    Args:
+        decoder_session: Sessão ONNX do decoder padrão
+    
+    Returns:
+        Sessão ONNX do decoder com past ou None se indisponível
+    """
+    global _onnx_decoder_with_past_session, _decoder_with_past_loaded
+    
+    if _decoder_with_past_loaded:
+        return _onnx_decoder_with_past_session
+    
+    _decoder_with_past_loaded = True
+    path = get_settings().htr_onnx_decoder_with_past_path
+    if path:
+        path = _model_path(path)
+    if not path or not os.path.exists(path):
+        logger.info("Decoder ONNX com KV-cache não encontrado, usando decoder padrão")
+        return None
+    
+    sess_options = _session_options(_cpu_budget() // 2)
+    
+    try:
+        logger.info(f"Carregando decoder ONNX com KV-cache de {path}")
+        session = ort.InferenceSession(
+            path,
+            sess_options=sess_options,
+            providers=['CPUExecutionProvider']
+        )
+    except Exception as e:
+        logger.warning(f"Erro ao carregar decoder com KV-cache, usando decoder padrão: {e}")
+        return None
+    
+    present = {
+        name[len('present.'):]
+        for name in _resolve_io_names(decoder_session, 'outputs')
+        if name.startswith('present.')
+    }
+    missing = [
+        name
+        for name in _resolve_io_names(session, 'inputs')
+        if name.startswith('past_key_values.') and name[len('past_key_values.'):] not in present
+    ]
+    if missing:
+        logger.warning(
+            f"Decoder padrão não produz as saídas present.* para {missing}, usando decoder padrão"
+        )
+        return None
+    
+    _onnx_decoder_with_past_session = session
+    return _onnx_decoder_with_past_session
+
+
 def _load_tokenizer():
     """
     Carrega o tokenizer/processor do TrOCR de forma lazy.
@@ -93,6 +265,7 @@ def _load_tokenizer():
         AutoProcessor do transformers
     """
     global _tokenizer
+    settings = get_settings()
     
     if not ONNX_AVAILABLE:
         raise ImportError("onnxruntime ou transformers não estão disponíveis")
@@ -103,6 +276,7 @@ def _load_tokenizer():
     try:
         logger.info(f"Carregando tokenizer: {settings.htr_onnx_tokenizer_name}")
         _tokenizer = AutoProcessor.from_pretrained(settings.htr_onnx_tokenizer_name)
+        _resolve_tokenizer(_tokenizer)
         logger.info("Tokenizer carregado com sucesso")
         return _tokenizer
     except Exception as e:
@@ -110,43 +284,77 @@ def _load_tokenizer():
         raise
 
 
-def _preprocess_image(img: 'Image.Image') -> 'np.ndarray':
+def _resolve_tokenizer(tokenizer: 'AutoProcessor') -> Tuple[Callable[..., str], int, int]:
     """
-    Pré-processa imagem para o formato esperado pelo TrOCR.
+    Resolve (uma vez por tokenizer) a função de decode e os tokens BOS/EOS.
     
     Args:
-        img: Imagem PIL
-        
+        tokenizer: Processor/tokenizer do TrOCR
+    
     Returns:
-        Array numpy normalizado no formato (1, 3, H, W)
+        Tupla (decode, bos_token_id, eos_token_id)
+    
+    Raises:
+        TypeError: Se nem o processor nem o tokenizer interno tiverem decode
     """
-    # Converter para RGB se necessário
-    if img.mode != 'RGB':
-        img = img.convert('RGB')
+    spec = _tokenizer_specs.get(tokenizer)
+    if spec is not None:
+        return spec
     
-    # Redimensionar mantendo aspect ratio, depois fazer crop/pad para tamanho fixo
-    target_size = settings.htr_onnx_image_size
-    img.thumbnail((target_size, target_size), Image.Resampling.LANCZOS)
+    tokenizer_obj = tokenizer.tokenizer if hasattr(tokenizer, 'tokenizer') else tokenizer
+    bos_token_id = getattr(tokenizer_obj, 'bos_token_id', None) or getattr(tokenizer_obj, 'cls_token_id', None) or 0
+    eos_token_id = getattr(tokenizer_obj, 'eos_token_id', None) or getattr(tokenizer_obj, 'sep_token_id', None) or 1
+    
+    if hasattr(tokenizer, 'decode'):
+        decode = tokenizer.decode
+    elif hasattr(tokenizer_obj, 'decode'):
+        decode = tokenizer_obj.decode
+    else:
+        raise TypeError(f"Tokenizer sem método decode: {type(tokenizer).__name__}")
     
-    # Criar imagem quadrada com padding
-    new_img = Image.new('RGB', (target_size, target_size), (255, 255, 255))
-    paste_x = (target_size - img.width) // 2
-    paste_y = (target_size - img.height) // 2
-    new_img.paste(img, (paste_x, paste_y))
+    spec = (decode, bos_token_id, eos_token_id)
+    _tokenizer_specs[tokenizer] = spec
+    return spec
+
+
+def _preprocess_image(img: Union['Image.Image', 'np.ndarray']) -> 'np.ndarray':
+    """
+    Pré-processa imagem para o formato esperado pelo TrOCR.
     
-    # Converter para array e normalizar [0, 1]
-    img_array = np.array(new_img, dtype=np.float32) / 255.0
+    Args:
+        img: Imagem PIL ou array uint8 (H, W) / (H, W, 3)
     
-    # Normalizar usando mean e std do ImageNet (padrão do TrOCR)
-    mean = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(1, 1, 3)
-    std = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(1, 1, 3)
-    img_array = (img_array - mean) / std
+    Returns:
+        Array numpy normalizado no formato (1, 3, H, W)
+    """
+    if isinstance(img, np.ndarray):
+        img = Image.fromarray(img)
     
-    # Transpor para formato CHW e adicionar dimensão de batch: (1, 3, H, W)
-    img_array = np.transpose(img_array, (2, 0, 1))
-    img_array = np.expand_dims(img_array, axis=0)
+    # Converter para RGB se necessário
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
     
-    return img_array
+    # Redimensionar mantendo aspect ratio (apenas reduz, como thumbnail)
+    target_size = get_settings().htr_onnx_image_size
+    scale = min(target_size / img.width, target_size / img.height, 1.0)
+    width = max(1, round(img.width * scale))
+    height = max(1, round(img.height * scale))
+    if (width, height) != img.size:
+        img = img.resize((width, height), Image.Resampling.BILINEAR)
+    
+    # Canvas quadrado já normalizado com o padding branco
+    pixel_values = np.empty((3, target_size, target_size), dtype=np.float32)
+    pixel_values[:] = _PAD_VALUE
+    
+    # Normalizar e escrever os pixels em CHW direto na região do canvas (sem temporários)
+    paste_x = (target_size - width) // 2
+    paste_y = (target_size - height) // 2
+    region = pixel_values[:, paste_y:paste_y + height, paste_x:paste_x + width]
+    np.subtract(np.asarray(img).transpose(2, 0, 1), _MEAN_255, out=region)
+    region *= _INV_STD_255
+    
+    # Adicionar dimensão de batch: (1, 3, H, W), sem cópia
+    return pixel_values[None]
 
 
 def _run_encoder_inference(encoder_session: 'ort.InferenceSession', pixel_values: 'np.ndarray') -> 'np.ndarray':
@@ -156,7 +364,7 @@ def _run_encoder_inference(encoder_session: 'ort.InferenceSession', pixel_values
     Args:
         encoder_session: Sessão ONNX do encoder
         pixel_values: Array pré-processado da imagem
-        
+    
     Returns:
         Features do encoder (hidden states)
     """
@@ -167,12 +375,182 @@ def _run_encoder_inference(encoder_session: 'ort.InferenceSession', pixel_values
     return outputs[0]
 
 
+def _logsumexp(logits: 'np.ndarray') -> 'np.ndarray':
+    """
+    Calcula o log-sum-exp na última dimensão (vocab_size).
+    
+    Subtraído dos logits selecionados, fornece suas log-probabilidades sem
+    materializar o log-softmax do vocabulário inteiro.
+    
+    Args:
+        logits: Logits do último passo, formato (n_beams, vocab_size)
+    
+    Returns:
+        Normalizador de cada linha, formato (n_beams, 1)
+    """
+    if _scipy_logsumexp is not None:
+        return _scipy_logsumexp(logits, axis=-1, keepdims=True)
+    row_max = np.max(logits, axis=-1, keepdims=True)
+    return row_max + np.log(np.sum(np.exp(logits - row_max), axis=-1, keepdims=True))
+
+
+if NUMBA_AVAILABLE:
+    # fastmath sem nnan/ninf: os candidatos iniciam em -inf. Serial de propósito:
+    # o pool de threads do numba disputaria CPU com o ONNX Runtime (e com os
+    # demais processos do Celery) e não é seguro após fork
+    @njit(fastmath={'nsz', 'arcp', 'contract', 'afn', 'reassoc'}, cache=True)
+    def _score_topk_kernel(logits, prev_scores, k, out_idx, out_val):
+        """
+        Log-softmax + score acumulado + top-k em uma única passada pelo vocabulário.
+        
+        Usa softmax online (máximo corrente com reescala da soma) e mantém os
+        k maiores logits em um vetor ordenado por inserção.
+        
+        Args:
+            logits: Logits do último passo (n_beams, vocab_size)
+            prev_scores: Score acumulado de cada beam (n_beams,)
+            k: Número de candidatos por beam
+            out_idx: Saída com os tokens candidatos (n_beams, k)
+            out_val: Saída com os scores candidatos (n_beams, k)
+        """
+        n_beams, vocab_size = logits.shape
+        for b in range(n_beams):
+            for j in range(k):
+                out_val[b, j] = -np.inf
+                out_idx[b, j] = -1
+            
+            running_max = -np.inf
+            running_sum = 0.0
+            for v in range(vocab_size):
+                x = float(logits[b, v])
+                if x > running_max:
+                    running_sum = running_sum * np.exp(running_max - x) + 1.0
+                    running_max = x
+                else:
+                    running_sum += np.exp(x - running_max)
+                
+                if x > out_val[b, k - 1]:
+                    j = k - 1
+                    while j > 0 and x > out_val[b, j - 1]:
+                        out_val[b, j] = out_val[b, j - 1]
+                        out_idx[b, j] = out_idx[b, j - 1]
+                        j -= 1
+                    out_val[b, j] = x
+                    out_idx[b, j] = v
+            
+            log_norm = running_max + np.log(running_sum)
+            for j in range(k):
+                out_val[b, j] = prev_scores[b] + out_val[b, j] - log_norm
+
+
+def _score_topk(
+    logits: 'np.ndarray',
+    prev_scores: 'np.ndarray',
+    k: int
+) -> Tuple['np.ndarray', 'np.ndarray']:
+    """
+    Calcula os k melhores candidatos de cada beam.
+    
+    Usa o kernel Numba quando disponível; caso contrário, argpartition sobre
+    os logits e log-sum-exp do NumPy.
+    
+    Args:
+        logits: Logits do último passo (n_beams, vocab_size)
+        prev_scores: Score acumulado de cada beam (n_beams,)
+        k: Número de candidatos por beam
+    
+    Returns:
+        Tupla (tokens_candidatos, scores_candidatos), ambos (n_beams, k)
+    """
+    if NUMBA_AVAILABLE:
+        n_beams = logits.shape[0]
+        cand_tokens = np.empty((n_beams, k), dtype=np.int64)
+        cand_scores = np.empty((n_beams, k), dtype=np.float64)
+        _score_topk_kernel(np.ascontiguousarray(logits), prev_scores, k, cand_tokens, cand_scores)
+        return cand_tokens, cand_scores
+    
+    # Top-k por beam em O(V) com argpartition direto nos logits (log-softmax é monotônico);
+    # a normalização é aplicada apenas aos k escolhidos
+    cand_tokens = np.argpartition(logits, -k, axis=-1)[:, -k:]
+    cand_logits = np.take_along_axis(logits, cand_tokens, axis=-1)
+    cand_scores = prev_scores[:, None] + (cand_logits - _logsumexp(logits))
+    return cand_tokens, cand_scores
+
+
+def _warm_up_kernels():
+    """
+    Compila (ou carrega do cache em disco) o kernel Numba do beam search.
+    
+    O njit compila na primeira chamada para cada combinação de tipos; a
+    chamada usa os mesmos tipos do decode (logits float32 contíguos, scores
+    float64), para que a primeira página não pague a compilação.
+    """
+    if NUMBA_AVAILABLE:
+        _score_topk(np.zeros((1, 2), dtype=np.float32), np.zeros(1, dtype=np.float64), 1)
+
+
+def _resolve_decoder_feed_names(
+    decoder_session: 'ort.InferenceSession'
+) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    Resolve (uma vez por sessão) os nomes das entradas do decoder.
+    
+    Args:
+        decoder_session: Sessão ONNX do decoder
+    
+    Returns:
+        Tupla (encoder_hidden_states, input_ids, attention_mask); None se ausente
+    """
+    names = _decoder_feed_names.get(decoder_session)
+    if names is not None:
+        return names
+    
+    input_names = _resolve_io_names(decoder_session, 'inputs')
+    
+    # Mapear inputs conforme esperado pelo decoder (por nome ou por posição)
+    if 'encoder_hidden_states' in input_names:
+        hidden_name = 'encoder_hidden_states'
+    else:
+        hidden_name = input_names[0] if len(input_names) > 0 else None
+    
+    if 'input_ids' in input_names:
+        ids_name = 'input_ids'
+    else:
+        ids_name = input_names[1] if len(input_names) > 1 else None
+    
+    mask_name = 'attention_mask' if 'attention_mask' in input_names else None
+    
+    names = (hidden_name, ids_name, mask_name)
+    _decoder_feed_names[decoder_session] = names
+    return names
+
+
+def _resolve_io_names(session: 'ort.InferenceSession', kind: str) -> Tuple[str, ...]:
+    """
+    Resolve (uma vez por sessão) os nomes das entradas ou saídas.
+    
+    Args:
+        session: Sessão ONNX
+        kind: 'inputs' ou 'outputs'
+    
+    Returns:
+        Tupla com os nomes na ordem da sessão
+    """
+    per_session = _io_names.setdefault(session, {})
+    names = per_session.get(kind)
+    if names is None:
+        nodes = session.get_inputs() if kind == 'inputs' else session.get_outputs()
+        names = tuple(node.name for node in nodes)
+        per_session[kind] = names
+    return names
+
+
 def _run_decoder_inference(
     decoder_session: 'ort.InferenceSession',
     encoder_hidden_states: 'np.ndarray',
     input_ids: 'np.ndarray',
     attention_mask: Optional['np.ndarray'] = None
-) -> Tuple['np.ndarray', 'np.ndarray']:
+) -> 'np.ndarray':
     """
     Executa inferência no decoder para gerar tokens.
     
@@ -181,38 +559,72 @@ def _run_decoder_inference(
         encoder_hidden_states: Features do encoder
         input_ids: IDs dos tokens de entrada (sequência parcial)
         attention_mask: Máscara de atenção (opcional)
-        
+    
     Returns:
-        Tupla (logits, probabilidades)
+        Logits no formato (batch, seq_len, vocab_size)
     """
-    input_names = [inp.name for inp in decoder_session.get_inputs()]
+    hidden_name, ids_name, mask_name = _resolve_decoder_feed_names(decoder_session)
     inputs = {}
-    
-    # Mapear inputs conforme esperado pelo decoder
-    if 'encoder_hidden_states' in input_names:
-        inputs['encoder_hidden_states'] = encoder_hidden_states
-    elif len(input_names) > 0:
-        inputs[input_names[0]] = encoder_hidden_states
-    
-    if 'input_ids' in input_names:
-        inputs['input_ids'] = input_ids
-    elif len(input_names) > 1:
-        inputs[input_names[1]] = input_ids
-    
-    if attention_mask is not None and 'attention_mask' in input_names:
-        inputs['attention_mask'] = attention_mask
+    if hidden_name is not None:
+        inputs[hidden_name] = encoder_hidden_states
+    if ids_name is not None:
+        inputs[ids_name] = input_ids
+    if attention_mask is not None and mask_name is not None:
+        inputs[mask_name] = attention_mask
     
     outputs = decoder_session.run(None, inputs)
     
     # Logits são normalmente o primeiro output
-    logits = outputs[0]
+    return outputs[0]
+
+
+def _run_decoder_with_past(
+    session: 'ort.InferenceSession',
+    encoder_hidden_states: 'np.ndarray',
+    input_ids: 'np.ndarray',
+    past: Optional[Dict[str, 'np.ndarray']] = None
+) -> Tuple['np.ndarray', Dict[str, 'np.ndarray']]:
+    """
+    Executa um passo do decoder com KV-cache usando IO binding.
     
-    # Calcular probabilidades usando softmax
-    # Aplicar softmax na última dimensão (vocab_size)
-    exp_logits = np.exp(logits - np.max(logits, axis=-1, keepdims=True))
-    probs = exp_logits / np.sum(exp_logits, axis=-1, keepdims=True)
+    Serve tanto para o primeiro passo (decoder padrão, sem past) quanto para
+    os passos seguintes (decoder com past, recebendo apenas o último token).
+    As saídas present.* são devolvidas indexadas pelo sufixo do nome, que é
+    o mesmo usado nas entradas past_key_values.*.
     
-    return logits, probs
+    Args:
+        session: Sessão ONNX do decoder
+        encoder_hidden_states: Features do encoder (já replicadas por beam)
+        input_ids: IDs dos tokens de entrada
+        past: Cache de chaves/valores do passo anterior
+    
+    Returns:
+        Tupla (logits, present)
+    """
+    binding = session.io_binding()
+    for name in _resolve_io_names(session, 'inputs'):
+        if name == 'input_ids':
+            binding.bind_cpu_input(name, np.ascontiguousarray(input_ids))
+        elif name == 'encoder_hidden_states':
+            binding.bind_cpu_input(name, np.ascontiguousarray(encoder_hidden_states))
+        elif name.startswith('past_key_values.') and past is not None:
+            binding.bind_cpu_input(name, np.ascontiguousarray(past[name[len('past_key_values.'):]]))
+    
+    output_names = _resolve_io_names(session, 'outputs')
+    for name in output_names:
+        binding.bind_output(name)
+    
+    session.run_with_iobinding(binding)
+    outputs = dict(zip(output_names, binding.copy_outputs_to_cpu()))
+    
+    logits = outputs[output_names[0]]
+    present = {
+        name[len('present.'):]: value
+        for name, value in outputs.items()
+        if name.startswith('present.')
+    }
+    
+    return logits, present
 
 
 def _beam_search_decode(
@@ -220,92 +632,122 @@ def _beam_search_decode(
     encoder_hidden_states: 'np.ndarray',
     tokenizer: 'AutoProcessor',
     beam_size: int = 5,
-    max_length: int = 256
+    max_length: int = 256,
+    decoder_with_past_session: Optional['ort.InferenceSession'] = None
 ) -> Tuple[str, float]:
     """
     Decodifica texto usando beam search.
     
+    Quando decoder_with_past_session é informado, o primeiro passo usa o
+    decoder padrão para obter o KV-cache e os passos seguintes processam
+    apenas o último token de cada beam, em O(T) em vez de O(T²).
+    
     Args:
         decoder_session: Sessão ONNX do decoder
         encoder_hidden_states: Features do encoder
         tokenizer: Processor/tokenizer do TrOCR
         beam_size: Tamanho do beam
         max_length: Comprimento máximo da sequência
-        
+        decoder_with_past_session: Sessão ONNX do decoder com KV-cache (opcional)
+    
     Returns:
         Tupla (texto_decodificado, confiança_média)
     """
-    # Tokens especiais
-    tokenizer_obj = tokenizer.tokenizer if hasattr(tokenizer, 'tokenizer') else tokenizer
-    pad_token_id = tokenizer_obj.pad_token_id if hasattr(tokenizer_obj, 'pad_token_id') else 0
-    bos_token_id = getattr(tokenizer_obj, 'bos_token_id', None) or getattr(tokenizer_obj, 'cls_token_id', None) or 0
-    eos_token_id = getattr(tokenizer_obj, 'eos_token_id', None) or getattr(tokenizer_obj, 'sep_token_id', None) or 1
+    # Função de decode e tokens especiais (resolvidos no carregamento do tokenizer)
+    decode, bos_token_id, eos_token_id = _resolve_tokenizer(tokenizer)
+    
+    # Beams mantidos como matriz (n_beams, seq_len): todos crescem um token por passo,
+    # beams finalizados são completados com EOS
+    sequences = np.array([[bos_token_id]], dtype=np.int64)
+    scores = np.zeros(1, dtype=np.float64)
+    finished = np.zeros(1, dtype=bool)
     
-    # Inicializar beam com sequência vazia (apenas BOS)
-    beams = [([bos_token_id], 0.0)]  # (sequence, score)
+    # encoder_hidden_states replicado por número de beams (calculado uma vez por tamanho)
+    tiled_hidden_states = {1: encoder_hidden_states}
+    
+    # KV-cache (past_key_values) por beam, quando o decoder com past está disponível
+    use_past = decoder_with_past_session is not None
+    past: Optional[Dict[str, 'np.ndarray']] = None
     
     for step in range(max_length):
-        new_beams = []
+        n_beams = sequences.shape[0]
+        if n_beams not in tiled_hidden_states:
+            tiled_hidden_states[n_beams] = np.repeat(encoder_hidden_states, n_beams, axis=0)
         
-        for sequence, score in beams:
-            # Se já terminou (EOS), manter como está
-            if sequence and sequence[-1] == eos_token_id:
-                new_beams.append((sequence, score))
-                continue
-            
-            # Preparar input_ids
-            input_ids = np.array([sequence], dtype=np.int64)
-            
-            # Executar decoder
-            logits, probs = _run_decoder_inference(decoder_session, encoder_hidden_states, input_ids)
-            
-            # Obter probabilidades do último token
-            next_token_probs = probs[0, -1, :]  # (vocab_size,)
-            
-            # Manter top-k tokens
-            top_k_indices = np.argsort(next_token_probs)[-beam_size:][::-1]
-            
-            for token_id in top_k_indices:
-                token_prob = float(next_token_probs[token_id])
-                new_score = score + np.log(token_prob + 1e-10)  # Log probability
-                new_sequence = sequence + [int(token_id)]
-                new_beams.append((new_sequence, new_score))
+        # Uma única chamada do decoder para todos os beams
+        if use_past and past is not None:
+            logits, present = _run_decoder_with_past(
+                decoder_with_past_session, tiled_hidden_states[n_beams], sequences[:, -1:], past
+            )
+            past.update(present)
+        elif use_past:
+            logits, past = _run_decoder_with_past(
+                decoder_session, tiled_hidden_states[n_beams], sequences
+            )
+        else:
+            logits = _run_decoder_inference(
+                decoder_session, tiled_hidden_states[n_beams], sequences
+            )
         
-        # Se não há novos beams, parar
-        if not new_beams:
-            break
+        # Log-softmax + top-k apenas no último passo de cada beam: (n_beams, vocab_size)
+        next_logits = logits[:, -1, :]
+        k = min(beam_size, next_logits.shape[-1])
+        cand_tokens, cand_scores = _score_topk(next_logits, scores, k)
+        
+        # Beams finalizados geram um único candidato (EOS) com o score inalterado
+        if finished.any():
+            cand_scores[finished] = -np.inf
+            cand_scores[finished, 0] = scores[finished]
+            cand_tokens[finished, 0] = eos_token_id
+        
+        # Manter os beam_size melhores entre todos os n_beams * k candidatos
+        flat_scores = cand_scores.ravel()
+        n_keep = int(min(beam_size, np.isfinite(flat_scores).sum()))
+        keep = np.argpartition(flat_scores, -n_keep)[-n_keep:]
+        keep = keep[np.argsort(flat_scores[keep])[::-1]]
+        beam_idx, cand_idx = np.divmod(keep, k)
         
-        # Manter apenas top beam_size
-        new_beams.sort(key=lambda x: x[1], reverse=True)
-        beams = new_beams[:beam_size]
+        next_tokens = cand_tokens[beam_idx, cand_idx]
+        sequences = np.concatenate([sequences[beam_idx], next_tokens[:, None]], axis=1)
+        scores = flat_scores[keep]
+        finished = finished[beam_idx] | (next_tokens == eos_token_id)
+        
+        # Reordenar o KV-cache conforme os beams sobreviventes
+        if past is not None:
+            past = {name: value[beam_idx] for name, value in past.items()}
         
         # Se todos terminaram, parar
-        if all(seq and seq[-1] == eos_token_id for seq, _ in beams):
+        if finished.all():
             break
     
-    # Escolher melhor beam
-    if not beams:
-        return "", 0.0
+    # Escolher melhor beam (beams estão ordenados por score)
+    best_sequence = [int(token_id) for token_id in sequences[0]]
+    best_score = float(scores[0])
+    
+    # Remover BOS e EOS (incluindo o preenchimento de beams finalizados)
+    if best_sequence and best_sequence[0] == bos_token_id:
+        best_sequence = best_sequence[1:]
+    while best_sequence and best_sequence[-1] == eos_token_id:
+        best_sequence = best_sequence[:-1]
     
-    best_sequence, best_score = beams[0]
+    return _finalize_decode(decode, best_sequence, best_score)
+
+
+def _finalize_decode(decode: Callable[..., str], token_ids: List[int], score: float) -> Tuple[str, float]:
+    """
+    Converte a sequência escolhida em texto e confiança.
     
-    # Remover BOS e EOS
-    if best_sequence and len(best_sequence) > 0:
-        if best_sequence[0] == bos_token_id:
-            best_sequence = best_sequence[1:]
-        if best_sequence and best_sequence[-1] == eos_token_id:
-            best_sequence = best_sequence[:-1]
+    Args:
+        decode: Função de decode do tokenizer
+        token_ids: IDs dos tokens, já sem BOS/EOS
+        score: Log-probabilidade acumulada da sequência
     
+    Returns:
+        Tupla (texto_decodificado, confiança_média)
+    """
     # Decodificar para texto
     try:
-        # Usar o método decode do tokenizer
-        if hasattr(tokenizer, 'decode'):
-            text = tokenizer.decode(best_sequence, skip_special_tokens=True)
-        elif hasattr(tokenizer, 'tokenizer') and hasattr(tokenizer.tokenizer, 'decode'):
-            text = tokenizer.tokenizer.decode(best_sequence, skip_special_tokens=True)
-        else:
-            # Fallback: converter IDs para texto manualmente
-            text = "".join([chr(id) if 32 <= id < 127 else "" for id in best_sequence])
+        text = decode(token_ids, skip_special_tokens=True)
     except Exception as e:
         logger.warning(f"Erro ao decodificar tokens: {e}")
         text = ""
@@ -313,63 +755,188 @@ def _beam_search_decode(
     # Calcular confiança média (normalizar score)
     # Score é log probability, converter para confiança [0, 1]
     # Normalizar pelo comprimento da sequência
-    seq_length = max(len(best_sequence), 1)
-    confidence = min(1.0, max(0.0, np.exp(best_score / seq_length)))
+    seq_length = max(len(token_ids), 1)
+    confidence = min(1.0, max(0.0, np.exp(score / seq_length)))
     
     return text, confidence
 
 
-def htr_handwritten(img: 'Image.Image') -> tuple[str, float]:
+def _greedy_decode(
+    decoder_session: 'ort.InferenceSession',
+    encoder_hidden_states: 'np.ndarray',
+    tokenizer: 'AutoProcessor',
+    max_length: int = 256,
+    decoder_with_past_session: Optional['ort.InferenceSession'] = None
+) -> Tuple[str, float]:
     """
-    Extrai texto manuscrito de uma imagem usando TrOCR via ONNX.
+    Decodifica texto de forma gulosa (beam_size=1).
+    
+    Caminho especializado do beam search: um único beam, argmax por passo,
+    sem ordenação nem reindexação de beams.
     
     Args:
-        img: Imagem PIL
+        decoder_session: Sessão ONNX do decoder
+        encoder_hidden_states: Features do encoder
+        tokenizer: Processor/tokenizer do TrOCR
+        max_length: Comprimento máximo da sequência
+        decoder_with_past_session: Sessão ONNX do decoder com KV-cache (opcional)
+    
+    Returns:
+        Tupla (texto_decodificado, confiança_média)
+    """
+    decode, bos_token_id, eos_token_id = _resolve_tokenizer(tokenizer)
+    
+    token_ids: List[int] = []
+    score = 0.0
+    
+    # Primeiro passo: sequência apenas com BOS
+    input_ids = np.array([[bos_token_id]], dtype=np.int64)
+    if decoder_with_past_session is not None:
+        logits, past = _run_decoder_with_past(decoder_session, encoder_hidden_states, input_ids)
+    else:
+        logits = _run_decoder_inference(decoder_session, encoder_hidden_states, input_ids)
+    
+    # Buffer reutilizado para o último token (passos com KV-cache)
+    last_token = np.empty((1, 1), dtype=np.int64)
+    
+    for step in range(max_length):
+        row = logits[:, -1, :]
+        token_id = int(row[0].argmax())
+        score += float(row[0, token_id] - _logsumexp(row)[0, 0])
+        if token_id == eos_token_id:
+            break
+        token_ids.append(token_id)
         
+        if step == max_length - 1:
+            break
+        if decoder_with_past_session is not None:
+            last_token[0, 0] = token_id
+            logits, present = _run_decoder_with_past(
+                decoder_with_past_session, encoder_hidden_states, last_token, past
+            )
+            past.update(present)
+        else:
+            input_ids = np.array([[bos_token_id] + token_ids], dtype=np.int64)
+            logits = _run_decoder_inference(decoder_session, encoder_hidden_states, input_ids)
+    
+    return _finalize_decode(decode, token_ids, score)
+
+
+def load_models() -> bool:
+    """
+    Carrega antecipadamente as sessões ONNX e o tokenizer do TrOCR e
+    compila o kernel Numba do beam search.
+    
+    Deve ser chamada uma vez em cada processo filho do Celery, depois do
+    fork: os thread pools do ONNX Runtime não sobrevivem ao fork, então as
+    sessões não são criadas na importação do módulo (processo pai).
+    
+    Returns:
+        True se os modelos foram carregados, False se o HTR está desabilitado
+        ou os modelos não estão disponíveis
+    """
+    if not get_settings().htr_onnx_enable or not ONNX_AVAILABLE:
+        return False
+    
+    try:
+        _, decoder_session = _load_onnx_models()
+        _load_decoder_with_past(decoder_session)
+        _load_tokenizer()
+        _warm_up_kernels()
+        return True
+    except FileNotFoundError as e:
+        logger.warning(f"Modelos ONNX não encontrados: {e}. HTR desabilitado.")
+        return False
+
+
+def htr_handwritten(img: Union['Image.Image', 'np.ndarray']) -> tuple[str, float]:
+    """
+    Extrai texto manuscrito de uma imagem usando TrOCR via ONNX.
+    
+    Args:
+        img: Imagem PIL ou array uint8
+    
     Returns:
         Tupla (texto_extraído, confiança)
     """
+    return htr_handwritten_batch([img])[0]
+
+
+def htr_handwritten_batch(imgs: List[Union['Image.Image', 'np.ndarray']]) -> List[Tuple[str, float]]:
+    """
+    Extrai texto manuscrito de várias imagens, executando o encoder em lote.
+    
+    As imagens são empilhadas em um único tensor (M, 3, H, W) por lote de até
+    htr_onnx_batch_size páginas; o beam search roda por imagem sobre a fatia
+    correspondente dos hidden states.
+    
+    Args:
+        imgs: Lista de imagens PIL ou arrays uint8
+    
+    Returns:
+        Lista de tuplas (texto_extraído, confiança), na ordem das imagens
+    """
+    settings = get_settings()
+    empty = [("", 0.0)] * len(imgs)
+    
     if not settings.htr_onnx_enable:
         logger.debug("HTR ONNX desabilitado")
-        return "", 0.0
+        return empty
     
     if not ONNX_AVAILABLE:
         logger.warning("onnxruntime não está disponível. HTR desabilitado.")
-        return "", 0.0
+        return empty
     
     try:
         # Carregar modelos (lazy loading)
         encoder_session, decoder_session = _load_onnx_models()
+        decoder_with_past_session = _load_decoder_with_past(decoder_session)
         tokenizer = _load_tokenizer()
         
-        # Pré-processar imagem
-        pixel_values = _preprocess_image(img)
-        
-        # Executar encoder
-        encoder_hidden_states = _run_encoder_inference(encoder_session, pixel_values)
-        
-        # Executar decoder com beam search
-        text, confidence = _beam_search_decode(
-            decoder_session,
-            encoder_hidden_states,
-            tokenizer,
-            beam_size=settings.htr_onnx_beam_size,
-            max_length=settings.htr_onnx_max_length
-        )
-        
-        if text:
-            logger.debug(f"HTR manuscrito: {len(text)} caracteres extraídos, confiança: {confidence:.2f}")
-        else:
-            logger.debug("HTR manuscrito: nenhum texto extraído")
-        
-        return text.strip(), confidence
+        results = []
+        batch_size = max(1, settings.htr_onnx_batch_size)
+        for start in range(0, len(imgs), batch_size):
+            batch = imgs[start:start + batch_size]
+            
+            # Pré-processar e executar o encoder uma vez para o lote
+            pixel_values = np.concatenate([_preprocess_image(img) for img in batch], axis=0)
+            encoder_hidden_states = _run_encoder_inference(encoder_session, pixel_values)
+            
+            # Executar decoder para cada imagem (guloso quando beam_size <= 1)
+            for i in range(len(batch)):
+                if settings.htr_onnx_beam_size <= 1:
+                    text, confidence = _greedy_decode(
+                        decoder_session,
+                        encoder_hidden_states[i:i + 1],
+                        tokenizer,
+                        max_length=settings.htr_onnx_max_length,
+                        decoder_with_past_session=decoder_with_past_session
+                    )
+                else:
+                    text, confidence = _beam_search_decode(
+                        decoder_session,
+                        encoder_hidden_states[i:i + 1],
+                        tokenizer,
+                        beam_size=settings.htr_onnx_beam_size,
+                        max_length=settings.htr_onnx_max_length,
+                        decoder_with_past_session=decoder_with_past_session
+                    )
+                
+                if text:
+                    logger.debug(f"HTR manuscrito: {len(text)} caracteres extraídos, confiança: {confidence:.2f}")
+                else:
+                    logger.debug("HTR manuscrito: nenhum texto extraído")
+                
+                results.append((text.strip(), confidence))
         
+        return results
+    
     except FileNotFoundError as e:
         logger.warning(f"Modelos ONNX não encontrados: {e}. HTR desabilitado.")
-        return "", 0.0
+        return empty
     except Exception as e:
         logger.error(f"Erro no HTR manuscrito: {e}", exc_info=True)
-        return "", 0.0
+        return empty
 
 
 def load_onnx_model(model_path: str) -> Optional['ort.InferenceSession']:
@@ -378,7 +945,7 @@ def load_onnx_model(model_path: str) -> Optional['ort.InferenceSession']:
     
     Args:
         model_path: Caminho para o arquivo .onnx
-        
+    
     Returns:
         Sessão ONNX ou None se não for possível carregar
     """
@@ -387,9 +954,7 @@ def load_onnx_model(model_path: str) -> Optional['ort.InferenceSession']:
         return None
     
     try:
-        sess_options = ort.SessionOptions()
-        sess_options.intra_op_num_threads = 4
-        sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        sess_options = _session_options(_cpu_budget())
         
         session = ort.InferenceSession(
             model_path,
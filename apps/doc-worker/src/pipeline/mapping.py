@@ -1,49 +1,189 @@
 """Mapeamento de texto extraído para estruturas definidas."""
+import functools
 import re
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set, Tuple
 from ..models import DocumentField, BoundingBox
 from .postprocess import normalize_date, normalize_cpf, normalize_crm, normalize_phone, clean_text
 
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    hyperscan = None
+    HYPERSCAN_AVAILABLE = False
+
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    re2 = None
+    RE2_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Limpeza do texto antes do mapeamento (pré-compiladas)
+_SPECIALS = re.compile(r'[^\w\s:\[\]()\-/.,]')
+_WS = re.compile(r'\s+')
+
+# Textos de página com resultado memorizado por mapeador
+FIELD_CACHE_SIZE = 1024
+
+# Marca de varredura ainda não realizada (None já significa "sem pré-filtro")
+_NOT_SCANNED = object()
+
+
+def _compile_field_pattern(source: str):
+    """
+    Compila um padrão de campo com RE2 quando disponível.
+    
+    O RE2 garante tempo linear (sem backtracking) em textos de OCR ruidosos.
+    Padrões rejeitados pelo RE2, ou a ausência do pacote, usam o re padrão;
+    padrões só com ASCII (CPF, datas, telefone) usam re.ASCII, que restringe
+    dígitos, espaços e letras a ASCII como no RE2 e acelera a busca.
+    
+    Args:
+        source: Expressão regular
+    
+    Returns:
+        Padrão compilado com a API de re.Pattern (search/group/groups)
+    """
+    if RE2_AVAILABLE:
+        try:
+            return re2.compile(f'(?im){source}')
+        except re2.error as e:
+            logger.debug(f"RE2 rejeitou o padrão {source}, usando re: {e}")
+    flags = re.IGNORECASE | re.MULTILINE
+    if source.isascii():
+        flags |= re.ASCII
+    return re.compile(source, flags)
+
+
+# Padrões de regex padrão para campos comuns (campo -> padrões, em ordem de prioridade)
+DEFAULT_PATTERNS: Dict[str, List[str]] = {
+    "patient_name": [
+        r'(?:paciente|nome|patient)[:\s\[\]]+([A-ZÁÉÍÓÚÇ][a-záéíóúç]+(?:\s+[A-ZÁÉÍÓÚÇ][a-záéíóúç]+)+)',
+        r'nome[:\s\[\]]+([A-ZÁÉÍÓÚÇ][a-záéíóúç]+(?:\s+[A-ZÁÉÍÓÚÇ][a-záéíóúç]+)+)',
+    ],
+    "cpf": [
+        r'CPF[:\s\[\]]*(\d{3}\.?\d{3}\.?\d{3}-?\d{2})',
+        r'(\d{3}\.?\d{3}\.?\d{3}-?\d{2})',
+    ],
+    "crm": [
+        r'CRM[:\s\[\]]*(\d+)[\s-]*([A-Z]{2})?',
+    ],
+    "date": [
+        r'data[:\s\[\]]+(\d{2}[/-]\d{2}[/-]\d{4})',
+        r'(\d{2}[/-]\d{2}[/-]\d{4})',
+        r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',  # Formato mais flexível
+    ],
+    "phone": [
+        r'telefone[:\s\[\]]+(\(?\d{2}\)?\s?\d{4,5}-?\d{4})',
+        r'(\(?\d{2}\)?\s?\d{4,5}-?\d{4})',
+    ],
+    "document_type": [
+        r'(?:tipo|tipo\s+de\s+documento|documento)[:\s\[\]]+([A-ZÁÉÍÓÚÇ][a-záéíóúç\s]{2,50})',
+        r'(ATESTADO[^-\n]{0,50}|LAUDO[^-\n]{0,50}|RECEITA[^-\n]{0,50}|EXAME[^-\n]{0,50}|RELAT[OÓ]RIO[^-\n]{0,50})',
+    ],
+    "institution": [
+        r'(?:institui[çc][aã]o|hospital|cl[íi]nica|unidade)[:\s\[\]]+([A-ZÁÉÍÓÚÇ][a-záéíóúç\s]+)',
+        r'(SECRETARIA[^-\n]+)',
+    ],
+}
+
+# Conjuntos de padrões por identificador (ex.: pacotes de um tenant); ids
+# desconhecidos usam o conjunto padrão
+DEFAULT_PATTERN_SET = "default"
+PATTERN_SETS: Dict[str, Dict[str, List[str]]] = {
+    DEFAULT_PATTERN_SET: DEFAULT_PATTERNS,
+}
+
 
 class FieldMapper:
     """Mapeia texto extraído para campos estruturados."""
     
-    def __init__(self):
-        """Inicializa o mapeador com padrões conhecidos."""
-        # Padrões de regex para campos comuns
+    def __init__(self, patterns: Optional[Dict[str, List[str]]] = None):
+        """
+        Inicializa o mapeador com padrões conhecidos.
+        
+        Args:
+            patterns: Padrões por campo (padrão: DEFAULT_PATTERNS)
+        """
+        raw_patterns = patterns if patterns is not None else DEFAULT_PATTERNS
+        
+        # Compilar os padrões uma única vez
         self.patterns = {
-            "patient_name": [
-                r'(?:paciente|nome|patient)[:\s\[\]]+([A-ZÁÉÍÓÚÇ][a-záéíóúç]+(?:\s+[A-ZÁÉÍÓÚÇ][a-záéíóúç]+)+)',
-                r'nome[:\s\[\]]+([A-ZÁÉÍÓÚÇ][a-záéíóúç]+(?:\s+[A-ZÁÉÍÓÚÇ][a-záéíóúç]+)+)',
-            ],
-            "cpf": [
-                r'CPF[:\s\[\]]*(\d{3}\.?\d{3}\.?\d{3}-?\d{2})',
-                r'(\d{3}\.?\d{3}\.?\d{3}-?\d{2})',
-            ],
-            "crm": [
-                r'CRM[:\s\[\]]*(\d+)[\s-]*([A-Z]{2})?',
-            ],
-            "date": [
-                r'data[:\s\[\]]+(\d{2}[/-]\d{2}[/-]\d{4})',
-                r'(\d{2}[/-]\d{2}[/-]\d{4})',
-                r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',  # Formato mais flexível
-            ],
-            "phone": [
-                r'telefone[:\s\[\]]+(\(?\d{2}\)?\s?\d{4,5}-?\d{4})',
-                r'(\(?\d{2}\)?\s?\d{4,5}-?\d{4})',
-            ],
-            "document_type": [
-                r'(?:tipo|tipo\s+de\s+documento|documento)[:\s\[\]]+([A-ZÁÉÍÓÚÇ][a-záéíóúç\s]{2,50})',
-                r'(ATESTADO[^-\n]{0,50}|LAUDO[^-\n]{0,50}|RECEITA[^-\n]{0,50}|EXAME[^-\n]{0,50}|RELAT[OÓ]RIO[^-\n]{0,50})',
-            ],
-            "institution": [
-                r'(?:institui[çc][aã]o|hospital|cl[íi]nica|unidade)[:\s\[\]]+([A-ZÁÉÍÓÚÇ][a-záéíóúç\s]+)',
-                r'(SECRETARIA[^-\n]+)',
-            ],
+            field_name: [_compile_field_pattern(pattern) for pattern in patterns]
+            for field_name, patterns in raw_patterns.items()
         }
+        self._pattern_sources = [pattern for patterns in raw_patterns.values() for pattern in patterns]
+        # (campo, padrão, índice no banco Hyperscan), na ordem de prioridade
+        self._indexed_patterns = [
+            (field_name, pattern, pattern_id)
+            for pattern_id, (field_name, pattern) in enumerate(
+                (field_name, pattern)
+                for field_name, patterns in self.patterns.items()
+                for pattern in patterns
+            )
+        ]
+        
+        # Pré-filtro Hyperscan (DFA): uma passada linear indica quais padrões casam
+        self._scanner = self._build_scanner()
+        
+        # Valores extraídos por texto de página: reprocessamentos e páginas
+        # repetidas (capas, formulários em branco) não executam as regex de novo
+        self._match_text = functools.lru_cache(maxsize=FIELD_CACHE_SIZE)(self._match_text_uncached)
+    
+    def _build_scanner(self):
+        """
+        Compila todos os padrões em um único banco Hyperscan.
+        
+        O Hyperscan não extrai grupos de captura, então é usado apenas como
+        pré-filtro: o re só é executado para os padrões que casaram.
+        
+        Returns:
+            Banco Hyperscan ou None se indisponível
+        """
+        if not HYPERSCAN_AVAILABLE:
+            return None
+        
+        expressions = [source.encode('utf-8') for source in self._pattern_sources]
+        flags = (hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_MULTILINE |
+                 hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP |
+                 hyperscan.HS_FLAG_SINGLEMATCH)
+        try:
+            db = hyperscan.Database()
+            db.compile(
+                expressions=expressions,
+                ids=list(range(len(expressions))),
+                elements=len(expressions),
+                flags=[flags] * len(expressions)
+            )
+            return db
+        except Exception as e:
+            logger.warning(f"Hyperscan indisponível para os padrões, usando re: {e}")
+            return None
+    
+    def _scan(self, text: str) -> Optional[Set[int]]:
+        """
+        Identifica, em uma única passada, os padrões que casam com o texto.
+        
+        Args:
+            text: Texto a ser varrido
+        
+        Returns:
+            Conjunto de índices (na ordem de self.patterns) ou None sem Hyperscan
+        """
+        if self._scanner is None:
+            return None
+        
+        matched: Set[int] = set()
+        
+        def on_match(pattern_id, start, end, flags, context):
+            matched.add(pattern_id)
+        
+        self._scanner.scan(text.encode('utf-8'), match_event_handler=on_match)
+        return matched
     
     def extract_fields(self, text: str, page: int = 1, confidence: float = 0.8) -> List[DocumentField]:
         """
@@ -53,57 +193,88 @@ class FieldMapper:
             text: Texto extraído via OCR/HTR
             page: Número da página
             confidence: Confiança base do OCR
-            
+        
         Returns:
             Lista de campos extraídos
         """
-        fields = []
-        
         if not text or not text.strip():
             logger.warning(f"Texto vazio na página {page}, nenhum campo será extraído")
-            return fields
+            return []
+        
+        fields = [
+            DocumentField(
+                field_name=field_name,
+                field_value=value,
+                confidence=confidence,
+                page=page
+            )
+            for field_name, value in self._match_text(text)
+        ]
+        for field in fields:
+            logger.info(f"Campo extraído: {field.field_name} = {field.field_value} (página {page})")
+        
+        if not fields:
+            logger.warning(f"Nenhum campo encontrado na página {page}. Texto (primeiros 500 chars): {text[:500]}")
+        
+        return fields
+    
+    def _match_text_uncached(self, text: str) -> Tuple[Tuple[str, str], ...]:
+        """
+        Executa os padrões sobre o texto de uma página.
+        
+        Args:
+            text: Texto extraído via OCR/HTR (não vazio)
+        
+        Returns:
+            Tupla de pares (campo, valor normalizado), na ordem de prioridade
+        """
+        matches = []
         
         # Limpar texto: remover caracteres especiais problemáticos mas manter estrutura
-        cleaned_text = re.sub(r'[^\w\s:\[\]()\-/.,]', ' ', text)
-        cleaned_text = re.sub(r'\s+', ' ', cleaned_text)  # Normalizar espaços
+        cleaned_text = _SPECIALS.sub(' ', text)
+        cleaned_text = _WS.sub(' ', cleaned_text)  # Normalizar espaços
+        
+        logger.debug(f"Extraindo campos de texto com {len(cleaned_text)} caracteres")
         
-        text_lower = cleaned_text.lower()
-        logger.debug(f"Extraindo campos de texto com {len(cleaned_text)} caracteres na página {page}")
+        # Padrões que casam no texto limpo (None = sem pré-filtro, testar todos).
+        # O texto original só é varrido se algum padrão falhar no limpo, e não
+        # precisa ser testado quando a limpeza não o alterou.
+        cleaned_hits = self._scan(cleaned_text)
+        retry_original = text != cleaned_text
+        text_hits = _NOT_SCANNED
         
         # Mapear cada padrão
-        for field_name, patterns in self.patterns.items():
-            for pattern in patterns:
-                try:
-                    # Tentar primeiro no texto limpo, depois no original
-                    match = re.search(pattern, cleaned_text, re.IGNORECASE | re.MULTILINE)
-                    if not match:
-                        match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+        found = set()
+        for field_name, pattern, pattern_id in self._indexed_patterns:
+            if field_name in found:
+                continue  # Usar apenas o primeiro match de cada campo
+            try:
+                # Tentar primeiro no texto limpo, depois no original
+                match = None
+                if cleaned_hits is None or pattern_id in cleaned_hits:
+                    match = pattern.search(cleaned_text)
+                if not match and retry_original:
+                    if text_hits is _NOT_SCANNED:
+                        text_hits = self._scan(text)
+                    if text_hits is None or pattern_id in text_hits:
+                        match = pattern.search(text)
+                
+                if match:
+                    value = match.group(1) if match.groups() else match.group(0)
+                    # Limpar valor extraído
+                    value = _WS.sub(' ', value).strip()
                     
-                    if match:
-                        value = match.group(1) if match.groups() else match.group(0)
-                        # Limpar valor extraído
-                        value = re.sub(r'\s+', ' ', value).strip()
-                        
-                        # Normalizar valor conforme o tipo
-                        normalized_value = self._normalize_field(field_name, value)
-                        
-                        if normalized_value and len(normalized_value) > 2:  # Ignorar valores muito curtos
-                            fields.append(DocumentField(
-                                field_name=field_name,
-                                field_value=normalized_value,
-                                confidence=confidence,
-                                page=page
-                            ))
-                            logger.info(f"Campo extraído: {field_name} = {normalized_value} (página {page})")
-                            break  # Usar apenas o primeiro match
-                except Exception as e:
-                    logger.warning(f"Erro ao processar padrão {pattern} para {field_name}: {e}")
-                    continue
-        
-        if not fields:
-            logger.warning(f"Nenhum campo encontrado na página {page}. Texto (primeiros 500 chars): {text[:500]}")
+                    # Normalizar valor conforme o tipo
+                    normalized_value = self._normalize_field(field_name, value)
+                    
+                    if normalized_value and len(normalized_value) > 2:  # Ignorar valores muito curtos
+                        matches.append((field_name, normalized_value))
+                        found.add(field_name)
+            except Exception as e:
+                logger.warning(f"Erro ao processar padrão {pattern.pattern} para {field_name}: {e}")
+                continue
         
-        return fields
+        return tuple(matches)
     
     def _normalize_field(self, field_name: str, value: str) -> str:
         """
@@ -112,7 +283,7 @@ class FieldMapper:
         Args:
             field_name: Nome do campo
             value: Valor bruto
-            
+        
         Returns:
             Valor normalizado
         """
@@ -131,6 +302,40 @@ class FieldMapper:
         return result if result else clean_text(value)
 
 
-# Instância global
-field_mapper = FieldMapper()
+@functools.lru_cache(maxsize=16)
+def _build_field_mapper(pattern_set_id: str) -> FieldMapper:
+    """
+    Compila o mapeador de um conjunto de padrões (uma vez por processo).
+    
+    Args:
+        pattern_set_id: Chave existente em PATTERN_SETS
+    
+    Returns:
+        Mapeador compilado
+    """
+    return FieldMapper(PATTERN_SETS[pattern_set_id])
+
+
+def get_field_mapper(pattern_set_id: str = DEFAULT_PATTERN_SET) -> FieldMapper:
+    """
+    Retorna o mapeador compartilhado de um conjunto de padrões.
+    
+    Os padrões (e o banco Hyperscan) são compilados uma vez por conjunto
+    no processo; ids sem conjunto próprio reaproveitam o padrão.
+    
+    Args:
+        pattern_set_id: Identificador do conjunto (ex.: tenant)
+    
+    Returns:
+        Mapeador compilado
+    """
+    if pattern_set_id not in PATTERN_SETS:
+        pattern_set_id = DEFAULT_PATTERN_SET
+    return _build_field_mapper(pattern_set_id)
+
 
+# Instância global resolvida sob demanda: importar o módulo não a constrói
+def __getattr__(name: str):
+    if name == 'field_mapper':
+        return get_field_mapper()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,43 +1,269 @@
 """OCR para texto impresso usando Tesseract."""
+import os
+
+# Tesseract com uma thread OpenMP por página: o paralelismo é entre páginas.
+# Precisa estar no ambiente antes de a libtesseract ser carregada (tesserocr)
+# e é herdado pelos subprocessos do pytesseract
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pytesseract
+import numpy as np
 from PIL import Image
 import logging
-from ..settings import settings
+from typing import Iterable, List, Optional, Tuple, Union
+from ..settings import get_settings
+
+# tesserocr (API C do Tesseract) é opcional: sem ele, cada página usa o pytesseract
+try:
+    from tesserocr import OEM, PSM, PyTessBaseAPI
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+# API do Tesseract residente por thread (uma PyTessBaseAPI não é thread-safe;
+# o traineddata é carregado uma vez por thread de OCR)
+_tess_local = threading.local()
+
+# Pool de threads de OCR (o Tesseract libera o GIL durante o reconhecimento)
+_ocr_executor: Optional[ThreadPoolExecutor] = None
+_ocr_executor_workers = 0
+_ocr_executor_lock = threading.Lock()
+
+
+def _text_from_data(data: dict) -> str:
+    """
+    Remonta o texto da página a partir do resultado de image_to_data.
+    
+    Palavras da mesma linha são unidas por espaço e linhas por quebra de
+    linha, na ordem de leitura do Tesseract.
+    
+    Args:
+        data: Dicionário do pytesseract (Output.DICT)
+    
+    Returns:
+        Texto extraído
+    """
+    lines = {}
+    for block, par, line, word in zip(data['block_num'], data['par_num'], data['line_num'], data['text']):
+        if word and word.strip():
+            lines.setdefault((block, par, line), []).append(word)
+    return '\n'.join(' '.join(words) for words in lines.values())
+
 
-def ocr_printed(img: Image.Image, lang: str = None) -> tuple[str, float]:
+def ocr_printed(img: Union[np.ndarray, Image.Image], lang: str = None) -> tuple[str, float]:
     """
     Extrai texto impresso de uma imagem usando Tesseract.
     
     Args:
-        img: Imagem PIL
+        img: Imagem pré-processada (array numpy ou imagem PIL)
         lang: Idioma(s) para OCR (padrão das settings)
-        
+    
     Returns:
         Tupla (texto_extraído, confiança_média)
     """
-    lang = lang or settings.ocr_langs
+    lang = lang or get_settings().ocr_langs
     
     try:
         # Configurações otimizadas para CPU
         config = "--oem 1 --psm 6"
         
-        # Extrair texto
-        text = pytesseract.image_to_string(img, lang=lang, config=config)
-        
-        # Extrair dados com confiança
+        # Uma única execução do Tesseract: texto e confiança vêm das palavras
         data = pytesseract.image_to_data(img, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+        text = _text_from_data(data)
         
-        # Calcular confiança média (ignorar valores -1)
-        confidences = [float(conf) for conf in data['conf'] if float(conf) > 0]
-        avg_confidence = sum(confidences) / len(confidences) / 100.0 if confidences else 0.0
+        # Calcular confiança média (ignorar valores -1) em uma única passada vetorizada
+        confidences = np.asarray(data['conf'], dtype=np.float32)
+        valid = confidences > 0
+        avg_confidence = float(confidences[valid].mean()) / 100.0 if valid.any() else 0.0
         
         logger.debug(f"OCR impresso: {len(text)} caracteres, confiança média: {avg_confidence:.2f}")
         return text.strip(), avg_confidence
-        
+    
+    except Exception as e:
+        logger.error(f"Erro no OCR impresso: {e}")
+        return "", 0.0
+
+
+def _get_tess_api(lang: str):
+    """
+    Obtém a API do Tesseract residente da thread para o idioma, criando-a se necessário.
+    
+    Args:
+        lang: Idioma(s) para OCR
+    
+    Returns:
+        PyTessBaseAPI ou None se o tesserocr não estiver disponível
+    """
+    if not TESSEROCR_AVAILABLE:
+        return None
+    
+    api = getattr(_tess_local, 'api', None)
+    if api is not None and _tess_local.lang == lang:
+        return api
+    
+    try:
+        if api is not None:
+            api.End()
+        # Mesmas configurações do pytesseract: --oem 1 --psm 6
+        _tess_local.api = PyTessBaseAPI(lang=lang, psm=PSM.SINGLE_BLOCK, oem=OEM.LSTM_ONLY)
+        _tess_local.lang = lang
+        logger.info(f"API do Tesseract carregada ({lang})")
+    except Exception as e:
+        logger.warning(f"Erro ao carregar API do Tesseract, usando pytesseract: {e}")
+        _tess_local.api = None
+        _tess_local.lang = None
+    return _tess_local.api
+
+
+def _default_ocr_workers() -> int:
+    """
+    Calcula quantas páginas cada worker pode reconhecer em paralelo.
+    
+    As CPUs do processo são divididas entre os worker_concurrency processos
+    do Celery, que fazem OCR ao mesmo tempo.
+    
+    Returns:
+        Número de threads de OCR (mínimo 1)
+    """
+    try:
+        available = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        available = os.cpu_count() or 1
+    return max(1, available // max(1, get_settings().worker_concurrency))
+
+
+def _get_ocr_executor(workers: int) -> ThreadPoolExecutor:
+    """
+    Obtém o pool de threads de OCR, recriando-o se o tamanho mudar.
+    
+    Args:
+        workers: Número de threads
+    
+    Returns:
+        ThreadPoolExecutor compartilhado do processo
+    """
+    global _ocr_executor, _ocr_executor_workers
+    with _ocr_executor_lock:
+        if _ocr_executor is None or _ocr_executor_workers != workers:
+            if _ocr_executor is not None:
+                _ocr_executor.shutdown(wait=False)
+            _ocr_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ocr')
+            _ocr_executor_workers = workers
+        return _ocr_executor
+
+
+def warm_up(lang: str = None, workers: int = None) -> int:
+    """
+    Carrega antecipadamente a API do Tesseract em cada thread de OCR.
+    
+    Cada thread do pool recebe exatamente uma tarefa de carga (as tarefas
+    esperam umas pelas outras em uma barreira), então o primeiro documento
+    não paga o carregamento do traineddata.
+    
+    Args:
+        lang: Idioma(s) para OCR (padrão das settings)
+        workers: Threads de OCR (mesmo padrão de ocr_printed_batch)
+    
+    Returns:
+        Número de APIs carregadas (0 se o tesserocr não estiver disponível)
+    """
+    settings = get_settings()
+    if not TESSEROCR_AVAILABLE:
+        return 0
+    
+    lang = lang or settings.ocr_langs
+    workers = workers or settings.ocr_workers or _default_ocr_workers()
+    
+    if workers <= 1:
+        return int(_get_tess_api(lang) is not None)
+    
+    barrier = threading.Barrier(workers)
+    
+    def load():
+        barrier.wait()
+        return _get_tess_api(lang) is not None
+    
+    executor = _get_ocr_executor(workers)
+    futures = [executor.submit(load) for _ in range(workers)]
+    return sum(future.result() for future in futures)
+
+
+def _set_image(api, img: Union[np.ndarray, Image.Image]):
+    """
+    Envia uma imagem para a API do Tesseract.
+    
+    Args:
+        api: PyTessBaseAPI
+        img: Array uint8 (H, W) / (H, W, 3) ou imagem PIL
+    """
+    if isinstance(img, Image.Image):
+        api.SetImage(img)
+        return
+    arr = np.ascontiguousarray(img, dtype=np.uint8)
+    height, width = arr.shape[:2]
+    channels = 1 if arr.ndim == 2 else arr.shape[2]
+    api.SetImageBytes(arr.tobytes(), width, height, channels, width * channels)
+
+
+def _ocr_page(img: Union[np.ndarray, Image.Image], lang: str) -> Tuple[str, float]:
+    """
+    Reconhece uma página com a API residente da thread (ou com o pytesseract).
+    
+    Args:
+        img: Imagem pré-processada (array numpy ou imagem PIL)
+        lang: Idioma(s) para OCR
+    
+    Returns:
+        Tupla (texto_extraído, confiança_média)
+    """
+    api = _get_tess_api(lang)
+    if api is None:
+        return ocr_printed(img, lang=lang)
+    
+    try:
+        _set_image(api, img)
+        text = api.GetUTF8Text()
+        confidence = api.MeanTextConf() / 100.0
+        logger.debug(f"OCR impresso: {len(text)} caracteres, confiança média: {confidence:.2f}")
+        return text.strip(), confidence
     except Exception as e:
         logger.error(f"Erro no OCR impresso: {e}")
         return "", 0.0
 
+
+def ocr_printed_batch(
+    imgs: Iterable[Union[np.ndarray, Image.Image]],
+    lang: str = None,
+    workers: int = None
+) -> List[Tuple[str, float]]:
+    """
+    Extrai texto impresso de várias páginas, reconhecendo páginas em paralelo.
+    
+    Cada thread de OCR mantém a própria API do tesserocr (e os modelos do
+    idioma) carregada entre páginas e documentos, evitando um subprocesso
+    tesseract por página. Sem ele, cada página é processada por ocr_printed.
+    
+    Args:
+        imgs: Imagens pré-processadas (arrays numpy ou imagens PIL); pode ser
+            um gerador, consumido página a página
+        lang: Idioma(s) para OCR (padrão das settings)
+        workers: Páginas reconhecidas em paralelo (padrão das settings;
+            0 divide as CPUs pela concorrência do worker)
+    
+    Returns:
+        Lista de tuplas (texto_extraído, confiança_média), na ordem das imagens
+    """
+    settings = get_settings()
+    lang = lang or settings.ocr_langs
+    workers = workers or settings.ocr_workers or _default_ocr_workers()
+    
+    if workers <= 1:
+        return [_ocr_page(img, lang) for img in imgs]
+    
+    executor = _get_ocr_executor(workers)
+    futures = [executor.submit(_ocr_page, img, lang) for img in imgs]
+    return [future.result() for future in futures]
@@ -1,10 +1,11 @@
 """Carregador de PDFs do S3."""
+import functools
 import hashlib
 import logging
 import boto3
 from botocore.exceptions import ClientError
-from typing import Optional, Tuple
-from ..settings import settings
+from typing import Optional, Tuple, Union
+from ..settings import get_settings
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +15,7 @@ class PDFLoader:
     
     def __init__(self):
         """Inicializa o cliente S3."""
+        settings = get_settings()
         self.s3_client = boto3.client(
             's3',
             endpoint_url=settings.s3_endpoint,
@@ -29,7 +31,7 @@ class PDFLoader:
         
         Args:
             object_key: Chave do objeto no S3
-            
+        
         Returns:
             Dados binários do PDF ou None em caso de erro
         """
@@ -48,32 +50,46 @@ class PDFLoader:
         
         Args:
             data: Dados binários
-            
+        
         Returns:
             Hash SHA256 em hexadecimal
         """
         return hashlib.sha256(data).hexdigest()
     
-    def validate_pdf(self, data: bytes) -> Tuple[bool, Optional[str]]:
+    def validate_pdf(self, data: Union[bytes, bytearray, memoryview]) -> Tuple[bool, Optional[str]]:
         """
         Valida se os dados são um PDF válido.
         
         Args:
-            data: Dados binários
-            
+            data: Dados binários (qualquer objeto com protocolo de buffer)
+        
         Returns:
             Tupla (é_válido, mensagem_erro)
         """
-        if len(data) < 4:
+        mv = memoryview(data)
+        if len(mv) < 5:
             return False, "Arquivo muito pequeno"
         
-        # Verificar assinatura PDF (%PDF)
-        if not data[:4].startswith(b'%PDF'):
+        # Verificar assinatura PDF (%PDF-) sobre a visão, sem copiar os dados
+        if mv[:5] != b'%PDF-':
             return False, "Arquivo não é um PDF válido"
         
         return True, None
 
 
-# Instância global
-pdf_loader = PDFLoader()
+@functools.cache
+def get_pdf_loader() -> PDFLoader:
+    """
+    Retorna a instância global, criada no primeiro uso.
+    
+    Returns:
+        Instância compartilhada de PDFLoader
+    """
+    return PDFLoader()
+
 
+# Instância global resolvida sob demanda: importar o módulo não a constrói
+def __getattr__(name: str):
+    if name == 'pdf_loader':
+        return get_pdf_loader()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
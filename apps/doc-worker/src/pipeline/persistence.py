@@ -1,14 +1,219 @@
 """Persistência de dados no PostgreSQL."""
+import functools
 import asyncpg
 import logging
-import json
-from typing import List, Optional
+import orjson
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Tuple
 from datetime import datetime
 from ..models import MedicalReport, DocumentField
-from ..settings import settings
+from ..settings import get_settings
 
 logger = logging.getLogger(__name__)
 
+# Consultas do caminho quente. O asyncpg prepara cada consulta com parâmetros na
+# primeira execução e reaproveita o statement pelo texto (cache LRU por conexão,
+# statement_cache_size), então o parse/plan acontece uma vez por conexão do pool
+SQL_UPDATE_STATUS = """
+    UPDATE documents
+    SET status = $1,
+        error_message = $2,
+        pages = $3,
+        processing_time_seconds = $4,
+        updated_at = now()
+    WHERE id = $5
+"""
+SQL_COMPLETE_DOCUMENT = """
+    UPDATE documents
+    SET status = 'DONE',
+        error_message = NULL,
+        pages = $1,
+        processing_time_seconds = $2,
+        model_version = $3,
+        updated_at = now()
+    WHERE id = $4
+"""
+SQL_INSERT_FIELD = """
+    INSERT INTO document_fields
+    (document_id, field_name, field_value, confidence, page, bbox)
+    VALUES ($1, $2, $3, $4, $5, $6::jsonb)
+"""
+SQL_DOCUMENT_EXISTS = "SELECT EXISTS (SELECT 1 FROM documents WHERE id = $1)"
+SQL_CREATE_DOCUMENT = """
+    INSERT INTO documents (id, tenant, object_key, status, sha256)
+    VALUES ($1, $2, $3, 'RECEIVED', $4)
+    ON CONFLICT (id) DO NOTHING
+"""
+SQL_START_DOCUMENT = """
+    INSERT INTO documents (id, tenant, object_key, status, sha256)
+    VALUES ($1, $2, $3, 'PROCESSING', $4)
+    ON CONFLICT (id) DO UPDATE
+    SET status = 'PROCESSING',
+        error_message = NULL,
+        pages = 0,
+        processing_time_seconds = NULL,
+        updated_at = now()
+"""
+SQL_FIND_COMPLETED_BY_SHA256 = """
+    SELECT id, pages FROM documents
+    WHERE sha256 = $1 AND tenant = $2 AND status = 'DONE' AND id <> $3
+      AND model_version = $4
+    ORDER BY updated_at DESC
+    LIMIT 1
+"""
+SQL_DELETE_FIELDS = "DELETE FROM document_fields WHERE document_id = $1"
+SQL_CLONE_FIELDS = """
+    INSERT INTO document_fields
+    (document_id, field_name, field_value, confidence, page, bbox)
+    SELECT $2, field_name, field_value, confidence, page, bbox
+    FROM document_fields
+    WHERE document_id = $1
+"""
+
+# Statements mantidos em cache por conexão (padrão do asyncpg: 100)
+STATEMENT_CACHE_SIZE = 100
+
+# Colunas de document_fields na ordem de _field_records (COPY)
+FIELD_COLUMNS = ('document_id', 'field_name', 'field_value', 'confidence', 'page', 'bbox')
+
+# A partir de quantos campos o lote vai por COPY em vez de executemany
+FIELD_COPY_MIN_ROWS = 100
+
+
+def _field_records(document_id: str, fields: List[DocumentField]) -> List[tuple]:
+    """
+    Monta os registros de SQL_INSERT_FIELD (bbox serializado com orjson).
+    
+    Um único executemany (atômico no asyncpg) envia os INSERTs em pipeline,
+    sem um round trip por campo; lotes grandes usam COPY com os mesmos
+    registros, na ordem de FIELD_COLUMNS.
+    
+    Args:
+        document_id: ID do documento
+        fields: Lista de campos extraídos
+    
+    Returns:
+        Lista de tuplas na ordem dos parâmetros de SQL_INSERT_FIELD
+    """
+    return [
+        (
+            document_id,
+            field.field_name,
+            field.field_value,
+            field.confidence,
+            field.page,
+            orjson.dumps({
+                "x": field.bbox.x,
+                "y": field.bbox.y,
+                "w": field.bbox.w,
+                "h": field.bbox.h
+            }).decode() if field.bbox else None
+        )
+        for field in fields
+    ]
+
+
+class DocumentWriter:
+    """Escritas de um documento sobre uma única conexão do pool."""
+    
+    def __init__(self, conn: asyncpg.Connection, document_id: str):
+        """
+        Inicializa o escritor.
+        
+        Args:
+            conn: Conexão adquirida do pool
+            document_id: ID do documento
+        """
+        self.conn = conn
+        self.document_id = document_id
+    
+    async def update_status(self, status: str,
+                            error_message: Optional[str] = None,
+                            pages: int = 0,
+                            processing_time: Optional[float] = None):
+        """
+        Atualiza o status do documento.
+        
+        Args:
+            status: Novo status
+            error_message: Mensagem de erro (se houver)
+            pages: Número de páginas
+            processing_time: Tempo de processamento em segundos
+        """
+        await self.conn.execute(
+            SQL_UPDATE_STATUS, status, error_message, pages, processing_time, self.document_id
+        )
+        logger.info(f"Status atualizado: {self.document_id} -> {status}")
+    
+    async def save_fields(self, fields: List[DocumentField]):
+        """
+        Salva campos extraídos do documento.
+        
+        Args:
+            fields: Lista de campos extraídos
+        """
+        if not fields:
+            return
+        records = _field_records(self.document_id, fields)
+        if len(records) >= FIELD_COPY_MIN_ROWS:
+            # COPY binário: um único comando, sem planejar um INSERT por linha
+            await self.conn.copy_records_to_table(
+                'document_fields', records=records, columns=FIELD_COLUMNS
+            )
+        else:
+            await self.conn.executemany(SQL_INSERT_FIELD, records)
+        logger.info(f"{len(fields)} campos salvos para documento {self.document_id}")
+    
+    async def mark_done(self, pages: int, processing_time: float):
+        """
+        Marca o documento como DONE com a versão do modelo que gerou os campos.
+        
+        Args:
+            pages: Número de páginas
+            processing_time: Tempo de processamento em segundos
+        """
+        await self.conn.execute(
+            SQL_COMPLETE_DOCUMENT, pages, processing_time, get_settings().model_version, self.document_id
+        )
+        logger.info(f"Status atualizado: {self.document_id} -> DONE")
+    
+    async def finalize(self, fields: List[DocumentField], pages: int, processing_time: float):
+        """
+        Grava os campos e marca o documento como DONE em uma única transação
+        (nenhum leitor vê DONE com campos parciais).
+        
+        Args:
+            fields: Lista de campos extraídos
+            pages: Número de páginas
+            processing_time: Tempo de processamento em segundos
+        """
+        async with self.conn.transaction():
+            await self.save_fields(fields)
+            await self.mark_done(pages, processing_time)
+    
+    async def finalize_from(self, src_id: str, pages: int, processing_time: float) -> int:
+        """
+        Substitui os campos do documento pelos de outro já concluído e o marca
+        como DONE em uma única transação. Os campos existentes são removidos
+        antes da cópia, então uma nova tentativa não duplica linhas.
+        
+        Args:
+            src_id: ID do documento de origem
+            pages: Número de páginas
+            processing_time: Tempo de processamento em segundos
+        
+        Returns:
+            Número de campos copiados
+        """
+        async with self.conn.transaction():
+            await self.conn.execute(SQL_DELETE_FIELDS, self.document_id)
+            # Status do comando: "INSERT 0 <linhas>"
+            status = await self.conn.execute(SQL_CLONE_FIELDS, src_id, self.document_id)
+            await self.mark_done(pages, processing_time)
+        count = int(status.split()[-1])
+        logger.info(f"{count} campos copiados de {src_id} para {self.document_id}")
+        return count
+
 
 class Persistence:
     """Gerencia persistência no PostgreSQL."""
@@ -21,9 +226,10 @@ class Persistence:
         """Inicializa pool de conexões."""
         try:
             self.conn_pool = await asyncpg.create_pool(
-                settings.database_url,
+                get_settings().database_url,
                 min_size=2,
-                max_size=10
+                max_size=10,
+                statement_cache_size=STATEMENT_CACHE_SIZE
             )
             logger.info("Pool de conexões PostgreSQL inicializado")
         except Exception as e:
@@ -36,6 +242,34 @@ class Persistence:
             await self.conn_pool.close()
             logger.info("Pool de conexões fechado")
     
+    @asynccontextmanager
+    async def document_session(self, document_id: str) -> AsyncIterator[DocumentWriter]:
+        """
+        Adquire uma conexão do pool para todas as escritas de um documento.
+        
+        Args:
+            document_id: ID do documento
+        
+        Yields:
+            DocumentWriter sobre a conexão adquirida
+        """
+        async with self.conn_pool.acquire() as conn:
+            yield DocumentWriter(conn, document_id)
+    
+    async def complete_document(self, document_id: str, fields: List[DocumentField],
+                                pages: int, processing_time: float):
+        """
+        Grava os campos e o status DONE com uma única conexão e transação.
+        
+        Args:
+            document_id: ID do documento
+            fields: Lista de campos extraídos
+            pages: Número de páginas
+            processing_time: Tempo de processamento em segundos
+        """
+        async with self.document_session(document_id) as writer:
+            await writer.finalize(fields, pages, processing_time)
+    
     async def update_document_status(self, document_id: str, status: str, 
                                     error_message: Optional[str] = None,
                                     pages: int = 0,
@@ -50,17 +284,8 @@ class Persistence:
             pages: Número de páginas
             processing_time: Tempo de processamento em segundos
         """
-        async with self.conn_pool.acquire() as conn:
-            await conn.execute("""
-                UPDATE documents
-                SET status = $1,
-                    error_message = $2,
-                    pages = $3,
-                    processing_time_seconds = $4,
-                    updated_at = now()
-                WHERE id = $5
-            """, status, error_message, pages, processing_time, document_id)
-            logger.info(f"Status atualizado: {document_id} -> {status}")
+        async with self.document_session(document_id) as writer:
+            await writer.update_status(status, error_message, pages, processing_time)
     
     async def save_document_fields(self, document_id: str, fields: List[DocumentField]):
         """
@@ -73,26 +298,8 @@ class Persistence:
         if not fields:
             return
         
-        async with self.conn_pool.acquire() as conn:
-            async with conn.transaction():
-                for field in fields:
-                    bbox_json = None
-                    if field.bbox:
-                        bbox_json = json.dumps({
-                            "x": field.bbox.x,
-                            "y": field.bbox.y,
-                            "w": field.bbox.w,
-                            "h": field.bbox.h
-                        })
-                    
-                    await conn.execute("""
-                        INSERT INTO document_fields 
-                        (document_id, field_name, field_value, confidence, page, bbox)
-                        VALUES ($1, $2, $3, $4, $5, $6::jsonb)
-                    """, document_id, field.field_name, field.field_value,
-                        field.confidence, field.page, bbox_json)
-        
-        logger.info(f"{len(fields)} campos salvos para documento {document_id}")
+        async with self.document_session(document_id) as writer:
+            await writer.save_fields(fields)
     
     async def document_exists(self, document_id: str) -> bool:
         """
@@ -100,16 +307,77 @@ class Persistence:
         
         Args:
             document_id: ID do documento
-            
+        
         Returns:
             True se existe, False caso contrário
         """
         async with self.conn_pool.acquire() as conn:
+            # Um único booleano: fetchval não monta um Record
+            return bool(await conn.fetchval(SQL_DOCUMENT_EXISTS, document_id))
+    
+    async def start_document(self, document_id: str, tenant: str, object_key: str, sha256: str) -> bool:
+        """
+        Cria o documento (ou reaproveita o existente, em reprocessamentos) já
+        com status PROCESSING, em um único comando e round trip.
+        
+        Args:
+            document_id: ID do documento
+            tenant: Tenant
+            object_key: Chave do objeto no S3
+            sha256: Hash SHA256
+        
+        Returns:
+            True se o documento está registrado como PROCESSING, False em caso de erro
+        """
+        async with self.conn_pool.acquire() as conn:
+            try:
+                await conn.execute(SQL_START_DOCUMENT, document_id, tenant, object_key, sha256)
+                logger.info(f"Status atualizado: {document_id} -> PROCESSING")
+                return True
+            except Exception as e:
+                logger.error(f"Erro ao registrar documento {document_id}: {e}")
+                return False
+    
+    async def find_completed_by_sha256(
+        self, sha256: str, tenant: str, exclude_id: str
+    ) -> Optional[Tuple[str, int]]:
+        """
+        Busca o documento concluído mais recente com o mesmo conteúdo.
+        
+        Args:
+            sha256: Hash SHA256 do conteúdo
+            tenant: Tenant (resultados não são compartilhados entre tenants)
+            exclude_id: ID do documento atual (ignorado na busca)
+        
+        Returns:
+            Tupla (id, páginas) do documento encontrado ou None
+        """
+        async with self.conn_pool.acquire() as conn:
+            # Só reaproveita campos gerados pela versão atual do modelo
             row = await conn.fetchrow(
-                "SELECT 1 FROM documents WHERE id = $1",
-                document_id
+                SQL_FIND_COMPLETED_BY_SHA256, sha256, tenant, exclude_id, get_settings().model_version
             )
-            return row is not None
+            if row is None:
+                return None
+            return str(row['id']), row['pages']
+    
+    async def complete_from_duplicate(self, document_id: str, src_id: str,
+                                      pages: int, processing_time: float) -> int:
+        """
+        Copia os campos de um documento concluído e marca o atual como DONE,
+        com uma única conexão e transação.
+        
+        Args:
+            document_id: ID do documento atual
+            src_id: ID do documento de origem
+            pages: Número de páginas
+            processing_time: Tempo de processamento em segundos
+        
+        Returns:
+            Número de campos copiados
+        """
+        async with self.document_session(document_id) as writer:
+            return await writer.finalize_from(src_id, pages, processing_time)
     
     async def create_document(self, document_id: str, tenant: str, object_key: str, sha256: str) -> bool:
         """
@@ -120,23 +388,32 @@ class Persistence:
             tenant: Tenant
             object_key: Chave do objeto no S3
             sha256: Hash SHA256
-            
+        
         Returns:
             True se criado com sucesso, False se já existe
         """
         async with self.conn_pool.acquire() as conn:
             try:
-                await conn.execute("""
-                    INSERT INTO documents (id, tenant, object_key, status, sha256)
-                    VALUES ($1, $2, $3, 'RECEIVED', $4)
-                    ON CONFLICT (id) DO NOTHING
-                """, document_id, tenant, object_key, sha256)
+                await conn.execute(SQL_CREATE_DOCUMENT, document_id, tenant, object_key, sha256)
                 return True
             except Exception as e:
                 logger.error(f"Erro ao criar documento {document_id}: {e}")
                 return False
 
 
-# Instância global
-persistence = Persistence()
+@functools.cache
+def get_persistence() -> Persistence:
+    """
+    Retorna a instância global, criada no primeiro uso.
+    
+    Returns:
+        Instância compartilhada de Persistence
+    """
+    return Persistence()
+
 
+# Instância global resolvida sob demanda: importar o módulo não a constrói
+def __getattr__(name: str):
+    if name == 'persistence':
+        return get_persistence()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
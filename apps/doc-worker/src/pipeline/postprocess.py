@@ -6,6 +6,31 @@ from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Padrões pré-compilados (usados a cada campo extraído)
+# Uma única passada: YYYY/MM/DD ou DD/MM/YYYY e DD/MM/YY (separador / ou -)
+_DATE = re.compile(
+    r'(?<!\d)(?:(\d{4})[/-](\d{2})[/-](\d{2})|(\d{2})[/-](\d{2})[/-](\d{4}|\d{2}))(?!\d)'
+)
+# Tabela de str.translate que remove todo caractere ASCII que não é dígito
+# (consulta por caractere em C, sem passar pelo motor de regex)
+_KEEP_DIGITS = str.maketrans({c: None for c in map(chr, range(128)) if not c.isdigit()})
+_CRM = re.compile(r'CRM[:\s]*(\d+)[\s-]*([A-Z]{2})?', re.IGNORECASE)
+
+
+def _only_digits(text: str) -> str:
+    """
+    Mantém apenas os dígitos ASCII do texto.
+    
+    Args:
+        text: Texto de entrada
+        
+    Returns:
+        Somente os dígitos, na ordem original
+    """
+    if not text.isascii():
+        text = text.encode('ascii', 'ignore').decode('ascii')
+    return text.translate(_KEEP_DIGITS)
+
 
 def normalize_date(text: str) -> Optional[str]:
     """
@@ -17,29 +42,19 @@ def normalize_date(text: str) -> Optional[str]:
     Returns:
         Data normalizada ou None
     """
-    # Padrões comuns de data
-    patterns = [
-        r'(\d{2})[/-](\d{2})[/-](\d{4})',  # DD/MM/YYYY ou DD-MM-YYYY
-        r'(\d{2})[/-](\d{2})[/-](\d{2})',   # DD/MM/YY
-        r'(\d{4})[/-](\d{2})[/-](\d{2})',   # YYYY/MM/DD
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text)
-        if match:
-            groups = match.groups()
-            if len(groups) == 3:
-                # Tentar normalizar para DD/MM/YYYY
-                try:
-                    if len(groups[2]) == 2:  # YY
-                        year = "20" + groups[2] if int(groups[2]) < 50 else "19" + groups[2]
-                    else:
-                        year = groups[2]
-                    
-                    # Assumir formato DD/MM/YYYY
-                    return f"{groups[0]}/{groups[1]}/{year}"
-                except:
-                    pass
+    for match in _DATE.finditer(text):
+        iso_year, iso_month, iso_day, day, month, year = match.groups()
+        if iso_year:
+            year, month, day = iso_year, iso_month, iso_day
+        elif len(year) == 2:  # YY
+            year = ("20" if int(year) < 50 else "19") + year
+        
+        # datetime valida a data de calendário (dia 31/02 etc.)
+        try:
+            datetime(int(year), int(month), int(day))
+        except ValueError:
+            continue
+        return f"{day}/{month}/{year}"
     
     return None
 
@@ -55,7 +70,7 @@ def normalize_cpf(text: str) -> Optional[str]:
         CPF normalizado (11 dígitos) ou None
     """
     # Remover tudo exceto dígitos
-    digits = re.sub(r'\D', '', text)
+    digits = _only_digits(text)
     
     if len(digits) == 11:
         # Formatar: XXX.XXX.XXX-XX
@@ -75,7 +90,7 @@ def normalize_crm(text: str) -> Optional[str]:
         CRM normalizado ou None
     """
     # Padrão: CRM seguido de números e estado
-    match = re.search(r'CRM[:\s]*(\d+)[\s-]*([A-Z]{2})?', text, re.IGNORECASE)
+    match = _CRM.search(text)
     if match:
         number = match.group(1)
         state = match.group(2) or ""
@@ -95,7 +110,7 @@ def normalize_phone(text: str) -> Optional[str]:
         Telefone normalizado ou None
     """
     # Remover tudo exceto dígitos
-    digits = re.sub(r'\D', '', text)
+    digits = _only_digits(text)
     
     # Telefone brasileiro: (XX) XXXXX-XXXX ou (XX) XXXX-XXXX
     if len(digits) == 10 or len(digits) == 11:
@@ -117,9 +132,7 @@ def clean_text(text: str) -> str:
     Returns:
         Texto limpo
     """
-    # Remover espaços múltiplos
-    text = re.sub(r'\s+', ' ', text)
-    # Remover espaços no início/fim
-    text = text.strip()
-    return text
+    # Colapsar espaços múltiplos e remover os do início/fim: str.split() sem
+    # argumento separa pelos mesmos espaços Unicode que \s, sem o motor de regex
+    return ' '.join(text.split())
 
@@ -1,60 +1,135 @@
 """Rasterizador de PDF para imagens."""
+import functools
 import logging
-from typing import List
-from PIL import Image
+from typing import Iterator, List, Union
+import numpy as np
 import fitz  # PyMuPDF
-from ..settings import settings
+from ..settings import get_settings
 
 logger = logging.getLogger(__name__)
 
 
+def _page_array(width: int, height: int, channels: int, samples) -> np.ndarray:
+    """
+    Cria a visão numpy (H, W) ou (H, W, C) sobre as amostras de uma página.
+    
+    Args:
+        width: Largura em pixels
+        height: Altura em pixels
+        channels: Número de canais (1 = escala de cinza)
+        samples: Buffer com as amostras (linhas contíguas, sem alpha)
+    
+    Returns:
+        Array uint8 sem cópia
+    """
+    img = np.frombuffer(samples, dtype=np.uint8, count=width * height * channels)
+    return img.reshape((height, width) if channels == 1 else (height, width, channels))
+
+
+def _as_stream(data: Union[bytes, bytearray, memoryview]) -> Union[bytes, bytearray]:
+    """
+    Adapta os dados do PDF ao que fitz.open(stream=...) aceita.
+    
+    O PyMuPDF recusa memoryview: quando a visão cobre o objeto de origem
+    inteiro, o próprio bytes/bytearray é usado (sem cópia).
+    
+    Args:
+        data: Dados binários do PDF
+    
+    Returns:
+        bytes ou bytearray com os mesmos dados
+    """
+    if not isinstance(data, memoryview):
+        return data
+    obj = data.obj
+    if isinstance(obj, (bytes, bytearray)) and data.contiguous and data.nbytes == len(obj):
+        return obj
+    return data.tobytes()
+
+
 class Rasterizer:
     """Converte páginas de PDF em imagens."""
     
-    def __init__(self, dpi: int = None):
+    def __init__(self, dpi: int = None, grayscale: bool = True):
         """
         Inicializa o rasterizador.
         
         Args:
             dpi: Resolução DPI (padrão das settings)
+            grayscale: Se True, o MuPDF renderiza direto em escala de cinza,
+                o formato usado pelo pré-processamento (sem conversão RGB -> cinza)
         """
-        self.dpi = dpi or settings.raster_dpi
+        self.dpi = dpi or get_settings().raster_dpi
         self.scale = self.dpi / 72.0  # PDF padrão é 72 DPI
+        self.grayscale = grayscale
     
-    def pdf_to_images(self, pdf_data: bytes) -> List[Image.Image]:
+    def iter_pages(self, pdf_data: Union[bytes, bytearray, memoryview]) -> Iterator[np.ndarray]:
         """
-        Converte um PDF em lista de imagens PIL.
+        Renderiza um PDF produzindo cada página (array numpy uint8) assim que fica pronta.
+        
+        As páginas são renderizadas em série no próprio processo: o worker do
+        Celery (prefork) é daemônico e não pode criar processos filhos, e o
+        PyMuPDF não libera o GIL nem suporta threads. O paralelismo vem dos
+        processos do Celery, um documento por processo.
         
         Args:
-            pdf_data: Dados binários do PDF
-            
-        Returns:
-            Lista de imagens PIL (uma por página)
+            pdf_data: Dados binários do PDF (bytes, bytearray ou memoryview)
+        
+        Yields:
+            Arrays (H, W) em escala de cinza, ou (H, W, 3) RGB com
+            grayscale=False, na ordem das páginas
         """
-        images = []
+        page_total = 0
         try:
             # Abrir PDF com PyMuPDF
-            doc = fitz.open(stream=pdf_data, filetype="pdf")
-            
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                # Renderizar página como imagem
+            doc = fitz.open(stream=_as_stream(pdf_data), filetype="pdf")
+            try:
                 mat = fitz.Matrix(self.scale, self.scale)
-                pix = page.get_pixmap(matrix=mat)
-                # Converter para PIL Image
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                images.append(img)
-                logger.debug(f"Página {page_num + 1} rasterizada: {img.size}")
-            
-            doc.close()
-            logger.info(f"PDF convertido em {len(images)} páginas")
-            return images
+                colorspace = fitz.csGRAY if self.grayscale else fitz.csRGB
+                for page_num in range(len(doc)):
+                    # Renderizar página como imagem; pix.samples é uma cópia
+                    # (samples_mv não mantém o pixmap vivo)
+                    pix = doc[page_num].get_pixmap(matrix=mat, colorspace=colorspace, alpha=False)
+                    img = _page_array(pix.width, pix.height, pix.n, pix.samples)
+                    page_total += 1
+                    logger.debug(f"Página {page_total} rasterizada: {img.shape[1]}x{img.shape[0]}")
+                    yield img
+            finally:
+                doc.close()
             
+            logger.info(f"PDF convertido em {page_total} páginas")
+        
         except Exception as e:
             logger.error(f"Erro ao rasterizar PDF: {e}")
             raise
+    
+    def pdf_to_images(self, pdf_data: Union[bytes, bytearray, memoryview]) -> List[np.ndarray]:
+        """
+        Converte um PDF em lista de imagens (arrays numpy uint8).
+        
+        Args:
+            pdf_data: Dados binários do PDF (bytes, bytearray ou memoryview)
+        
+        Returns:
+            Lista de arrays (H, W) em escala de cinza, ou (H, W, 3) RGB
+            com grayscale=False (um por página)
+        """
+        return list(self.iter_pages(pdf_data))
+
 
+@functools.cache
+def get_rasterizer() -> Rasterizer:
+    """
+    Retorna a instância global, criada no primeiro uso.
+    
+    Returns:
+        Instância compartilhada de Rasterizer
+    """
+    return Rasterizer()
 
-# Instância global
-rasterizer = Rasterizer()
 
+# Instância global resolvida sob demanda: importar o módulo não a constrói
+def __getattr__(name: str):
+    if name == 'rasterizer':
+        return get_rasterizer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
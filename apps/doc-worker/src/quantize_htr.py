@@ -0,0 +1,63 @@
+"""Quantização INT8 (dinâmica) dos modelos TrOCR ONNX.
+
+Uso (uma vez, após exportar os modelos):
+    python -m src.quantize_htr
+
+Gera os arquivos <modelo>.int8 ao lado dos modelos FP32 configurados.
+Com HTR_ONNX_INT8=true o worker passa a carregar essas variantes.
+"""
+import logging
+import os
+import sys
+from .settings import get_settings
+from .pipeline.htr_handwritten import INT8_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+
+def quantize_model(model_path: str) -> bool:
+    """
+    Quantiza um modelo ONNX para INT8 com quantização dinâmica.
+    
+    Apenas MatMul e Gather (camadas lineares e embeddings) são quantizados:
+    o CPUExecutionProvider não implementa ConvInteger, e um Conv quantizado
+    (o patch embedding do encoder ViT) impediria o carregamento do modelo.
+    
+    Args:
+        model_path: Caminho do modelo FP32
+    
+    Returns:
+        True se o modelo foi quantizado, False se não foi encontrado
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    
+    if not os.path.exists(model_path):
+        logger.warning(f"Modelo não encontrado, ignorando: {model_path}")
+        return False
+    
+    output_path = f"{model_path}{INT8_SUFFIX}"
+    logger.info(f"Quantizando {model_path} -> {output_path}")
+    quantize_dynamic(
+        model_input=model_path,
+        model_output=output_path,
+        weight_type=QuantType.QInt8,
+        op_types_to_quantize=['MatMul', 'Gather']
+    )
+    return True
+
+
+def main() -> int:
+    """Quantiza encoder, decoder e decoder com KV-cache configurados."""
+    settings = get_settings()
+    logging.basicConfig(level=logging.INFO)
+    paths = [
+        settings.htr_onnx_encoder_path,
+        settings.htr_onnx_decoder_path,
+        settings.htr_onnx_decoder_with_past_path,
+    ]
+    quantized = [quantize_model(path) for path in paths if path]
+    return 0 if any(quantized) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
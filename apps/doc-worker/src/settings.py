@@ -1,4 +1,5 @@
 """Configurações da aplicação Doc Worker."""
+import functools
 from pydantic_settings import BaseSettings
 
 
@@ -20,19 +21,32 @@ class Settings(BaseSettings):
     
     # Pipeline
     raster_dpi: int = 300
+    image_decode_max_size: int = 3508
+    heavy_denoise: bool = False  # 2ª passada com NLM em páginas de baixa confiança
+    reuse_duplicate_results: bool = True  # copiar campos de upload idêntico já concluído
     ocr_langs: str = "por+eng"
+    # 0 = CPUs / worker_concurrency. Cada página usa uma única thread do
+    # Tesseract (OMP_THREAD_LIMIT=1 definido pelo worker): o paralelismo é
+    # entre páginas e processos, sem threads OpenMP disputando as mesmas CPUs
+    ocr_workers: int = 0
     htr_onnx_enable: bool = False
     htr_onnx_encoder_path: str = "/models/trocr-encoder.onnx"
     htr_onnx_decoder_path: str = "/models/trocr-decoder.onnx"
+    htr_onnx_decoder_with_past_path: str = "/models/trocr-decoder-with-past.onnx"
+    htr_onnx_int8: bool = False
     htr_onnx_tokenizer_name: str = "microsoft/trocr-base-handwritten"
     htr_onnx_image_size: int = 384
     htr_onnx_max_length: int = 256
     htr_onnx_beam_size: int = 5
+    htr_onnx_batch_size: int = 8
+    htr_onnx_intra_threads: int = 0  # 0 = automático (núcleos / worker_concurrency)
     confidence_threshold: float = 0.8
     model_version: str = "1.0.0"
     
     # Worker
     worker_concurrency: int = 4
+    worker_prefetch_multiplier: int = 1  # maior nos workers dedicados à fila rápida
+    worker_max_tasks_per_child: int = 5000  # vazamentos: monitorar RSS (cgroup), não reciclar
     task_acks_late: bool = True
     task_reject_on_worker_lost: bool = True
     task_max_retries: int = 3
@@ -43,6 +57,19 @@ class Settings(BaseSettings):
         case_sensitive = False
 
 
-# Instância global
-settings = Settings()
+@functools.cache
+def get_settings() -> Settings:
+    """
+    Retorna a instância global, criada no primeiro uso.
+    
+    Returns:
+        Instância compartilhada de Settings
+    """
+    return Settings()
+
 
+# Instância global resolvida sob demanda: importar o módulo não a constrói
+def __getattr__(name: str):
+    if name == 'settings':
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,27 +1,44 @@
 """Worker Celery para processamento de documentos."""
+import os
+
+# OpenMP com uma thread por processo: o paralelismo vem dos processos do
+# Celery e do pool de threads do OCR (ver settings.ocr_workers). Precisa
+# estar no ambiente antes de numpy (OpenBLAS) e libtesseract serem carregados
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+
 import logging
+import threading
 import time
 import json
 import asyncio
+from typing import Any, Awaitable, Iterable, Iterator, List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from celery import Celery
 from celery.exceptions import Retry
+from celery.signals import setup_logging, worker_process_init
 from .settings import settings
+from .json_logging import configure_logging
 from .pipeline.file_loader import file_loader
 from .pipeline.rasterizer import rasterizer
 from .pipeline.preprocess import preprocess_image
-from .pipeline.ocr_printed import ocr_printed
-from .pipeline.htr_handwritten import htr_handwritten
-from .pipeline.mapping import field_mapper
+from .pipeline import ocr_printed, htr_handwritten
+from .pipeline.ocr_printed import ocr_printed_batch
+from .pipeline.htr_handwritten import htr_handwritten_batch
+from .pipeline.mapping import get_field_mapper
 from .pipeline.persistence import persistence
 from .models import MedicalReport, DocumentField
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='{"timestamp": "%(asctime)s", "level": "%(levelname)s", "message": "%(message)s", "service": "doc-worker"}'
-)
+# Configurar logging (JSON serializado com orjson)
+configure_logging('doc-worker')
 logger = logging.getLogger(__name__)
 
+
+@setup_logging.connect
+def configure_celery_logging(loglevel=None, **kwargs):
+    """Mantém o formatter JSON no worker em vez da configuração de log do Celery."""
+    configure_logging('doc-worker', level=loglevel or logging.INFO)
+
 # Criar app Celery
 celery_app = Celery(
     'doc_worker',
@@ -37,31 +54,211 @@ celery_app.conf.update(
     result_serializer='json',
     timezone='UTC',
     enable_utc=True,
-    worker_prefetch_multiplier=1,
-    worker_max_tasks_per_child=50,
+    # 1 na fila padrão (PDFs longos não ficam presos atrás de outro
+    # documento); workers só da fila rápida (imagens) usam prefetch maior
+    worker_prefetch_multiplier=settings.worker_prefetch_multiplier,
+    # Os processos filhos mantêm Tesseract, ONNX e pool do banco carregados;
+    # reciclar com frequência repetiria o cold start (vazamentos de memória
+    # são detectados pelo RSS do container, não por reciclagem cega)
+    worker_max_tasks_per_child=settings.worker_max_tasks_per_child,
     task_default_queue='process_document',
     task_routes={
         'src.worker.process_document': {'queue': 'process_document'},
     },
 )
 
-# Inicializar pool de conexões uma vez
-_persistence_initialized = False
+# Thread única para o HTR: as sessões ONNX são compartilhadas (run() é thread-safe)
+# e o modelo não é duplicado em memória
+_htr_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='htr')
+
+# Pré-processamento em threads (o OpenCV libera o GIL): a página P+1 é
+# pré-processada enquanto o Tesseract reconhece a página P
+_preprocess_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='preprocess')
+
+# Download do S3 em segundo plano, enquanto a task faz os round-trips ao banco
+_download_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='download')
+
+# Resultado da task quando o documento não pôde ser registrado na base
+NOT_REGISTERED_RESULT = {"status": "error", "message": "Document not found and could not be created"}
+
+# Loop de eventos único por processo, rodando em uma thread própria: o pool do
+# asyncpg vive sempre no mesmo loop e as tasks apenas despacham corrotinas.
+# É criado sob demanda (e recriado após fork), pois a thread não sobrevive ao
+# fork dos processos filhos do Celery
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+_loop_lock = threading.Lock()
+_persistence_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Obtém o loop de eventos do processo, iniciando sua thread se necessário.
+    
+    Returns:
+        Loop de eventos rodando em segundo plano
+    """
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='asyncio-loop', daemon=True).start()
+            _loop_pid = os.getpid()
+        return _loop
+
+
+def submit_async(coro: Awaitable[Any]) -> Future:
+    """
+    Agenda uma corrotina no loop do processo sem aguardar o resultado.
+    
+    Args:
+        coro: Corrotina a executar
+    
+    Returns:
+        Future (concurrent.futures) com o resultado da corrotina
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+
+def run_async(coro: Awaitable[Any]) -> Any:
+    """
+    Executa uma corrotina no loop do processo e aguarda o resultado.
+    
+    Args:
+        coro: Corrotina a executar
+    
+    Returns:
+        Resultado da corrotina
+    """
+    return submit_async(coro).result()
 
 
 def ensure_persistence_initialized():
-    """Garante que o pool de conexões está inicializado."""
-    global _persistence_initialized
-    if not _persistence_initialized:
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        
+    """Garante que o pool de conexões está inicializado (uma vez por processo)."""
+    with _persistence_lock:
         if not persistence.conn_pool:
-            loop.run_until_complete(persistence.initialize())
-        _persistence_initialized = True
+            run_async(persistence.initialize())
+
+
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    """
+    Carrega os recursos pesados em cada processo filho, logo após o fork.
+    
+    Falhas não impedem o processo de subir: cada recurso volta a ser
+    carregado sob demanda na primeira task.
+    """
+    try:
+        ensure_persistence_initialized()
+    except Exception as e:
+        logger.warning(f"Pool de conexões não inicializado no warm-up: {e}")
+    try:
+        ocr_printed.warm_up()
+        htr_handwritten.load_models()
+    except Exception as e:
+        logger.warning(f"Erro no warm-up dos modelos: {e}")
+    logger.info(f"Processo {os.getpid()} aquecido")
+
+
+def document_registered(started: Future, document_id: str) -> bool:
+    """
+    Aguarda o registro do documento (start_document) agendado no início da task.
+    
+    Args:
+        started: Future de persistence.start_document
+        document_id: ID do documento
+    
+    Returns:
+        True se o documento está registrado como PROCESSING
+    """
+    if started.result():
+        return True
+    logger.warning(f"Documento {document_id} não pôde ser registrado na base")
+    return False
+
+
+def preprocess_as_rasterized(
+    pages: Iterable,
+    images: List,
+    preprocess_futures: List[Future],
+    pages_ready: Optional[Future]
+) -> Iterator[Future]:
+    """
+    Submete o pré-processamento de cada página assim que ela é rasterizada.
+    
+    Args:
+        pages: Páginas na ordem do documento (pode ser um gerador)
+        images: Lista preenchida com as páginas originais
+        preprocess_futures: Lista preenchida com os futures do pré-processamento
+        pages_ready: Future resolvido com preprocess_futures após a última
+            página (None quando o HTR está desabilitado)
+    
+    Yields:
+        Future do pré-processamento de cada página, em ordem
+    """
+    for img in pages:
+        images.append(img)
+        future = _preprocess_executor.submit(preprocess_image, img)
+        preprocess_futures.append(future)
+        yield future
+    if pages_ready is not None:
+        pages_ready.set_result(preprocess_futures)
+
+
+def htr_after_preprocess(pages_ready: Future) -> List[Tuple[str, float]]:
+    """
+    Executa o HTR em lote assim que todas as páginas estiverem pré-processadas.
+    
+    Args:
+        pages_ready: Future com os futures do pré-processamento, na ordem das páginas
+    
+    Returns:
+        Lista de tuplas (texto_extraído, confiança), na ordem das páginas
+    """
+    return htr_handwritten_batch([future.result() for future in pages_ready.result()])
+
+
+def reuse_completed_result(
+    document_id: str,
+    tenant: str,
+    sha256: str,
+    start_time: float
+) -> Optional[dict]:
+    """
+    Reaproveita o resultado de um upload idêntico (mesmo SHA256 e tenant) já
+    concluído: copia os campos no banco e marca o documento como DONE, na
+    mesma transação.
+    
+    Args:
+        document_id: ID do documento atual
+        tenant: Tenant do documento
+        sha256: Hash SHA256 verificado do conteúdo
+        start_time: Início do processamento (time.time())
+    
+    Returns:
+        Resultado da task, ou None se não houver documento equivalente
+    """
+    previous = run_async(
+        persistence.find_completed_by_sha256(sha256, tenant, document_id)
+    )
+    if previous is None:
+        return None
+    
+    previous_id, pages = previous
+    processing_time = time.time() - start_time
+    fields_count = run_async(
+        persistence.complete_from_duplicate(document_id, previous_id, pages, processing_time)
+    )
+    
+    logger.info(f"Resultado reaproveitado de {previous_id}: {document_id} ({processing_time:.2f}s)")
+    
+    return {
+        "status": "success",
+        "document_id": document_id,
+        "pages": pages,
+        "fields_count": fields_count,
+        "processing_time": processing_time
+    }
 
 
 @celery_app.task(name='process_document', bind=True, max_retries=3, default_retry_delay=60)
@@ -79,76 +276,65 @@ def process_document(self, message: dict):
     
     start_time = time.time()
     logger.info(f"Iniciando processamento: {document_id}")
+    htr_future = None
+    pages_ready = None
+    preprocess_futures = []
+    started = None
     
     try:
         # Garantir que persistência está inicializada
         ensure_persistence_initialized()
         
-        # Obter loop de eventos
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+        # Determinar tipo de arquivo pela extensão do object_key ou pelo content_type
+        file_type = file_loader.get_file_type(object_key, message.get('content_type'))
         
-        # Criar documento na base se não existir
-        created = loop.run_until_complete(
-            persistence.create_document(document_id, tenant, object_key, sha256)
-        )
-        if not created:
-            # Verificar se já existe (pode ser reprocessamento)
-            exists = loop.run_until_complete(persistence.document_exists(document_id))
-            if not exists:
-                logger.warning(f"Documento {document_id} não encontrado na base e não pôde ser criado")
-                return {"status": "error", "message": "Document not found and could not be created"}
+        # Iniciar o download do S3 já, em uma thread própria:
+        # o GET corre em paralelo com os round-trips ao banco abaixo
+        if file_type == 'image':
+            download = file_loader.download_image_array_with_hash
+        else:
+            download = file_loader.download_file_with_hash
+        download_future = _download_executor.submit(download, object_key)
         
-        # Atualizar status para PROCESSING
-        loop.run_until_complete(
-            persistence.update_document_status(document_id, "PROCESSING")
+        # Criar o documento (ou reaproveitar o existente, em reprocessamentos)
+        # já com status PROCESSING, sem bloquear a task: o registro só é
+        # aguardado antes da próxima escrita no documento (reuso, DONE ou FAILED)
+        started = submit_async(
+            persistence.start_document(document_id, tenant, object_key, sha256)
         )
         
-        # Determinar tipo de arquivo baseado no object_key ou content_type
-        content_type = message.get('content_type', '')
-        file_type = file_loader.get_file_type(object_key)
-        
-        # Se não conseguir determinar pela extensão, tentar pelo content_type
-        if not file_type:
-            if 'pdf' in content_type.lower():
-                file_type = 'pdf'
-            elif any(img_type in content_type.lower() for img_type in ['png', 'jpeg', 'jpg', 'image']):
-                file_type = 'image'
-        
         images = []
         
         if file_type == 'image':
-            # 1. Baixar imagem diretamente do S3
+            # 1. Aguardar o download da imagem do S3 (hash calculado durante o download)
             logger.info(f"Processando imagem: {object_key}")
-            img = file_loader.download_image(object_key)
-            if not img:
+            downloaded = download_future.result()
+            if not downloaded:
                 raise Exception("Erro ao baixar imagem do S3")
+            img, calculated_hash = downloaded
             
-            # Validar imagem
-            file_data = file_loader.download_file(object_key)
-            if file_data:
-                is_valid, error_msg = file_loader.validate_image(file_data)
-                if not is_valid:
-                    raise Exception(f"Imagem inválida: {error_msg}")
-                
-                # Verificar hash
-                calculated_hash = file_loader.calculate_sha256(file_data)
-                if calculated_hash != sha256:
-                    logger.warning(f"Hash mismatch para {document_id}")
+            # Verificar hash
+            if calculated_hash != sha256:
+                logger.warning(f"Hash mismatch para {document_id}")
+            elif settings.reuse_duplicate_results:
+                # Upload idêntico já processado: pular OCR e copiar os campos
+                if not document_registered(started, document_id):
+                    return dict(NOT_REGISTERED_RESULT)
+                reused = reuse_completed_result(document_id, tenant, sha256, start_time)
+                if reused:
+                    return reused
             
             # Imagem já está pronta, não precisa rasterizar
-            images = [img]
-            logger.info(f"Imagem carregada diretamente: {img.size}")
-            
+            pages = [img]
+            logger.info(f"Imagem carregada diretamente: {img.shape[1]}x{img.shape[0]}")
+        
         else:
-            # 1. Baixar PDF do S3
+            # 1. Aguardar o download do PDF do S3 (hash calculado durante o download)
             logger.info(f"Processando PDF: {object_key}")
-            pdf_data = file_loader.download_pdf(object_key)
-            if not pdf_data:
+            downloaded = download_future.result()
+            if not downloaded:
                 raise Exception("Erro ao baixar PDF do S3")
+            pdf_data, calculated_hash = downloaded
             
             # Validar PDF
             is_valid, error_msg = file_loader.validate_pdf(pdf_data)
@@ -156,69 +342,95 @@ def process_document(self, message: dict):
                 raise Exception(f"PDF inválido: {error_msg}")
             
             # Verificar hash
-            calculated_hash = file_loader.calculate_sha256(pdf_data)
             if calculated_hash != sha256:
                 logger.warning(f"Hash mismatch para {document_id}")
+            elif settings.reuse_duplicate_results:
+                # Upload idêntico já processado: pular rasterização/OCR e copiar os campos
+                if not document_registered(started, document_id):
+                    return dict(NOT_REGISTERED_RESULT)
+                reused = reuse_completed_result(document_id, tenant, sha256, start_time)
+                if reused:
+                    return reused
             
-            # 2. Rasterizar PDF
-            images = rasterizer.pdf_to_images(pdf_data)
-            if not images:
-                raise Exception("Nenhuma página encontrada no PDF")
+            # 2. Rasterizar PDF sob demanda: cada página segue para o pré-processamento
+            # e o OCR assim que é renderizada, enquanto as seguintes renderizam
+            pages = rasterizer.iter_pages(pdf_data)
         
-        # 3. Processar cada página
+        # 3. Pré-processar as páginas em segundo plano e iniciar o HTR manuscrito
+        # em lote (se habilitado) quando todas estiverem prontas: o ONNX Runtime
+        # libera o GIL, então o encoder/decoder roda em paralelo com o OCR impresso
+        # Com o HTR desabilitado nada é enviado à thread do HTR
+        if settings.htr_onnx_enable:
+            pages_ready = Future()
+            htr_future = _htr_executor.submit(htr_after_preprocess, pages_ready)
+        
+        # 4. OCR impresso de cada página assim que seu pré-processamento termina
+        # (API do Tesseract residente no processo)
+        printed_results = ocr_printed_batch(
+            future.result()
+            for future in preprocess_as_rasterized(pages, images, preprocess_futures, pages_ready)
+        )
+        if not images:
+            raise Exception("Nenhuma página encontrada no PDF")
+        for page_num, (printed_text, printed_conf) in enumerate(printed_results, start=1):
+            if settings.heavy_denoise and printed_conf < settings.confidence_threshold:
+                # Segunda passada com o denoise NLM (caro) só para páginas de baixa confiança
+                retry_text, retry_conf = ocr_printed_batch(
+                    [preprocess_image(images[page_num - 1], heavy_denoise=True)]
+                )[0]
+                logger.debug("OCR página %d com denoise NLM: confiança %.2f", page_num, retry_conf)
+                if retry_conf > printed_conf:
+                    printed_text, printed_conf = retry_text, retry_conf
+                    printed_results[page_num - 1] = (printed_text, printed_conf)
+            logger.debug(
+                "OCR página %d/%d: %d caracteres extraídos, confiança: %.2f",
+                page_num, len(images), len(printed_text), printed_conf
+            )
+        
+        # 5. Combinar com o HTR e mapear campos de cada página
+        if htr_future is not None:
+            handwritten_results = htr_future.result()
+        else:
+            handwritten_results = [("", 0.0)] * len(images)
+        # Mapeador do conjunto de padrões do tenant (compilado uma vez por processo)
+        field_mapper = get_field_mapper(tenant)
         all_fields = []
-        for page_num, img in enumerate(images, start=1):
-            logger.info(f"Processando página {page_num}/{len(images)}")
-            
-            # Pré-processar
-            processed_img = preprocess_image(img)
-            
-            # OCR impresso
-            printed_text, printed_conf = ocr_printed(processed_img)
-            logger.info(f"OCR página {page_num}: {len(printed_text)} caracteres extraídos, confiança: {printed_conf:.2f}")
-            if printed_text:
-                logger.debug(f"Texto OCR (primeiros 200 chars): {printed_text[:200]}")
-            
-            # HTR manuscrito (se habilitado)
-            handwritten_text, handwritten_conf = htr_handwritten(processed_img)
-            if handwritten_text:
-                logger.info(f"HTR página {page_num}: {len(handwritten_text)} caracteres extraídos")
-            
+        for page_num, ((printed_text, printed_conf), (handwritten_text, handwritten_conf)) in enumerate(
+            zip(printed_results, handwritten_results), start=1
+        ):
             # Combinar textos
             combined_text = f"{printed_text}\n{handwritten_text}".strip()
             combined_conf = max(printed_conf, handwritten_conf) if handwritten_conf > 0 else printed_conf
             
-            logger.info(f"Texto combinado página {page_num}: {len(combined_text)} caracteres")
-            
             # Mapear campos
             fields = field_mapper.extract_fields(
                 combined_text,
                 page=page_num,
                 confidence=combined_conf
             )
-            logger.info(f"Campos extraídos página {page_num}: {len(fields)}")
-            if fields:
-                for field in fields:
-                    logger.info(f"  - {field.field_name}: {field.field_value} (conf: {field.confidence:.2f})")
+            logger.debug(
+                "Página %d: %d caracteres combinados (HTR: %d), %d campos",
+                page_num, len(combined_text), len(handwritten_text), len(fields)
+            )
             all_fields.extend(fields)
         
-        # 4. Persistir campos
-        loop.run_until_complete(
-            persistence.save_document_fields(document_id, all_fields)
-        )
-        
-        # 5. Atualizar status para DONE
+        # 6. Persistir campos e status DONE (uma conexão, uma transação)
+        if not document_registered(started, document_id):
+            return dict(NOT_REGISTERED_RESULT)
         processing_time = time.time() - start_time
-        loop.run_until_complete(
-            persistence.update_document_status(
+        run_async(
+            persistence.complete_document(
                 document_id,
-                "DONE",
+                all_fields,
                 pages=len(images),
                 processing_time=processing_time
             )
         )
         
-        logger.info(f"Processamento concluído: {document_id} ({processing_time:.2f}s)")
+        logger.info(
+            "Processamento concluído: %s (%.2fs)", document_id, processing_time,
+            extra={"document_id": document_id, "pages": len(images), "fields": len(all_fields)}
+        )
         
         return {
             "status": "success",
@@ -227,21 +439,28 @@ def process_document(self, message: dict):
             "fields_count": len(all_fields),
             "processing_time": processing_time
         }
-        
+    
     except Exception as e:
         logger.error(f"Erro ao processar documento {document_id}: {e}", exc_info=True)
         
-        # Atualizar status para FAILED
+        # Cancelar o pré-processamento e o HTR pendentes (ou aguardar o que já está
+        # rodando) para que não disputem CPU com a próxima tentativa nem atrasem
+        # a fila dos executores
+        for future in preprocess_futures:
+            future.cancel()
+        if pages_ready is not None and not pages_ready.done():
+            pages_ready.cancel()
+        if htr_future is not None and not htr_future.cancel():
+            wait([htr_future])
+        
+        # Atualizar status para FAILED (depois do registro PROCESSING, que
+        # poderia sobrescrevê-lo se ainda estivesse em andamento)
+        if started is not None:
+            wait([started])
         try:
             ensure_persistence_initialized()
-            try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
             if persistence.conn_pool:
-                loop.run_until_complete(
+                run_async(
                     persistence.update_document_status(
                         document_id,
                         "FAILED",
@@ -0,0 +1,474 @@
+"""Unit tests for FileLoader."""
+import hashlib
+import io
+import pytest
+from unittest.mock import Mock, patch
+import sys
+
+
+def _conditional_get_object(payload, etag='"v1"'):
+    """Build a fake get_object that answers 304 when If-None-Match matches the current ETag."""
+    from botocore.exceptions import ClientError
+    state = {'etag': etag, 'downloads': []}
+    
+    def get_object(**kwargs):
+        if kwargs.get('IfNoneMatch') == state['etag']:
+            raise ClientError(
+                {'Error': {'Code': '304', 'Message': 'Not Modified'},
+                 'ResponseMetadata': {'HTTPStatusCode': 304}},
+                'GetObject'
+            )
+        state['downloads'].append(kwargs['Key'])
+        return {'Body': io.BytesIO(payload), 'ETag': state['etag']}
+    
+    return get_object, state
+
+
+class TestFileLoader:
+    """Tests for FileLoader."""
+    
+    def test_calculate_sha256_should_match_hashlib(self, sample_pdf_content):
+        """Test that calculate_sha256 matches hashlib.sha256."""
+        # Arrange
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3'):
+            from src.pipeline.file_loader import FileLoader
+            loader = FileLoader()
+            
+            # Act
+            result = loader.calculate_sha256(sample_pdf_content)
+            
+            # Assert
+            assert result == hashlib.sha256(sample_pdf_content).hexdigest()
+    
+    def test_calculate_sha256_should_hash_data_larger_than_chunk(self):
+        """Test that calculate_sha256 handles data spanning several chunks."""
+        # Arrange
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3'):
+            from src.pipeline.file_loader import FileLoader, HASH_CHUNK_SIZE
+            loader = FileLoader()
+            data = b'\x01\x02\x03' * HASH_CHUNK_SIZE
+            
+            # Act
+            result = loader.calculate_sha256(data)
+            
+            # Assert
+            assert result == hashlib.sha256(data).hexdigest()
+    
+    def test_download_file_should_return_data(self, sample_pdf_content):
+        """Test that download_file returns the raw bytes by default."""
+        # Arrange
+        mock_s3_client = Mock()
+        mock_body = Mock()
+        mock_body.read.return_value = sample_pdf_content
+        mock_s3_client.get_object.return_value = {'Body': mock_body}
+        
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3') as mock_boto3:
+            mock_boto3.client.return_value = mock_s3_client
+            from src.pipeline.file_loader import FileLoader, RANGE_CHUNK_SIZE
+            loader = FileLoader()
+            
+            # Act
+            result = loader.download_file("test-tenant/test-doc.pdf")
+            
+            # Assert
+            assert result == sample_pdf_content
+            mock_s3_client.get_object.assert_called_once_with(
+                Bucket='test-bucket',
+                Key="test-tenant/test-doc.pdf",
+                Range=f"bytes=0-{RANGE_CHUNK_SIZE - 1}"
+            )
+    
+    def test_download_file_with_hash_should_stream_hash(self, sample_pdf_content):
+        """Test that download_file_with_hash hashes the body chunk by chunk."""
+        # Arrange
+        chunks = [sample_pdf_content[:10], sample_pdf_content[10:], b'']
+        mock_s3_client = Mock()
+        mock_body = Mock()
+        mock_body.read.side_effect = chunks
+        mock_s3_client.get_object.return_value = {'Body': mock_body}
+        
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3') as mock_boto3:
+            mock_boto3.client.return_value = mock_s3_client
+            from src.pipeline.file_loader import FileLoader, HASH_CHUNK_SIZE
+            loader = FileLoader()
+            
+            # Act
+            data, sha256 = loader.download_file_with_hash("test-tenant/test-doc.pdf")
+            
+            # Assert
+            assert data == sample_pdf_content
+            assert sha256 == hashlib.sha256(sample_pdf_content).hexdigest()
+            mock_body.read.assert_called_with(HASH_CHUNK_SIZE)
+    
+    def test_download_file_should_fetch_large_objects_in_parallel_ranges(self):
+        """Test that download_file assembles the remaining byte ranges in order."""
+        # Arrange
+        data = bytes(range(256)) * 4
+        
+        def get_object(Bucket, Key, Range, IfMatch=None):
+            start, end = (int(x) for x in Range[len('bytes='):].split('-'))
+            end = min(end, len(data) - 1)
+            return {
+                'Body': io.BytesIO(data[start:end + 1]),
+                'ContentRange': f"bytes {start}-{end}/{len(data)}",
+                'ETag': '"v1"'
+            }
+        
+        mock_s3_client = Mock()
+        mock_s3_client.get_object.side_effect = get_object
+        
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3') as mock_boto3, \
+                patch('src.pipeline.file_loader.RANGE_CHUNK_SIZE', 100):
+            mock_boto3.client.return_value = mock_s3_client
+            from src.pipeline.file_loader import FileLoader
+            loader = FileLoader()
+            
+            # Act
+            result, sha256 = loader.download_file_with_hash("test-tenant/big.pdf")
+            
+            # Assert
+            assert result == data
+            assert sha256 == hashlib.sha256(data).hexdigest()
+            assert mock_s3_client.get_object.call_count == 11
+            ranged_calls = mock_s3_client.get_object.call_args_list[1:]
+            assert all(call.kwargs['IfMatch'] == '"v1"' for call in ranged_calls)
+    
+    @pytest.mark.parametrize("failure", ["short", "changed"])
+    def test_download_file_should_return_none_when_a_range_fails(self, failure):
+        """Test that a truncated range or an object overwritten mid-download yields None."""
+        # Arrange
+        from botocore.exceptions import ClientError
+        data = bytes(range(256))
+        
+        def get_object(Bucket, Key, Range, IfMatch=None):
+            start, end = (int(x) for x in Range[len('bytes='):].split('-'))
+            end = min(end, len(data) - 1)
+            if start > 0 and failure == "changed":
+                raise ClientError(
+                    {'Error': {'Code': 'PreconditionFailed', 'Message': 'ETag changed'}},
+                    'GetObject'
+                )
+            if start > 0:
+                end -= 1
+            return {
+                'Body': io.BytesIO(data[start:end + 1]),
+                'ContentRange': f"bytes {start}-{end}/{len(data)}",
+                'ETag': '"v1"'
+            }
+        
+        mock_s3_client = Mock()
+        mock_s3_client.get_object.side_effect = get_object
+        
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3') as mock_boto3, \
+                patch('src.pipeline.file_loader.RANGE_CHUNK_SIZE', 100):
+            mock_boto3.client.return_value = mock_s3_client
+            from src.pipeline.file_loader import FileLoader
+            loader = FileLoader()
+            
+            # Act
+            result = loader.download_file("test-tenant/big.pdf")
+            
+            # Assert
+            assert result is None
+    
+    def test_download_file_with_hash_should_return_none_on_error(self):
+        """Test that download_file_with_hash returns None on error."""
+        # Arrange
+        from botocore.exceptions import ClientError
+        mock_s3_client = Mock()
+        mock_s3_client.get_object.side_effect = ClientError(
+            {'Error': {'Code': 'NoSuchKey', 'Message': 'Key not found'}},
+            'GetObject'
+        )
+        
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3') as mock_boto3:
+            mock_boto3.client.return_value = mock_s3_client
+            from src.pipeline.file_loader import FileLoader
+            loader = FileLoader()
+            
+            # Act
+            result = loader.download_file_with_hash("test-tenant/nonexistent.pdf")
+            
+            # Assert
+            assert result is None
+    
+    @pytest.mark.parametrize("data,expected", [
+        (b'%PDF-1.4\n%%EOF', 'pdf'),
+        (b'\x89PNG\r\n\x1a\n\x00\x00', 'png'),
+        (b'\xff\xd8\xff\xe0\x00\x10JFIF', 'jpeg'),
+        (b'NOTAFILE1234', None),
+        (b'', None),
+    ])
+    def test_classify_should_detect_file_kind(self, data, expected):
+        """Test that classify detects the file kind from magic bytes."""
+        # Arrange
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3'):
+            from src.pipeline.file_loader import FileLoader
+            loader = FileLoader()
+            
+            # Act
+            kind, error_msg = loader.classify(data)
+            
+            # Assert
+            assert kind == expected
+            assert (error_msg is None) == (expected is not None)
+    
+    @pytest.mark.parametrize("object_key,content_type,expected", [
+        ("tenant/doc.PDF", None, 'pdf'),
+        ("tenant/scan.jpeg", "application/pdf", 'image'),
+        ("tenant/upload", "application/pdf; charset=binary", 'pdf'),
+        ("tenant/upload", "IMAGE/PNG", 'image'),
+        ("tenant/upload", "image/webp", 'image'),
+        ("tenant/upload.bin", "application/octet-stream", None),
+        ("tenant/upload", None, None),
+    ])
+    def test_get_file_type_should_prefer_extension_then_content_type(
+        self, object_key, content_type, expected
+    ):
+        """Test that get_file_type maps the extension first and falls back to the MIME type."""
+        # Arrange
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3'):
+            from src.pipeline.file_loader import FileLoader
+            loader = FileLoader()
+            
+            # Act
+            file_type = loader.get_file_type(object_key, content_type)
+            
+            # Assert
+            assert file_type == expected
+    
+    def test_validate_image_should_reject_pdf(self, sample_pdf_content):
+        """Test that validate_image rejects PDF data."""
+        # Arrange
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3'):
+            from src.pipeline.file_loader import FileLoader
+            loader = FileLoader()
+            
+            # Act
+            is_valid, error_msg = loader.validate_image(sample_pdf_content)
+            
+            # Assert
+            assert is_valid is False
+            assert error_msg == "Arquivo não é uma imagem válida (PNG ou JPEG)"
+            assert loader.validate_pdf(sample_pdf_content) == (True, None)
+            assert loader.validate_pdf(memoryview(sample_pdf_content)) == (True, None)
+    
+    def test_download_image_should_reuse_decoded_image(self, sample_image):
+        """Test that download_image revalidates with a conditional GET and decodes each version once."""
+        # Arrange
+        buffer = io.BytesIO()
+        sample_image.save(buffer, format='PNG')
+        mock_s3_client = Mock()
+        mock_s3_client.get_object.side_effect, state = _conditional_get_object(buffer.getvalue())
+        
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3') as mock_boto3:
+            mock_boto3.client.return_value = mock_s3_client
+            from src.pipeline.file_loader import FileLoader
+            loader = FileLoader()
+            
+            # Act
+            first = loader.download_image("test-tenant/test-doc.png")
+            second = loader.download_image("test-tenant/test-doc.png")
+            
+            # Assert
+            assert first.mode == 'RGB'
+            assert first.size == sample_image.size
+            assert second.tobytes() == first.tobytes()
+            assert state['downloads'] == ["test-tenant/test-doc.png"]
+            assert mock_s3_client.get_object.call_args.kwargs['IfNoneMatch'] == '"v1"'
+            mock_s3_client.head_object.assert_not_called()
+    
+    def test_download_image_should_downscale_large_jpeg_during_decode(self):
+        """Test that large JPEGs are reduced by libjpeg without going below the max size."""
+        # Arrange
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), color='white').save(buffer, format='JPEG')
+        mock_s3_client = Mock()
+        mock_s3_client.get_object.return_value = {'Body': io.BytesIO(buffer.getvalue())}
+        
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3') as mock_boto3:
+            mock_boto3.client.return_value = mock_s3_client
+            from src.pipeline.file_loader import FileLoader
+            loader = FileLoader(image_max_size=300)
+            
+            # Act
+            img = loader.download_image("test-tenant/photo.jpg")
+            
+            # Assert
+            assert img.mode == 'RGB'
+            assert img.size == (400, 300)
+    
+    def test_download_image_should_not_cache_errors(self):
+        """Test that a failed download is retried on the next call."""
+        # Arrange
+        from botocore.exceptions import ClientError
+        mock_s3_client = Mock()
+        mock_s3_client.get_object.side_effect = ClientError(
+            {'Error': {'Code': 'NoSuchKey', 'Message': 'Key not found'}},
+            'GetObject'
+        )
+        
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3') as mock_boto3:
+            mock_boto3.client.return_value = mock_s3_client
+            from src.pipeline.file_loader import FileLoader
+            loader = FileLoader()
+            
+            # Act
+            first = loader.download_image("test-tenant/nonexistent.png")
+            second = loader.download_image("test-tenant/nonexistent.png")
+            
+            # Assert
+            assert first is None
+            assert second is None
+            assert mock_s3_client.get_object.call_count == 2
+    
+    def test_download_image_with_hash_should_refetch_when_etag_changes(self, sample_image):
+        """Test that an overwritten object (new ETag) is downloaded again and hashed."""
+        # Arrange
+        buffer = io.BytesIO()
+        sample_image.save(buffer, format='PNG')
+        mock_s3_client = Mock()
+        mock_s3_client.get_object.side_effect, state = _conditional_get_object(buffer.getvalue())
+        
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3') as mock_boto3:
+            mock_boto3.client.return_value = mock_s3_client
+            from src.pipeline.file_loader import FileLoader
+            loader = FileLoader()
+            
+            # Act
+            results = [loader.download_image_with_hash("test-tenant/test-doc.png") for _ in range(2)]
+            state['etag'] = '"v2"'
+            results.append(loader.download_image_with_hash("test-tenant/test-doc.png"))
+            results.append(loader.download_image_with_hash("test-tenant/test-doc.png"))
+            
+            # Assert
+            assert [sha256 for _, sha256 in results] == [hashlib.sha256(buffer.getvalue()).hexdigest()] * 4
+            assert mock_s3_client.get_object.call_count == 4
+            assert len(state['downloads']) == 2
+            assert mock_s3_client.get_object.call_args.kwargs['IfNoneMatch'] == '"v2"'
+    
+    def test_download_image_array_with_hash_should_return_the_cached_array_without_copies(self, sample_image):
+        """Test that the array variant hands out the same read-only RGB array on cache hits."""
+        # Arrange
+        buffer = io.BytesIO()
+        sample_image.save(buffer, format='PNG')
+        mock_s3_client = Mock()
+        mock_s3_client.get_object.side_effect, _ = _conditional_get_object(buffer.getvalue())
+        
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3') as mock_boto3:
+            mock_boto3.client.return_value = mock_s3_client
+            from src.pipeline.file_loader import FileLoader
+            loader = FileLoader()
+            
+            # Act
+            first, sha256 = loader.download_image_array_with_hash("test-tenant/test-doc.png")
+            second, _ = loader.download_image_array_with_hash("test-tenant/test-doc.png")
+            
+            # Assert
+            assert first is second
+            assert first.shape == (sample_image.height, sample_image.width, 3)
+            assert not first.flags.writeable
+            assert sha256 == hashlib.sha256(buffer.getvalue()).hexdigest()
+    
+    def test_download_image_should_evict_least_recently_used_beyond_byte_limit(self):
+        """Test that the decoded image cache is bounded by memory, not by entries."""
+        # Arrange
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', (10, 10), color='white').save(buffer, format='PNG')
+        mock_s3_client = Mock()
+        mock_s3_client.get_object.side_effect, state = _conditional_get_object(buffer.getvalue())
+        
+        if 'src.pipeline.file_loader' in sys.modules:
+            del sys.modules['src.pipeline.file_loader']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.file_loader.boto3') as mock_boto3, \
+                patch('src.pipeline.file_loader.IMAGE_CACHE_MAX_BYTES', 2 * 10 * 10 * 3):
+            mock_boto3.client.return_value = mock_s3_client
+            from src.pipeline.file_loader import FileLoader
+            loader = FileLoader()
+            
+            # Act
+            for key in ["a.png", "b.png", "a.png", "c.png", "a.png", "b.png"]:
+                loader.download_image(key)
+            
+            # Assert
+            assert state['downloads'] == ["a.png", "b.png", "c.png", "b.png"]
@@ -2,14 +2,16 @@
 import pytest
 from unittest.mock import patch, MagicMock
 from PIL import Image
+import numpy as np
 import sys
 
 
 class TestHTRHandwritten:
     """Tests for htr_handwritten function."""
     
-    def test_htr_handwritten_should_return_empty_when_disabled(self, sample_image):
-        """Test that htr_handwritten returns empty when ONNX is disabled."""
+    @pytest.mark.parametrize("enabled", [False, True])
+    def test_htr_handwritten_should_return_empty_without_models(self, sample_image, enabled):
+        """Test that htr_handwritten returns empty when ONNX is disabled or the models are missing."""
         # Arrange
         if 'src.pipeline.htr_handwritten' in sys.modules:
             del sys.modules['src.pipeline.htr_handwritten']
@@ -21,69 +23,641 @@ class TestHTRHandwritten:
             'onnxruntime': MagicMock(),
             'transformers': MagicMock()
         }):
-            with patch('src.pipeline.htr_handwritten.settings') as mock_settings:
-                mock_settings.htr_onnx_enable = False
+            with patch('src.pipeline.htr_handwritten.get_settings') as mock_get_settings:
+                mock_settings = mock_get_settings.return_value
+                mock_settings.htr_onnx_enable = enabled
                 from src.pipeline.htr_handwritten import htr_handwritten
                 
+                # Mock file not found to simulate models not available
+                with patch('src.pipeline.htr_handwritten.os.path.exists', return_value=False):
+                    # Act
+                    text, confidence = htr_handwritten(sample_image)
+                    
+                    # Assert
+                    assert text == ""
+                    assert confidence == 0.0
+
+
+class TestPreprocessImage:
+    """Tests for the TrOCR _preprocess_image helper."""
+    
+    def test_preprocess_image_should_pad_and_normalize_in_chw(self):
+        """Test that _preprocess_image returns a padded, normalized NCHW tensor."""
+        # Arrange
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            with patch('src.pipeline.htr_handwritten.get_settings') as mock_get_settings:
+                mock_settings = mock_get_settings.return_value
+                mock_settings.htr_onnx_image_size = 32
+                from src.pipeline.htr_handwritten import _preprocess_image
+                img = Image.new('RGB', (64, 32), color=(255, 0, 0))
+                mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+                std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+                
                 # Act
-                text, confidence = htr_handwritten(sample_image)
+                pixel_values = _preprocess_image(img)
                 
                 # Assert
-                assert text == ""
-                assert confidence == 0.0
+                assert pixel_values.shape == (1, 3, 32, 32)
+                assert pixel_values.dtype == np.float32
+                assert pixel_values.flags['C_CONTIGUOUS']
+                assert img.size == (64, 32)  # Input image is not modified
+                white = (1.0 - mean) / std
+                red = (np.array([1.0, 0.0, 0.0], dtype=np.float32) - mean) / std
+                np.testing.assert_allclose(pixel_values[0, :, 0, 0], white, rtol=1e-5)
+                np.testing.assert_allclose(pixel_values[0, :, 16, 16], red, rtol=1e-5)
     
-    def test_htr_handwritten_should_return_empty_when_enabled_but_not_implemented(self, sample_image):
-        """Test that htr_handwritten returns empty when enabled but not implemented."""
+    def test_preprocess_image_should_accept_grayscale_arrays(self):
+        """Test that _preprocess_image replicates a 2D uint8 page into three channels."""
         # Arrange
         if 'src.pipeline.htr_handwritten' in sys.modules:
             del sys.modules['src.pipeline.htr_handwritten']
-        if 'src.settings' in sys.modules:
-            del sys.modules['src.settings']
         
-        # Mock onnxruntime before import
         with patch.dict('sys.modules', {
             'onnxruntime': MagicMock(),
             'transformers': MagicMock()
         }):
-            with patch('src.pipeline.htr_handwritten.settings') as mock_settings:
-                mock_settings.htr_onnx_enable = True
-                from src.pipeline.htr_handwritten import htr_handwritten
+            with patch('src.pipeline.htr_handwritten.get_settings') as mock_get_settings:
+                mock_settings = mock_get_settings.return_value
+                mock_settings.htr_onnx_image_size = 32
+                from src.pipeline.htr_handwritten import _preprocess_image
+                page = np.zeros((32, 32), dtype=np.uint8)
                 
-                # Mock file not found to simulate models not available
-                with patch('src.pipeline.htr_handwritten.os.path.exists', return_value=False):
+                # Act
+                pixel_values = _preprocess_image(page)
+                
+                # Assert
+                assert pixel_values.shape == (1, 3, 32, 32)
+                np.testing.assert_allclose(
+                    pixel_values[0, :, 0, 0],
+                    -np.array([0.485, 0.456, 0.406]) / np.array([0.229, 0.224, 0.225]),
+                    rtol=1e-5
+                )
+
+
+class _FakeInput:
+    """Input description returned by the fake ONNX session."""
+    
+    def __init__(self, name):
+        self.name = name
+
+
+def _runner_up_logits(vocab_size):
+    """Tie-free base logits where EOS (1) is the runner-up token."""
+    return (-0.1 * np.abs(np.arange(vocab_size) - 1)).astype(np.float32)
+
+
+class _FakeDecoderSession:
+    """Fake decoder that always prefers tokens 5, 6, 7 and then EOS (1)."""
+    
+    def __init__(self, vocab_size=10):
+        self.vocab_size = vocab_size
+        self.run_calls = []
+    
+    def get_inputs(self):
+        return [_FakeInput('encoder_hidden_states'), _FakeInput('input_ids')]
+    
+    def run(self, output_names, inputs):
+        input_ids = inputs['input_ids']
+        self.run_calls.append(input_ids.shape)
+        batch, seq_len = input_ids.shape
+        preferred = [5, 6, 7, 1]
+        logits = np.broadcast_to(_runner_up_logits(self.vocab_size), (batch, seq_len, self.vocab_size)).copy()
+        logits[:, -1, preferred[min(seq_len - 1, len(preferred) - 1)]] = 10.0
+        return [logits]
+
+
+class _FakeBinding:
+    """Fake ONNX IO binding that records inputs and returns bound outputs."""
+    
+    def __init__(self, session):
+        self.session = session
+        self.inputs = {}
+        self.outputs = []
+    
+    def bind_cpu_input(self, name, value):
+        self.inputs[name] = value
+    
+    def bind_output(self, name):
+        pass
+    
+    def copy_outputs_to_cpu(self):
+        return self.outputs
+
+
+class _FakeKVDecoderSession(_FakeDecoderSession):
+    """Fake decoder exposing past_key_values inputs and present outputs."""
+    
+    def __init__(self, with_past, vocab_size=10):
+        super().__init__(vocab_size)
+        self.with_past = with_past
+        self.bound_inputs = []
+    
+    def get_inputs(self):
+        names = ['input_ids', 'encoder_hidden_states']
+        if self.with_past:
+            names.append('past_key_values.0.decoder.key')
+        return [_FakeInput(name) for name in names]
+    
+    def get_outputs(self):
+        return [_FakeInput('logits'), _FakeInput('present.0.decoder.key')]
+    
+    def io_binding(self):
+        return _FakeBinding(self)
+    
+    def run_with_iobinding(self, binding):
+        self.bound_inputs.append(dict(binding.inputs))
+        input_ids = binding.inputs['input_ids']
+        past = binding.inputs.get('past_key_values.0.decoder.key')
+        past_len = past.shape[1] if past is not None else 0
+        seq_len = past_len + input_ids.shape[1]
+        preferred = [5, 6, 7, 1]
+        logits = np.broadcast_to(
+            _runner_up_logits(self.vocab_size), input_ids.shape + (self.vocab_size,)
+        ).copy()
+        logits[:, -1, preferred[min(seq_len - 1, len(preferred) - 1)]] = 10.0
+        present = np.zeros((input_ids.shape[0], seq_len), dtype=np.float32)
+        binding.outputs = [logits, present]
+
+
+class _FakeTokenizer:
+    """Fake tokenizer with fixed special tokens."""
+    
+    bos_token_id = 0
+    eos_token_id = 1
+    pad_token_id = 2
+    
+    def decode(self, ids, skip_special_tokens=True):
+        return " ".join(str(i) for i in ids)
+
+
+class _FakeEncoderSession:
+    """Fake encoder that records the batch shapes it receives."""
+    
+    def __init__(self):
+        self.run_calls = []
+    
+    def get_inputs(self):
+        return [_FakeInput('pixel_values')]
+    
+    def run(self, output_names, inputs):
+        pixel_values = inputs['pixel_values']
+        self.run_calls.append(pixel_values.shape)
+        return [np.zeros((pixel_values.shape[0], 4, 8), dtype=np.float32)]
+
+
+class TestBeamSearchDecode:
+    """Tests for _beam_search_decode."""
+    
+    def test_beam_search_should_batch_beams_in_one_decoder_call_per_step(self):
+        """Test that each step runs the decoder once for all beams."""
+        # Arrange
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            from src.pipeline.htr_handwritten import _beam_search_decode
+            session = _FakeDecoderSession()
+            encoder_hidden_states = np.zeros((1, 4, 8), dtype=np.float32)
+            
+            # Act
+            text, confidence = _beam_search_decode(
+                session, encoder_hidden_states, _FakeTokenizer(), beam_size=3, max_length=10
+            )
+            
+            # Assert
+            assert text == "5 6 7"
+            assert 0.0 < confidence <= 1.0
+            assert session.run_calls[0] == (1, 1)
+            assert all(shape[0] == 3 for shape in session.run_calls[1:])
+            assert len(session.run_calls) == 4
+    
+    def test_beam_search_should_feed_only_last_token_with_kv_cache(self):
+        """Test that the KV-cache decoder receives only the last token per beam."""
+        # Arrange
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            from src.pipeline.htr_handwritten import _beam_search_decode
+            decoder = _FakeKVDecoderSession(with_past=False)
+            decoder_with_past = _FakeKVDecoderSession(with_past=True)
+            encoder_hidden_states = np.zeros((1, 4, 8), dtype=np.float32)
+            
+            # Act
+            text, confidence = _beam_search_decode(
+                decoder, encoder_hidden_states, _FakeTokenizer(), beam_size=3, max_length=10,
+                decoder_with_past_session=decoder_with_past
+            )
+            
+            # Assert
+            assert text == "5 6 7"
+            assert len(decoder.bound_inputs) == 1
+            assert decoder.bound_inputs[0]['input_ids'].shape == (1, 1)
+            assert len(decoder_with_past.bound_inputs) == 3
+            for step, inputs in enumerate(decoder_with_past.bound_inputs, start=1):
+                assert inputs['input_ids'].shape == (3, 1)
+                assert inputs['past_key_values.0.decoder.key'].shape == (3, step)
+    
+    def test_greedy_decode_should_match_beam_search_with_one_beam(self):
+        """Test that the greedy path decodes like beam search with beam_size=1."""
+        # Arrange
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            from src.pipeline.htr_handwritten import _beam_search_decode, _greedy_decode
+            encoder_hidden_states = np.zeros((1, 4, 8), dtype=np.float32)
+            
+            # Act
+            greedy = _greedy_decode(
+                _FakeDecoderSession(), encoder_hidden_states, _FakeTokenizer(), max_length=10
+            )
+            beam = _beam_search_decode(
+                _FakeDecoderSession(), encoder_hidden_states, _FakeTokenizer(), beam_size=1, max_length=10
+            )
+            
+            # Assert
+            assert greedy[0] == beam[0] == "5 6 7"
+            assert greedy[1] == pytest.approx(beam[1])
+    
+    def test_greedy_decode_should_feed_only_last_token_with_kv_cache(self):
+        """Test that the greedy path uses the KV-cache decoder after the first step."""
+        # Arrange
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            from src.pipeline.htr_handwritten import _greedy_decode
+            decoder = _FakeKVDecoderSession(with_past=False)
+            decoder_with_past = _FakeKVDecoderSession(with_past=True)
+            encoder_hidden_states = np.zeros((1, 4, 8), dtype=np.float32)
+            
+            # Act
+            text, confidence = _greedy_decode(
+                decoder, encoder_hidden_states, _FakeTokenizer(), max_length=10,
+                decoder_with_past_session=decoder_with_past
+            )
+            
+            # Assert
+            assert text == "5 6 7"
+            assert len(decoder.bound_inputs) == 1
+            assert [inputs['input_ids'].shape for inputs in decoder_with_past.bound_inputs] == [(1, 1)] * 3
+    
+    def test_decoder_inference_should_resolve_input_names_once(self):
+        """Test that decoder input names are looked up once per session."""
+        # Arrange
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            from src.pipeline.htr_handwritten import _run_decoder_inference
+            session = _FakeDecoderSession()
+            session.get_inputs = MagicMock(wraps=session.get_inputs)
+            encoder_hidden_states = np.zeros((1, 4, 8), dtype=np.float32)
+            input_ids = np.zeros((1, 1), dtype=np.int64)
+            
+            # Act
+            for _ in range(3):
+                logits = _run_decoder_inference(session, encoder_hidden_states, input_ids)
+            
+            # Assert
+            assert logits.shape == (1, 1, 10)
+            assert len(session.run_calls) == 3
+            session.get_inputs.assert_called_once()
+    
+    def test_logsumexp_should_normalize_last_dimension(self):
+        """Test that logits minus _logsumexp are normalized log-probabilities."""
+        # Arrange
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            from src.pipeline.htr_handwritten import _logsumexp
+            logits = np.array([[1.0, 2.0, 3.0], [1000.0, 0.0, -1000.0]], dtype=np.float32)
+            
+            # Act
+            log_probs = logits - _logsumexp(logits)
+            
+            # Assert
+            assert np.all(np.isfinite(log_probs))
+            np.testing.assert_allclose(np.exp(log_probs).sum(axis=-1), 1.0, rtol=1e-5)
+            assert np.argmax(log_probs[0]) == 2
+
+
+class TestResolveTokenizer:
+    """Tests for _resolve_tokenizer."""
+    
+    def test_resolve_tokenizer_should_use_inner_tokenizer_decode(self):
+        """Test that a processor without decode falls back to its inner tokenizer."""
+        # Arrange
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            from src.pipeline.htr_handwritten import _resolve_tokenizer
+            processor = type('Processor', (), {'tokenizer': _FakeTokenizer()})()
+            
+            # Act
+            decode, bos_token_id, eos_token_id = _resolve_tokenizer(processor)
+            
+            # Assert
+            assert decode([5, 6]) == "5 6"
+            assert (bos_token_id, eos_token_id) == (0, 1)
+            assert _resolve_tokenizer(processor)[0] is decode
+    
+    def test_resolve_tokenizer_should_reject_tokenizer_without_decode(self):
+        """Test that a tokenizer without decode raises a clear error."""
+        # Arrange
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            from src.pipeline.htr_handwritten import _resolve_tokenizer
+            tokenizer = type('Tokenizer', (), {'eos_token_id': 2})()
+            
+            # Act & Assert
+            with pytest.raises(TypeError):
+                _resolve_tokenizer(tokenizer)
+
+
+class TestModelLoading:
+    """Tests for ONNX model loading helpers."""
+    
+    def test_model_path_should_use_int8_variant_when_enabled(self):
+        """Test that _model_path points to the .int8 model when htr_onnx_int8 is set."""
+        # Arrange
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            with patch('src.pipeline.htr_handwritten.get_settings') as mock_get_settings:
+                mock_settings = mock_get_settings.return_value
+                from src.pipeline.htr_handwritten import _model_path
+                
+                # Act
+                mock_settings.htr_onnx_int8 = False
+                fp32_path = _model_path("/models/trocr-encoder.onnx")
+                mock_settings.htr_onnx_int8 = True
+                int8_path = _model_path("/models/trocr-encoder.onnx")
+                
+                # Assert
+                assert fp32_path == "/models/trocr-encoder.onnx"
+                assert int8_path == "/models/trocr-encoder.onnx.int8"
+    
+    @pytest.mark.parametrize("plain_outputs, expected", [
+        (['logits', 'present.0.decoder.key'], True),
+        (['logits'], False),
+    ])
+    def test_load_decoder_with_past_should_require_present_outputs(self, tmp_path, plain_outputs, expected):
+        """Test that the KV-cache decoder is only used when the plain decoder fills every past input."""
+        # Arrange
+        model_file = tmp_path / "decoder_with_past.onnx"
+        model_file.write_bytes(b"onnx")
+        plain_decoder = MagicMock()
+        plain_decoder.get_outputs.return_value = [_FakeInput(name) for name in plain_outputs]
+        with_past = _FakeKVDecoderSession(with_past=True)
+        
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            with patch('src.pipeline.htr_handwritten.get_settings') as mock_get_settings:
+                mock_settings = mock_get_settings.return_value
+                import src.pipeline.htr_handwritten as htr
+                mock_settings.htr_onnx_decoder_with_past_path = str(model_file)
+                mock_settings.htr_onnx_int8 = False
+                mock_settings.htr_onnx_intra_threads = 0
+                mock_settings.worker_concurrency = 1
+                htr.ort.InferenceSession.return_value = with_past
+                
+                # Act
+                session = htr._load_decoder_with_past(plain_decoder)
+                
+                # Assert
+                assert (session is with_past) == expected
+    
+    @pytest.mark.parametrize("enabled, exists, expected", [
+        (False, True, False),
+        (True, False, False),
+        (True, True, True),
+    ])
+    def test_load_models_should_preload_sessions_only_when_enabled(self, enabled, exists, expected):
+        """Test that load_models loads sessions and tokenizer once HTR is enabled and models exist."""
+        # Arrange
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            with patch('src.pipeline.htr_handwritten.get_settings') as mock_get_settings:
+                mock_settings = mock_get_settings.return_value
+                import src.pipeline.htr_handwritten as htr
+                mock_settings.htr_onnx_enable = enabled
+                mock_settings.htr_onnx_int8 = False
+                mock_settings.htr_onnx_intra_threads = 0
+                mock_settings.htr_onnx_decoder_with_past_path = ""
+                mock_settings.worker_concurrency = 1
+                
+                with patch('src.pipeline.htr_handwritten.os.path.exists', return_value=exists), \
+                        patch.object(htr, '_load_tokenizer') as mock_tokenizer:
                     # Act
-                    text, confidence = htr_handwritten(sample_image)
-                    
-                    # Assert
-                    # Returns empty when models not found
-                    assert text == ""
-                    assert confidence == 0.0
+                    loaded = htr.load_models()
+                
+                # Assert
+                assert loaded is expected
+                assert (htr._onnx_encoder_session is not None) == expected
+                assert mock_tokenizer.called == expected
+
+
+class TestSessionOptions:
+    """Tests for ONNX session options."""
     
-    def test_htr_handwritten_should_handle_exception(self, sample_image):
-        """Test that htr_handwritten handles exceptions gracefully."""
+    def test_session_options_should_adapt_threads_to_cpu_budget(self):
+        """Test that the encoder uses all CPUs in parallel mode and the decoder runs sequentially."""
         # Arrange
         if 'src.pipeline.htr_handwritten' in sys.modules:
             del sys.modules['src.pipeline.htr_handwritten']
-        if 'src.settings' in sys.modules:
-            del sys.modules['src.settings']
         
-        # Mock onnxruntime before import
         with patch.dict('sys.modules', {
             'onnxruntime': MagicMock(),
             'transformers': MagicMock()
         }):
-            with patch('src.pipeline.htr_handwritten.settings') as mock_settings:
-                mock_settings.htr_onnx_enable = True
-                # Simulate an exception during processing
-                with patch('src.pipeline.htr_handwritten.logger') as mock_logger:
-                    from src.pipeline.htr_handwritten import htr_handwritten
-                    
-                    # Mock file not found to trigger exception handling
-                    with patch('src.pipeline.htr_handwritten.os.path.exists', return_value=False):
-                        # Act
-                        text, confidence = htr_handwritten(sample_image)
-                        
-                        # Assert
-                        assert text == ""
-                        assert confidence == 0.0
+            with patch('src.pipeline.htr_handwritten.get_settings') as mock_get_settings:
+                mock_settings = mock_get_settings.return_value
+                import src.pipeline.htr_handwritten as htr
+                mock_settings.htr_onnx_intra_threads = 0
+                htr.ort.SessionOptions = MagicMock
+                
+                # Act
+                encoder_options = htr._session_options(8, parallel=True)
+                decoder_options = htr._session_options(8 // 2)
+                mock_settings.htr_onnx_intra_threads = 3
+                override_options = htr._session_options(8)
+                
+                # Assert
+                assert encoder_options.intra_op_num_threads == 8
+                assert encoder_options.execution_mode == htr.ort.ExecutionMode.ORT_PARALLEL
+                assert decoder_options.intra_op_num_threads == 4
+                assert decoder_options.inter_op_num_threads == 1
+                assert decoder_options.execution_mode == htr.ort.ExecutionMode.ORT_SEQUENTIAL
+                assert override_options.intra_op_num_threads == 3
+    
+    def test_cpu_budget_should_split_cores_across_worker_processes(self):
+        """Test that each Celery process gets its share of the physical cores."""
+        # Arrange
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            with patch('src.pipeline.htr_handwritten.get_settings') as mock_get_settings:
+                mock_settings = mock_get_settings.return_value
+                import src.pipeline.htr_handwritten as htr
+                
+                # Act
+                with patch.object(htr.os, 'sched_getaffinity', return_value=set(range(16)), create=True), \
+                        patch.object(htr, '_physical_core_count', return_value=8):
+                    mock_settings.worker_concurrency = 4
+                    shared = htr._cpu_budget()
+                    mock_settings.worker_concurrency = 16
+                    oversubscribed = htr._cpu_budget()
+                
+                # Assert
+                assert shared == 2
+                assert oversubscribed == 1
+
+
+class TestScoreTopK:
+    """Tests for the fused log-softmax/top-k scoring kernel."""
+    
+    def test_score_topk_should_match_numpy_fallback(self):
+        """Test that _score_topk returns the same candidates with and without Numba."""
+        # Arrange
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            import src.pipeline.htr_handwritten as htr
+            rng = np.random.default_rng(0)
+            logits = rng.normal(scale=5.0, size=(3, 1000)).astype(np.float32)
+            prev_scores = np.array([0.0, -1.5, -3.0])
+            
+            # Act
+            tokens, scores = htr._score_topk(logits, prev_scores, 4)
+            with patch.object(htr, 'NUMBA_AVAILABLE', False):
+                ref_tokens, ref_scores = htr._score_topk(logits, prev_scores, 4)
+            
+            # Assert
+            order = np.argsort(-scores, axis=-1)
+            ref_order = np.argsort(-ref_scores, axis=-1)
+            np.testing.assert_array_equal(
+                np.take_along_axis(tokens, order, axis=-1),
+                np.take_along_axis(ref_tokens, ref_order, axis=-1)
+            )
+            np.testing.assert_allclose(
+                np.take_along_axis(scores, order, axis=-1),
+                np.take_along_axis(ref_scores, ref_order, axis=-1),
+                rtol=1e-5
+            )
+    
+    def test_warm_up_kernels_should_compile_the_decode_signature(self):
+        """Test that the warm-up compiles the kernel for the dtypes used while decoding."""
+        # Arrange
+        pytest.importorskip("numba")
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            import src.pipeline.htr_handwritten as htr
+            logits = np.zeros((2, 1, 10), dtype=np.float32)[:, -1, :]
+            
+            # Act
+            htr._warm_up_kernels()
+            compiled = len(htr._score_topk_kernel.signatures)
+            htr._score_topk(logits, np.zeros(2, dtype=np.float64), 3)
+            
+            # Assert
+            assert compiled == 1
+            assert len(htr._score_topk_kernel.signatures) == 1
 
+
+class TestHTRHandwrittenBatch:
+    """Tests for htr_handwritten_batch."""
+    
+    def test_htr_handwritten_batch_should_run_encoder_once_per_batch(self, sample_image):
+        """Test that pages are stacked into one encoder call per batch."""
+        # Arrange
+        if 'src.pipeline.htr_handwritten' in sys.modules:
+            del sys.modules['src.pipeline.htr_handwritten']
+        
+        with patch.dict('sys.modules', {
+            'onnxruntime': MagicMock(),
+            'transformers': MagicMock()
+        }):
+            with patch('src.pipeline.htr_handwritten.get_settings') as mock_get_settings:
+                mock_settings = mock_get_settings.return_value
+                import src.pipeline.htr_handwritten as htr
+                mock_settings.htr_onnx_enable = True
+                mock_settings.htr_onnx_image_size = 32
+                mock_settings.htr_onnx_batch_size = 2
+                mock_settings.htr_onnx_beam_size = 3
+                mock_settings.htr_onnx_max_length = 10
+                encoder = _FakeEncoderSession()
+                decoder = _FakeDecoderSession()
+                
+                with patch.object(htr, '_load_onnx_models', return_value=(encoder, decoder)), \
+                        patch.object(htr, '_load_decoder_with_past', return_value=None), \
+                        patch.object(htr, '_load_tokenizer', return_value=_FakeTokenizer()):
+                    # Act
+                    results = htr.htr_handwritten_batch([sample_image] * 3)
+                
+                # Assert
+                assert results == [results[0]] * 3
+                assert results[0][0] == "5 6 7"
+                assert encoder.run_calls == [(2, 3, 32, 32), (1, 3, 32, 32)]
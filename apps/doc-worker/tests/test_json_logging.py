@@ -0,0 +1,55 @@
+"""Unit tests for json_logging."""
+import logging
+import sys
+import orjson
+
+
+class TestJsonFormatter:
+    """Tests for JsonFormatter."""
+    
+    def test_format_should_emit_valid_json_with_extra_fields(self):
+        """Test that messages with quotes stay valid JSON and extra= fields become keys."""
+        # Arrange
+        if 'src.json_logging' in sys.modules:
+            del sys.modules['src.json_logging']
+        from src.json_logging import JsonFormatter
+        formatter = JsonFormatter('doc-worker')
+        record = logging.makeLogRecord({
+            'name': 'src.worker',
+            'levelno': logging.INFO,
+            'levelname': 'INFO',
+            'msg': 'Processamento concluído: %s "%s"',
+            'args': ('doc-1', 'a\nb'),
+            'document_id': 'doc-1',
+            'pages': 3,
+        })
+        
+        # Act
+        entry = orjson.loads(formatter.format(record))
+        
+        # Assert
+        assert entry['message'] == 'Processamento concluído: doc-1 "a\nb"'
+        assert entry['level'] == 'INFO'
+        assert entry['service'] == 'doc-worker'
+        assert entry['document_id'] == 'doc-1'
+        assert entry['pages'] == 3
+        assert 'msg' not in entry and 'args' not in entry
+    
+    def test_format_should_include_exception_traceback(self):
+        """Test that exc_info is rendered into an exception field."""
+        # Arrange
+        if 'src.json_logging' in sys.modules:
+            del sys.modules['src.json_logging']
+        from src.json_logging import JsonFormatter
+        formatter = JsonFormatter('doc-worker')
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.makeLogRecord({'msg': 'Erro', 'exc_info': sys.exc_info()})
+        
+        # Act
+        entry = orjson.loads(formatter.format(record))
+        
+        # Assert
+        assert entry['message'] == 'Erro'
+        assert 'ValueError: boom' in entry['exception']
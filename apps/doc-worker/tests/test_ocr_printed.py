@@ -17,13 +17,17 @@ class TestOCRPrinted:
             del sys.modules['src.settings']
         
         with patch('src.pipeline.ocr_printed.pytesseract') as mock_pytesseract:
-            mock_pytesseract.image_to_string.return_value = "Sample text"
             mock_pytesseract.image_to_data.return_value = {
+                'block_num': [1, 1, 1, 1],
+                'par_num': [0, 1, 1, 1],
+                'line_num': [0, 1, 1, 1],
+                'text': ['', 'Sample', 'text', ' '],
                 'conf': ['-1', '95', '90', '88']
             }
             mock_pytesseract.Output.DICT = MagicMock()
             
-            with patch('src.pipeline.ocr_printed.settings') as mock_settings:
+            with patch('src.pipeline.ocr_printed.get_settings') as mock_get_settings:
+                mock_settings = mock_get_settings.return_value
                 mock_settings.ocr_langs = "por+eng"
                 from src.pipeline.ocr_printed import ocr_printed
                 
@@ -33,7 +37,7 @@ class TestOCRPrinted:
                 # Assert
                 assert text == "Sample text"
                 assert 0.0 <= confidence <= 1.0
-                mock_pytesseract.image_to_string.assert_called_once()
+                mock_pytesseract.image_to_string.assert_not_called()
                 mock_pytesseract.image_to_data.assert_called_once()
     
     def test_ocr_printed_should_use_custom_lang(self, sample_image):
@@ -45,26 +49,28 @@ class TestOCRPrinted:
             del sys.modules['src.settings']
         
         with patch('src.pipeline.ocr_printed.pytesseract') as mock_pytesseract:
-            mock_pytesseract.image_to_string.return_value = "Texto"
-            mock_pytesseract.image_to_data.return_value = {'conf': ['95']}
+            mock_pytesseract.image_to_data.return_value = {
+                'block_num': [1], 'par_num': [1], 'line_num': [1], 'text': ['Texto'], 'conf': ['95']
+            }
             mock_pytesseract.Output.DICT = MagicMock()
             
-            with patch('src.pipeline.ocr_printed.settings'):
+            with patch('src.pipeline.ocr_printed.get_settings'):
                 from src.pipeline.ocr_printed import ocr_printed
                 
                 # Act
                 ocr_printed(sample_image, lang="por")
                 
                 # Assert
-                call_kwargs = mock_pytesseract.image_to_string.call_args[1]
+                call_kwargs = mock_pytesseract.image_to_data.call_args[1]
                 assert call_kwargs['lang'] == "por"
     
     @patch('src.pipeline.ocr_printed.pytesseract')
     def test_ocr_printed_should_handle_empty_text(self, mock_pytesseract, sample_image):
         """Test that ocr_printed handles empty text."""
         # Arrange
-        mock_pytesseract.image_to_string.return_value = ""
-        mock_pytesseract.image_to_data.return_value = {'conf': []}
+        mock_pytesseract.image_to_data.return_value = {
+            'block_num': [], 'par_num': [], 'line_num': [], 'text': [], 'conf': []
+        }
         mock_pytesseract.Output.DICT = MagicMock()
         
         if 'src.pipeline.ocr_printed' in sys.modules:
@@ -72,7 +78,7 @@ class TestOCRPrinted:
         if 'src.settings' in sys.modules:
             del sys.modules['src.settings']
         
-        with patch('src.pipeline.ocr_printed.settings'):
+        with patch('src.pipeline.ocr_printed.get_settings'):
             from src.pipeline.ocr_printed import ocr_printed
             
             # Act
@@ -86,14 +92,14 @@ class TestOCRPrinted:
     def test_ocr_printed_should_handle_exception(self, mock_pytesseract, sample_image):
         """Test that ocr_printed handles exceptions gracefully."""
         # Arrange
-        mock_pytesseract.image_to_string.side_effect = Exception("OCR error")
+        mock_pytesseract.image_to_data.side_effect = Exception("OCR error")
         
         if 'src.pipeline.ocr_printed' in sys.modules:
             del sys.modules['src.pipeline.ocr_printed']
         if 'src.settings' in sys.modules:
             del sys.modules['src.settings']
         
-        with patch('src.pipeline.ocr_printed.settings'):
+        with patch('src.pipeline.ocr_printed.get_settings'):
             from src.pipeline.ocr_printed import ocr_printed
             
             # Act
@@ -112,13 +118,16 @@ class TestOCRPrinted:
             del sys.modules['src.settings']
         
         with patch('src.pipeline.ocr_printed.pytesseract') as mock_pytesseract:
-            mock_pytesseract.image_to_string.return_value = "Text"
             mock_pytesseract.image_to_data.return_value = {
+                'block_num': [1, 1, 1, 1],
+                'par_num': [1, 1, 1, 1],
+                'line_num': [1, 1, 1, 1],
+                'text': ['Text', 'with', 'four', 'words'],
                 'conf': ['95', '90', '85', '80']  # Average should be ~0.875
             }
             mock_pytesseract.Output.DICT = MagicMock()
             
-            with patch('src.pipeline.ocr_printed.settings'):
+            with patch('src.pipeline.ocr_printed.get_settings'):
                 from src.pipeline.ocr_printed import ocr_printed
                 
                 # Act
@@ -126,4 +135,200 @@ class TestOCRPrinted:
                 
                 # Assert
                 assert confidence == pytest.approx(0.875, abs=0.01)
+    
+    def test_ocr_printed_should_rebuild_lines_from_word_data(self, sample_image):
+        """Test that words are joined by line in Tesseract reading order from a single OCR pass."""
+        # Arrange
+        if 'src.pipeline.ocr_printed' in sys.modules:
+            del sys.modules['src.pipeline.ocr_printed']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.ocr_printed.pytesseract') as mock_pytesseract:
+            mock_pytesseract.image_to_data.return_value = {
+                'block_num': [1, 1, 1, 1, 1, 1, 2, 2],
+                'par_num': [1, 1, 1, 1, 1, 1, 1, 1],
+                'line_num': [1, 1, 1, 2, 2, 2, 1, 1],
+                'text': ['', 'Paciente:', 'Maria', '', 'CPF:', '123.456.789-01', '', 'Assinatura'],
+                'conf': ['-1', '90', '90', '-1', '90', '90', '-1', '90']
+            }
+            mock_pytesseract.Output.DICT = MagicMock()
+            
+            with patch('src.pipeline.ocr_printed.get_settings'):
+                from src.pipeline.ocr_printed import ocr_printed
+                
+                # Act
+                text, confidence = ocr_printed(sample_image)
+                
+                # Assert
+                assert text == "Paciente: Maria\nCPF: 123.456.789-01\nAssinatura"
+                assert confidence == pytest.approx(0.9)
+                mock_pytesseract.image_to_data.assert_called_once()
+
 
+class TestOCRPrintedBatch:
+    """Tests for ocr_printed_batch function."""
+    
+    def test_ocr_printed_batch_should_reuse_one_tesseract_api(self, sample_image):
+        """Test that pages and documents share a single resident Tesseract API."""
+        # Arrange
+        import numpy as np
+        if 'src.pipeline.ocr_printed' in sys.modules:
+            del sys.modules['src.pipeline.ocr_printed']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        mock_api = MagicMock()
+        mock_api.GetUTF8Text.side_effect = ["Page one\n", "Page two\n", "Page three\n"]
+        mock_api.MeanTextConf.side_effect = [90, 80, 70]
+        page = np.zeros((20, 30), dtype=np.uint8)
+        
+        with patch('src.pipeline.ocr_printed.TESSEROCR_AVAILABLE', True), \
+                patch('src.pipeline.ocr_printed.PyTessBaseAPI', return_value=mock_api, create=True) as mock_cls, \
+                patch('src.pipeline.ocr_printed.PSM', MagicMock(), create=True), \
+                patch('src.pipeline.ocr_printed.OEM', MagicMock(), create=True), \
+                patch('src.pipeline.ocr_printed.get_settings') as mock_get_settings:
+            mock_settings = mock_get_settings.return_value
+            mock_settings.ocr_langs = "por+eng"
+            mock_settings.ocr_workers = 1
+            from src.pipeline.ocr_printed import ocr_printed_batch
+            
+            # Act
+            first = ocr_printed_batch([page, sample_image])
+            second = ocr_printed_batch(img for img in [page])  # generator input
+            
+            # Assert
+            assert first == [("Page one", 0.9), ("Page two", 0.8)]
+            assert second == [("Page three", 0.7)]
+            mock_cls.assert_called_once()
+            assert mock_cls.call_args.kwargs['lang'] == "por+eng"
+            mock_api.SetImageBytes.assert_called_with(page.tobytes(), 30, 20, 1, 30)
+            mock_api.SetImage.assert_called_once_with(sample_image)
+    
+    def test_ocr_printed_batch_should_fall_back_to_pytesseract(self, sample_image):
+        """Test that each page goes through pytesseract when tesserocr is unavailable."""
+        # Arrange
+        if 'src.pipeline.ocr_printed' in sys.modules:
+            del sys.modules['src.pipeline.ocr_printed']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.ocr_printed.pytesseract') as mock_pytesseract, \
+                patch('src.pipeline.ocr_printed.TESSEROCR_AVAILABLE', False):
+            mock_pytesseract.image_to_data.return_value = {
+                'block_num': [1], 'par_num': [1], 'line_num': [1], 'text': ['Texto'], 'conf': ['90']
+            }
+            mock_pytesseract.Output.DICT = MagicMock()
+            
+            with patch('src.pipeline.ocr_printed.get_settings') as mock_get_settings:
+                mock_settings = mock_get_settings.return_value
+                mock_settings.ocr_langs = "por+eng"
+                mock_settings.ocr_workers = 2
+                from src.pipeline.ocr_printed import ocr_printed_batch
+                
+                # Act
+                results = ocr_printed_batch([sample_image, sample_image])
+                
+                # Assert
+                assert results == [("Texto", 0.9), ("Texto", 0.9)]
+                assert mock_pytesseract.image_to_data.call_count == 2
+    
+    def test_ocr_printed_batch_should_give_each_ocr_thread_its_own_api(self):
+        """Test that pages run in parallel threads, each with a private Tesseract API, in page order."""
+        # Arrange
+        import threading
+        import numpy as np
+        if 'src.pipeline.ocr_printed' in sys.modules:
+            del sys.modules['src.pipeline.ocr_printed']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        barrier = threading.Barrier(2, timeout=5)
+        apis = []
+        
+        def make_api(**kwargs):
+            api = MagicMock()
+            # Both pages must be inside GetUTF8Text at the same time to pass the barrier
+            api.GetUTF8Text.side_effect = lambda: (barrier.wait(), "page\n")[1]
+            api.MeanTextConf.return_value = 80
+            apis.append(api)
+            return api
+        
+        pages = [np.full((10, 10), value, dtype=np.uint8) for value in (1, 2)]
+        
+        with patch('src.pipeline.ocr_printed.TESSEROCR_AVAILABLE', True), \
+                patch('src.pipeline.ocr_printed.PyTessBaseAPI', side_effect=make_api, create=True), \
+                patch('src.pipeline.ocr_printed.PSM', MagicMock(), create=True), \
+                patch('src.pipeline.ocr_printed.OEM', MagicMock(), create=True), \
+                patch('src.pipeline.ocr_printed.get_settings') as mock_get_settings:
+            mock_settings = mock_get_settings.return_value
+            mock_settings.ocr_langs = "por+eng"
+            from src.pipeline.ocr_printed import ocr_printed_batch
+            
+            # Act
+            results = ocr_printed_batch(pages, workers=2)
+            
+            # Assert
+            assert len(apis) == 2
+            assert results == [("page", 0.8), ("page", 0.8)]
+            for api, page in zip(sorted(apis, key=lambda a: a.SetImageBytes.call_args[0][0]), pages):
+                api.SetImageBytes.assert_called_once_with(page.tobytes(), 10, 10, 1, 10)
+    
+    def test_warm_up_should_load_one_api_per_ocr_thread(self):
+        """Test that warm_up loads a Tesseract API in every OCR thread before the first page."""
+        # Arrange
+        if 'src.pipeline.ocr_printed' in sys.modules:
+            del sys.modules['src.pipeline.ocr_printed']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.ocr_printed.TESSEROCR_AVAILABLE', True), \
+                patch('src.pipeline.ocr_printed.PyTessBaseAPI', side_effect=lambda **kwargs: MagicMock(), create=True) as mock_cls, \
+                patch('src.pipeline.ocr_printed.PSM', MagicMock(), create=True), \
+                patch('src.pipeline.ocr_printed.OEM', MagicMock(), create=True), \
+                patch('src.pipeline.ocr_printed.get_settings') as mock_get_settings:
+            mock_settings = mock_get_settings.return_value
+            mock_settings.ocr_langs = "por+eng"
+            mock_settings.ocr_workers = 3
+            from src.pipeline.ocr_printed import warm_up
+            
+            # Act
+            loaded = warm_up()
+            loaded_again = warm_up()
+            
+            # Assert
+            assert loaded == 3
+            assert loaded_again == 3
+            assert mock_cls.call_count == 3
+    
+    def test_ocr_printed_batch_should_read_rendered_pages_with_tesserocr(self):
+        """Test the real PyTessBaseAPI path on rendered pages (runs only where tesserocr is installed)."""
+        # Arrange
+        tesserocr = pytest.importorskip("tesserocr")
+        if 'eng' not in tesserocr.get_languages()[1]:
+            pytest.skip("eng traineddata not installed")
+        import fitz
+        import numpy as np
+        pages = []
+        for text in ["MEDSCRIBE 2024", "PAGE 2"]:
+            doc = fitz.open()
+            page = doc.new_page(width=320, height=120)
+            page.insert_text((20, 70), text, fontsize=28)
+            pix = page.get_pixmap(matrix=fitz.Matrix(300 / 72, 300 / 72), colorspace=fitz.csGRAY, alpha=False)
+            pages.append(np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width))
+            doc.close()
+        
+        if 'src.pipeline.ocr_printed' in sys.modules:
+            del sys.modules['src.pipeline.ocr_printed']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.ocr_printed.ocr_printed', side_effect=AssertionError("pytesseract fallback")):
+            from src.pipeline.ocr_printed import ocr_printed_batch
+            
+            # Act
+            results = ocr_printed_batch(pages, lang="eng", workers=1)
+            
+            # Assert
+            assert [text for text, _ in results] == ["MEDSCRIBE 2024", "PAGE 2"]
+            assert all(confidence > 0.5 for _, confidence in results)
@@ -2,16 +2,7 @@
 import pytest
 from unittest.mock import Mock, patch
 import sys
-
-# Mock ClientError if botocore is not available
-try:
-    from botocore.exceptions import ClientError
-except ImportError:
-    class ClientError(Exception):
-        def __init__(self, error_response, operation_name):
-            self.error_response = error_response
-            self.operation_name = operation_name
-            super().__init__(f"{operation_name}: {error_response}")
+from botocore.exceptions import ClientError
 
 
 class TestPDFLoader:
@@ -129,10 +120,12 @@ class TestPDFLoader:
             
             # Act
             is_valid, error_msg = loader.validate_pdf(sample_pdf_content)
+            is_valid_view, _ = loader.validate_pdf(memoryview(sample_pdf_content))
             
             # Assert
             assert is_valid is True
             assert error_msg is None
+            assert is_valid_view is True
     
     def test_validate_pdf_should_return_false_for_too_small(self):
         """Test that validate_pdf returns False for too small file."""
@@ -47,6 +47,7 @@ class TestPersistence:
             
             # Assert
             mock_create_pool.assert_called_once()
+            assert mock_create_pool.call_args.kwargs['statement_cache_size'] > 0
             assert persistence.conn_pool == mock_pool
     
     @pytest.mark.asyncio
@@ -145,12 +146,86 @@ class TestPersistence:
             await persistence.save_document_fields("doc-id", [field])
             
             # Assert
-            mock_conn.execute.assert_called_once()
-            call_args = mock_conn.execute.call_args[0]
+            mock_conn.executemany.assert_called_once()
+            call_args = mock_conn.executemany.call_args[0]
             assert "INSERT INTO document_fields" in call_args[0]
-            assert call_args[1] == "doc-id"
-            assert call_args[2] == "patient_name"
-            assert call_args[3] == "João Silva"
+            assert call_args[1] == [("doc-id", "patient_name", "João Silva", 0.95, 1, None)]
+    
+    @pytest.mark.asyncio
+    async def test_save_document_fields_should_batch_all_fields_in_one_call(self):
+        """Test that save_document_fields sends every field in a single executemany."""
+        # Arrange
+        mock_pool = AsyncMock()
+        mock_conn = AsyncMock()
+        mock_conn.__aenter__ = AsyncMock(return_value=mock_conn)
+        mock_conn.__aexit__ = AsyncMock(return_value=None)
+        mock_pool.acquire = Mock(return_value=mock_conn)
+        mock_create_pool = AsyncMock(return_value=mock_pool)
+        
+        fields = [
+            DocumentField(field_name=f"field_{i}", field_value=f"value {i}", confidence=0.9, page=i)
+            for i in range(1, 4)
+        ]
+        
+        if 'src.pipeline.persistence' in sys.modules:
+            del sys.modules['src.pipeline.persistence']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.persistence.asyncpg', create=True) as mock_asyncpg:
+            mock_asyncpg.create_pool = mock_create_pool
+            from src.pipeline.persistence import Persistence
+            persistence = Persistence()
+            await persistence.initialize()
+            
+            # Act
+            await persistence.save_document_fields("doc-id", fields)
+            
+            # Assert
+            mock_conn.execute.assert_not_called()
+            mock_conn.executemany.assert_called_once()
+            records = mock_conn.executemany.call_args[0][1]
+            assert [record[1] for record in records] == ["field_1", "field_2", "field_3"]
+            assert [record[4] for record in records] == [1, 2, 3]
+    
+    @pytest.mark.asyncio
+    async def test_save_document_fields_should_copy_large_batches(self):
+        """Test that save_document_fields sends large batches through a single COPY."""
+        # Arrange
+        mock_pool = AsyncMock()
+        mock_conn = AsyncMock()
+        mock_conn.__aenter__ = AsyncMock(return_value=mock_conn)
+        mock_conn.__aexit__ = AsyncMock(return_value=None)
+        mock_pool.acquire = Mock(return_value=mock_conn)
+        mock_create_pool = AsyncMock(return_value=mock_pool)
+        
+        if 'src.pipeline.persistence' in sys.modules:
+            del sys.modules['src.pipeline.persistence']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.persistence.asyncpg', create=True) as mock_asyncpg:
+            mock_asyncpg.create_pool = mock_create_pool
+            from src.pipeline.persistence import Persistence, FIELD_COLUMNS, FIELD_COPY_MIN_ROWS
+            persistence = Persistence()
+            await persistence.initialize()
+            fields = [
+                DocumentField(field_name="cpf", field_value=f"value {i}", confidence=0.9, page=i)
+                for i in range(1, FIELD_COPY_MIN_ROWS + 1)
+            ]
+            
+            # Act
+            await persistence.save_document_fields("doc-id", fields)
+            
+            # Assert
+            mock_conn.executemany.assert_not_called()
+            mock_conn.copy_records_to_table.assert_awaited_once()
+            call = mock_conn.copy_records_to_table.call_args
+            assert call.args == ('document_fields',)
+            assert call.kwargs['columns'] == FIELD_COLUMNS
+            records = call.kwargs['records']
+            assert len(records) == FIELD_COPY_MIN_ROWS
+            assert records[0] == ("doc-id", "cpf", "value 1", 0.9, 1, None)
     
     @pytest.mark.asyncio
     async def test_save_document_fields_should_handle_bbox(self):
@@ -192,9 +267,9 @@ class TestPersistence:
             await persistence.save_document_fields("doc-id", [field])
             
             # Assert
-            call_args = mock_conn.execute.call_args[0]
+            records = mock_conn.executemany.call_args[0][1]
             # Check that bbox JSON is passed
-            assert call_args[6] is not None  # bbox_json parameter
+            assert json.loads(records[0][5]) == {"x": 10.0, "y": 20.0, "w": 100.0, "h": 50.0}
     
     @pytest.mark.asyncio
     async def test_save_document_fields_should_skip_empty_list(self):
@@ -221,16 +296,18 @@ class TestPersistence:
             
             # Assert
             mock_conn.execute.assert_not_called()
+            mock_conn.executemany.assert_not_called()
     
     @pytest.mark.asyncio
-    async def test_document_exists_should_return_true_when_exists(self):
-        """Test that document_exists returns True when document exists."""
+    @pytest.mark.parametrize("exists", [True, False])
+    async def test_document_exists_should_return_the_exists_flag(self, exists):
+        """Test that document_exists returns the single EXISTS value fetched from the database."""
         # Arrange
         mock_pool = AsyncMock()
         mock_conn = AsyncMock()
         mock_conn.__aenter__ = AsyncMock(return_value=mock_conn)
         mock_conn.__aexit__ = AsyncMock(return_value=None)
-        mock_conn.fetchrow = AsyncMock(return_value={"exists": True})
+        mock_conn.fetchval = AsyncMock(return_value=exists)
         mock_pool.acquire = Mock(return_value=mock_conn)
         mock_create_pool = AsyncMock(return_value=mock_pool)
         
@@ -241,7 +318,7 @@ class TestPersistence:
         
         with patch('src.pipeline.persistence.asyncpg', create=True) as mock_asyncpg:
             mock_asyncpg.create_pool = mock_create_pool
-            from src.pipeline.persistence import Persistence
+            from src.pipeline.persistence import Persistence, SQL_DOCUMENT_EXISTS
             persistence = Persistence()
             await persistence.initialize()
             
@@ -249,8 +326,9 @@ class TestPersistence:
             result = await persistence.document_exists("doc-id")
             
             # Assert
-            assert result is True
-            mock_conn.fetchrow.assert_called_once()
+            assert result is exists
+            mock_conn.fetchval.assert_awaited_once_with(SQL_DOCUMENT_EXISTS, "doc-id")
+            mock_conn.fetchrow.assert_not_called()
     
     @pytest.mark.asyncio
     async def test_create_document_should_insert_document(self):
@@ -285,4 +363,155 @@ class TestPersistence:
             mock_conn.execute.assert_called_once()
             call_args = mock_conn.execute.call_args[0]
             assert "INSERT INTO documents" in call_args[0]
-
+    
+    
+    @pytest.mark.asyncio
+    async def test_find_completed_by_sha256_should_return_latest_match(self):
+        """Test that find_completed_by_sha256 returns the id and page count of a DONE duplicate."""
+        # Arrange
+        mock_pool = AsyncMock()
+        mock_conn = AsyncMock()
+        mock_conn.__aenter__ = AsyncMock(return_value=mock_conn)
+        mock_conn.__aexit__ = AsyncMock(return_value=None)
+        mock_conn.fetchrow = AsyncMock(return_value={"id": "prev-id", "pages": 3})
+        mock_pool.acquire = Mock(return_value=mock_conn)
+        mock_create_pool = AsyncMock(return_value=mock_pool)
+        
+        if 'src.pipeline.persistence' in sys.modules:
+            del sys.modules['src.pipeline.persistence']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.persistence.asyncpg', create=True) as mock_asyncpg:
+            mock_asyncpg.create_pool = mock_create_pool
+            from src.pipeline.persistence import Persistence
+            persistence = Persistence()
+            await persistence.initialize()
+            
+            # Act
+            result = await persistence.find_completed_by_sha256("abc", "tenant", "doc-id")
+            
+            # Assert
+            assert result == ("prev-id", 3)
+            query, *params = mock_conn.fetchrow.call_args[0]
+            assert "status = 'DONE'" in query and "model_version = $4" in query
+            assert params == ["abc", "tenant", "doc-id", "1.0.0"]
+    
+    @pytest.mark.asyncio
+    async def test_complete_from_duplicate_should_replace_fields_and_mark_done_in_one_transaction(self):
+        """Test that complete_from_duplicate deletes, clones and marks DONE on one connection and transaction."""
+        # Arrange
+        mock_pool = AsyncMock()
+        mock_conn = AsyncMock()
+        mock_conn.__aenter__ = AsyncMock(return_value=mock_conn)
+        mock_conn.__aexit__ = AsyncMock(return_value=None)
+        mock_conn.execute = AsyncMock(side_effect=["DELETE 4", "INSERT 0 4", "UPDATE 1"])
+        mock_transaction = AsyncMock()
+        mock_transaction.__aenter__ = AsyncMock(return_value=mock_transaction)
+        mock_transaction.__aexit__ = AsyncMock(return_value=None)
+        mock_conn.transaction = Mock(return_value=mock_transaction)
+        mock_pool.acquire = Mock(return_value=mock_conn)
+        mock_create_pool = AsyncMock(return_value=mock_pool)
+        
+        if 'src.pipeline.persistence' in sys.modules:
+            del sys.modules['src.pipeline.persistence']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.persistence.asyncpg', create=True) as mock_asyncpg:
+            mock_asyncpg.create_pool = mock_create_pool
+            from src.pipeline.persistence import (
+                Persistence, SQL_CLONE_FIELDS, SQL_COMPLETE_DOCUMENT, SQL_DELETE_FIELDS
+            )
+            persistence = Persistence()
+            await persistence.initialize()
+            
+            # Act
+            count = await persistence.complete_from_duplicate(
+                "doc-id", "prev-id", pages=3, processing_time=0.5
+            )
+            
+            # Assert
+            assert count == 4
+            mock_pool.acquire.assert_called_once()
+            mock_conn.transaction.assert_called_once()
+            mock_transaction.__aexit__.assert_awaited_once()
+            assert [c.args for c in mock_conn.execute.await_args_list] == [
+                (SQL_DELETE_FIELDS, "doc-id"),
+                (SQL_CLONE_FIELDS, "prev-id", "doc-id"),
+                (SQL_COMPLETE_DOCUMENT, 3, 0.5, "1.0.0", "doc-id"),
+            ]
+    
+    @pytest.mark.asyncio
+    async def test_complete_document_should_write_fields_and_status_in_one_transaction(self):
+        """Test that complete_document acquires once and saves fields plus DONE atomically."""
+        # Arrange
+        mock_pool = AsyncMock()
+        mock_conn = AsyncMock()
+        mock_conn.__aenter__ = AsyncMock(return_value=mock_conn)
+        mock_conn.__aexit__ = AsyncMock(return_value=None)
+        mock_transaction = AsyncMock()
+        mock_transaction.__aenter__ = AsyncMock(return_value=mock_transaction)
+        mock_transaction.__aexit__ = AsyncMock(return_value=None)
+        mock_conn.transaction = Mock(return_value=mock_transaction)
+        mock_pool.acquire = Mock(return_value=mock_conn)
+        mock_create_pool = AsyncMock(return_value=mock_pool)
+        fields = [
+            DocumentField(field_name="cpf", field_value="123.456.789-01", confidence=0.9, page=1),
+        ]
+        
+        if 'src.pipeline.persistence' in sys.modules:
+            del sys.modules['src.pipeline.persistence']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.persistence.asyncpg', create=True) as mock_asyncpg:
+            mock_asyncpg.create_pool = mock_create_pool
+            from src.pipeline.persistence import Persistence
+            persistence = Persistence()
+            await persistence.initialize()
+            
+            # Act
+            await persistence.complete_document("doc-id", fields, pages=2, processing_time=1.5)
+            
+            # Assert
+            mock_pool.acquire.assert_called_once()
+            mock_conn.transaction.assert_called_once()
+            mock_transaction.__aexit__.assert_awaited_once()
+            mock_conn.executemany.assert_awaited_once()
+            status_args = mock_conn.execute.call_args[0]
+            assert "UPDATE documents" in status_args[0] and "model_version = $3" in status_args[0]
+            assert status_args[1:] == (2, 1.5, "1.0.0", "doc-id")
+    
+    @pytest.mark.asyncio
+    async def test_start_document_should_upsert_processing_status_in_one_statement(self):
+        """Test that start_document creates or resets the document as PROCESSING with one command."""
+        # Arrange
+        mock_pool = AsyncMock()
+        mock_conn = AsyncMock()
+        mock_conn.__aenter__ = AsyncMock(return_value=mock_conn)
+        mock_conn.__aexit__ = AsyncMock(return_value=None)
+        mock_conn.execute = AsyncMock(return_value="INSERT 0 1")
+        mock_pool.acquire = Mock(return_value=mock_conn)
+        mock_create_pool = AsyncMock(return_value=mock_pool)
+        
+        if 'src.pipeline.persistence' in sys.modules:
+            del sys.modules['src.pipeline.persistence']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.pipeline.persistence.asyncpg', create=True) as mock_asyncpg:
+            mock_asyncpg.create_pool = mock_create_pool
+            from src.pipeline.persistence import Persistence
+            persistence = Persistence()
+            await persistence.initialize()
+            
+            # Act
+            result = await persistence.start_document("doc-id", "tenant", "object-key", "sha256")
+            
+            # Assert
+            assert result is True
+            mock_conn.execute.assert_called_once()
+            query, *params = mock_conn.execute.call_args[0]
+            assert "'PROCESSING'" in query and "ON CONFLICT (id) DO UPDATE" in query
+            assert params == ["doc-id", "tenant", "object-key", "sha256"]
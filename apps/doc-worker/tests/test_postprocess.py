@@ -36,6 +36,22 @@ class TestNormalizeDate:
         # Assert
         assert result == "15/03/2024"
     
+    def test_normalize_date_should_handle_yyyy_mm_dd_format(self):
+        """Test that normalize_date reorders YYYY/MM/DD into DD/MM/YYYY."""
+        # Act
+        result = normalize_date("Emitido em 2024/03/15")
+        
+        # Assert
+        assert result == "15/03/2024"
+    
+    def test_normalize_date_should_skip_impossible_calendar_dates(self):
+        """Test that normalize_date ignores 31/02 and uses the next valid date."""
+        # Act
+        result = normalize_date("31/02/2024 retificado 01/03/2024")
+        
+        # Assert
+        assert result == "01/03/2024"
+    
     def test_normalize_date_should_return_none_for_invalid_format(self):
         """Test that normalize_date returns None for invalid format."""
         # Act
@@ -80,6 +96,14 @@ class TestNormalizeCpf:
         # Assert
         assert result == "123.456.789-01"
     
+    def test_normalize_cpf_should_ignore_non_ascii_characters(self):
+        """Test that normalize_cpf drops non-ASCII symbols around the digits."""
+        # Act
+        result = normalize_cpf("CPF nº 123.456.789–01")
+        
+        # Assert
+        assert result == "123.456.789-01"
+    
     def test_normalize_cpf_should_return_none_for_invalid_length(self):
         """Test that normalize_cpf returns None for invalid length."""
         # Act
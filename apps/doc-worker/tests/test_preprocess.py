@@ -15,8 +15,8 @@ class TestPreprocessImage:
         result = preprocess_image(sample_image)
         
         # Assert
-        assert isinstance(result, Image.Image)
-        assert result.mode == 'L'  # Grayscale
+        assert isinstance(result, np.ndarray)
+        assert result.ndim == 2  # Grayscale
     
     def test_preprocess_image_should_handle_grayscale_input(self, sample_grayscale_image):
         """Test that preprocess_image handles grayscale input."""
@@ -24,8 +24,8 @@ class TestPreprocessImage:
         result = preprocess_image(sample_grayscale_image)
         
         # Assert
-        assert isinstance(result, Image.Image)
-        assert result.mode == 'L'
+        assert isinstance(result, np.ndarray)
+        assert result.ndim == 2
     
     def test_preprocess_image_should_apply_denoising(self, sample_image):
         """Test that preprocess_image applies denoising."""
@@ -33,9 +33,9 @@ class TestPreprocessImage:
         result = preprocess_image(sample_image)
         
         # Assert
-        assert isinstance(result, Image.Image)
+        assert isinstance(result, np.ndarray)
         # Result should be binary (after threshold)
-        assert result.mode == 'L'
+        assert result.dtype == np.uint8
     
     def test_preprocess_image_should_apply_binarization(self, sample_image):
         """Test that preprocess_image applies binarization."""
@@ -43,7 +43,7 @@ class TestPreprocessImage:
         result = preprocess_image(sample_image)
         
         # Assert
-        assert isinstance(result, Image.Image)
+        assert isinstance(result, np.ndarray)
         # After OTSU threshold, image should be binary-like
         arr = np.array(result)
         # Should have mostly 0 and 255 values
@@ -53,14 +53,66 @@ class TestPreprocessImage:
     def test_preprocess_image_should_maintain_image_size(self, sample_image):
         """Test that preprocess_image maintains image size."""
         # Arrange
-        original_size = sample_image.size
+        width, height = sample_image.size
         
         # Act
         result = preprocess_image(sample_image)
         
         # Assert
-        assert result.size == original_size
-
+        assert result.shape == (height, width)
+    
+    
+    def test_preprocess_image_should_accept_grayscale_page_arrays(self):
+        """Test that rasterized grayscale pages are binarized without a color conversion."""
+        # Arrange
+        page = np.full((60, 80), 230, dtype=np.uint8)
+        page[20:40, 10:70] = 20
+        page.setflags(write=False)
+        
+        # Act
+        result = preprocess_image(page)
+        
+        # Assert
+        assert result.shape == (60, 80)
+        assert result[30, 40] == 0
+        assert result[5, 5] == 255
+    
+    def test_preprocess_image_should_binarize_in_the_denoise_buffer(self):
+        """Test that OTSU writes into the denoised array and leaves the input page untouched."""
+        # Arrange
+        import cv2
+        page = np.full((60, 80), 230, dtype=np.uint8)
+        page[20:40, 10:70] = 20
+        original = page.copy()
+        blurred = []
+        real_median_blur = cv2.medianBlur
+        
+        def median_blur(src, ksize):
+            blurred.append(real_median_blur(src, ksize))
+            return blurred[-1]
+        
+        with patch('src.pipeline.preprocess.cv2.medianBlur', side_effect=median_blur):
+            # Act
+            result = preprocess_image(page)
+        
+        # Assert
+        assert result is blurred[0]
+        assert set(np.unique(result)) == {0, 255}
+        assert np.array_equal(page, original)
+    
+    @pytest.mark.parametrize("heavy_denoise, nlm_calls", [(False, 0), (True, 1)])
+    def test_preprocess_image_should_reserve_nlm_for_heavy_denoise(self, sample_image, heavy_denoise, nlm_calls):
+        """Test that Non-Local Means only runs when heavy denoising is requested."""
+        # Arrange
+        import cv2
+        
+        with patch('src.pipeline.preprocess.cv2.fastNlMeansDenoising', wraps=cv2.fastNlMeansDenoising) as mock_nlm:
+            # Act
+            result = preprocess_image(sample_image, heavy_denoise=heavy_denoise)
+            
+            # Assert
+            assert mock_nlm.call_count == nlm_calls
+            assert result.shape == (sample_image.height, sample_image.width)
 
 class TestDeskewImage:
     """Tests for deskew_image function."""
@@ -102,7 +154,7 @@ class TestDeskewImage:
         assert result.shape == original_shape
     
     @patch('src.pipeline.preprocess.cv2.Canny')
-    @patch('src.pipeline.preprocess.cv2.HoughLines')
+    @patch('src.pipeline.preprocess.cv2.HoughLinesP')
     def test_deskew_image_should_handle_no_lines_detected(self, mock_hough, mock_canny):
         """Test that deskew_image handles case when no lines are detected."""
         # Arrange
@@ -116,4 +168,24 @@ class TestDeskewImage:
         # Assert
         assert isinstance(result, np.ndarray)
         assert result.shape == img.shape
-
+    
+    def test_deskew_image_should_rotate_by_the_median_line_angle(self):
+        """Test that deskew_image levels text lines tilted by a few degrees."""
+        # Arrange
+        import cv2
+        img = np.full((400, 600), 255, dtype=np.uint8)
+        slope = np.tan(np.deg2rad(5))
+        for y in range(60, 360, 40):
+            cv2.line(img, (50, y), (550, int(round(y + slope * 500))), 0, 3)
+        
+        # Act
+        with patch(
+            'src.pipeline.preprocess.cv2.getRotationMatrix2D',
+            wraps=cv2.getRotationMatrix2D
+        ) as mock_rotation:
+            result = deskew_image(img)
+        
+        # Assert
+        angle = mock_rotation.call_args[0][1]
+        assert angle == pytest.approx(5, abs=1)
+        assert result.shape == img.shape
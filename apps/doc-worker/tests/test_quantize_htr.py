@@ -0,0 +1,76 @@
+"""Unit tests for quantize_htr."""
+import pytest
+import numpy as np
+import sys
+
+onnx = pytest.importorskip("onnx")
+ort = pytest.importorskip("onnxruntime")
+pytest.importorskip("onnxruntime.quantization")
+
+
+def _build_conv_matmul_model(path):
+    """Save a tiny Conv -> Flatten -> MatMul graph, like the ViT patch embedding."""
+    from onnx import TensorProto, helper, numpy_helper
+    
+    rng = np.random.default_rng(0)
+    conv_w = rng.normal(size=(1, 1, 3, 3)).astype(np.float32)
+    matmul_w = rng.normal(size=(4, 2)).astype(np.float32)
+    graph = helper.make_graph(
+        [
+            helper.make_node('Conv', ['x', 'conv_w'], ['conv']),
+            helper.make_node('Flatten', ['conv'], ['flat']),
+            helper.make_node('MatMul', ['flat', 'matmul_w'], ['y']),
+        ],
+        'tiny',
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, [1, 1, 4, 4])],
+        [helper.make_tensor_value_info('y', TensorProto.FLOAT, [1, 2])],
+        [numpy_helper.from_array(conv_w, 'conv_w'), numpy_helper.from_array(matmul_w, 'matmul_w')],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    onnx.save(model, str(path))
+
+
+class TestQuantizeModel:
+    """Tests for quantize_model."""
+    
+    def test_quantize_model_should_produce_a_loadable_cpu_model(self, tmp_path):
+        """Test that the INT8 model loads on the CPU provider and keeps Conv in FP32."""
+        # Arrange
+        model_path = tmp_path / "encoder.onnx"
+        _build_conv_matmul_model(model_path)
+        x = np.arange(16, dtype=np.float32).reshape(1, 1, 4, 4) / 16
+        
+        if 'src.quantize_htr' in sys.modules:
+            del sys.modules['src.quantize_htr']
+        
+        from src.quantize_htr import quantize_model
+        
+        # Act
+        quantized = quantize_model(str(model_path))
+        
+        # Assert
+        assert quantized is True
+        int8_path = str(model_path) + ".int8"
+        op_types = {node.op_type for node in onnx.load(int8_path).graph.node}
+        assert 'ConvInteger' not in op_types
+        assert 'Conv' in op_types
+        session = ort.InferenceSession(int8_path, providers=['CPUExecutionProvider'])
+        reference = ort.InferenceSession(str(model_path), providers=['CPUExecutionProvider'])
+        np.testing.assert_allclose(
+            session.run(None, {'x': x})[0], reference.run(None, {'x': x})[0], atol=0.1
+        )
+    
+    def test_quantize_model_should_skip_missing_model(self, tmp_path):
+        """Test that quantize_model returns False when the model file does not exist."""
+        # Arrange
+        if 'src.quantize_htr' in sys.modules:
+            del sys.modules['src.quantize_htr']
+        
+        from src.quantize_htr import quantize_model
+        
+        # Act
+        quantized = quantize_model(str(tmp_path / "missing.onnx"))
+        
+        # Assert
+        assert quantized is False
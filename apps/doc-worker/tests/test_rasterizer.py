@@ -1,10 +1,17 @@
 """Unit tests for rasterizer."""
 import pytest
 from unittest.mock import patch, MagicMock
-from PIL import Image
+import numpy as np
 import sys
 
 
+def _render_in_pool_child(pdf_data):
+    """Render pdf_data from inside a billiard pool process (daemonic, like a Celery prefork child)."""
+    import billiard
+    from src.pipeline.rasterizer import Rasterizer
+    return billiard.current_process().daemon, Rasterizer(dpi=72).pdf_to_images(pdf_data)
+
+
 class TestRasterizer:
     """Tests for Rasterizer."""
     
@@ -16,7 +23,8 @@ class TestRasterizer:
         if 'src.settings' in sys.modules:
             del sys.modules['src.settings']
         
-        with patch('src.pipeline.rasterizer.settings') as mock_settings:
+        with patch('src.pipeline.rasterizer.get_settings') as mock_get_settings:
+            mock_settings = mock_get_settings.return_value
             mock_settings.raster_dpi = 300
             from src.pipeline.rasterizer import Rasterizer
             
@@ -35,7 +43,7 @@ class TestRasterizer:
         if 'src.settings' in sys.modules:
             del sys.modules['src.settings']
         
-        with patch('src.pipeline.rasterizer.settings'):
+        with patch('src.pipeline.rasterizer.get_settings'):
             from src.pipeline.rasterizer import Rasterizer
             
             # Act
@@ -46,7 +54,7 @@ class TestRasterizer:
             assert rasterizer.scale == pytest.approx(400.0 / 72.0)
     
     def test_pdf_to_images_should_return_list_of_images(self, sample_pdf_content):
-        """Test that pdf_to_images returns list of PIL Images."""
+        """Test that pdf_to_images returns grayscale page arrays rendered by MuPDF."""
         # Arrange
         if 'src.pipeline.rasterizer' in sys.modules:
             del sys.modules['src.pipeline.rasterizer']
@@ -59,14 +67,16 @@ class TestRasterizer:
             mock_pix = MagicMock()
             mock_pix.width = 100
             mock_pix.height = 100
-            mock_pix.samples = b'\x00' * (100 * 100 * 3)  # RGB bytes
+            mock_pix.n = 1
+            mock_pix.samples = b'\x00' * (100 * 100)  # Grayscale bytes
             mock_page.get_pixmap.return_value = mock_pix
             mock_doc.__len__.return_value = 1
             mock_doc.__getitem__.return_value = mock_page
             mock_fitz.open.return_value = mock_doc
             mock_fitz.Matrix = MagicMock()
             
-            with patch('src.pipeline.rasterizer.settings') as mock_settings:
+            with patch('src.pipeline.rasterizer.get_settings') as mock_get_settings:
+                mock_settings = mock_get_settings.return_value
                 mock_settings.raster_dpi = 300
                 from src.pipeline.rasterizer import Rasterizer
                 rasterizer = Rasterizer()
@@ -77,7 +87,9 @@ class TestRasterizer:
                 # Assert
                 assert isinstance(images, list)
                 assert len(images) == 1
-                assert isinstance(images[0], Image.Image)
+                assert isinstance(images[0], np.ndarray)
+                assert images[0].shape == (100, 100)
+                assert mock_page.get_pixmap.call_args.kwargs['colorspace'] is mock_fitz.csGRAY
                 mock_fitz.open.assert_called_once()
                 mock_doc.close.assert_called_once()
     
@@ -95,14 +107,16 @@ class TestRasterizer:
             mock_pix = MagicMock()
             mock_pix.width = 100
             mock_pix.height = 100
-            mock_pix.samples = b'\x00' * (100 * 100 * 3)
+            mock_pix.n = 1
+            mock_pix.samples = b'\x00' * (100 * 100)
             mock_page.get_pixmap.return_value = mock_pix
             mock_doc.__len__.return_value = 3
             mock_doc.__getitem__.return_value = mock_page
             mock_fitz.open.return_value = mock_doc
             mock_fitz.Matrix = MagicMock()
             
-            with patch('src.pipeline.rasterizer.settings') as mock_settings:
+            with patch('src.pipeline.rasterizer.get_settings') as mock_get_settings:
+                mock_settings = mock_get_settings.return_value
                 mock_settings.raster_dpi = 300
                 from src.pipeline.rasterizer import Rasterizer
                 rasterizer = Rasterizer()
@@ -112,7 +126,7 @@ class TestRasterizer:
                 
                 # Assert
                 assert len(images) == 3
-                assert all(isinstance(img, Image.Image) for img in images)
+                assert all(isinstance(img, np.ndarray) for img in images)
     
     def test_pdf_to_images_should_raise_on_error(self, sample_pdf_content):
         """Test that pdf_to_images raises exception on error."""
@@ -125,7 +139,8 @@ class TestRasterizer:
         with patch('src.pipeline.rasterizer.fitz') as mock_fitz:
             mock_fitz.open.side_effect = Exception("PDF error")
             
-            with patch('src.pipeline.rasterizer.settings') as mock_settings:
+            with patch('src.pipeline.rasterizer.get_settings') as mock_get_settings:
+                mock_settings = mock_get_settings.return_value
                 mock_settings.raster_dpi = 300
                 from src.pipeline.rasterizer import Rasterizer
                 rasterizer = Rasterizer()
@@ -133,4 +148,108 @@ class TestRasterizer:
                 # Act & Assert
                 with pytest.raises(Exception, match="PDF error"):
                     rasterizer.pdf_to_images(sample_pdf_content)
-
+    
+    
+    def test_pdf_to_images_should_render_inside_a_daemonic_worker_process(self):
+        """Test that a multi-page PDF renders inside a Celery (billiard) prefork child, which is daemonic."""
+        # Arrange
+        import billiard
+        import fitz
+        doc = fitz.open()
+        for i in range(3):
+            page = doc.new_page(width=100 + 10 * i, height=100)
+            page.insert_text((10, 50), f"Page {i + 1}")
+        pdf_data = doc.tobytes()
+        doc.close()
+        
+        if 'src.pipeline.rasterizer' in sys.modules:
+            del sys.modules['src.pipeline.rasterizer']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        from src.pipeline.rasterizer import Rasterizer
+        expected = Rasterizer(dpi=72).pdf_to_images(pdf_data)
+        
+        # Act
+        with billiard.Pool(1) as pool:
+            daemonic, rendered = pool.apply_async(_render_in_pool_child, (pdf_data,)).get(timeout=60)
+        
+        # Assert
+        assert daemonic is True
+        assert [img.shape for img in rendered] == [(100, 100), (100, 110), (100, 120)]
+        assert all(np.array_equal(r, e) for r, e in zip(rendered, expected))
+    
+    def test_pdf_to_images_should_render_rgb_when_grayscale_disabled(self):
+        """Test that grayscale=False keeps three channels and matches the gray luminance."""
+        # Arrange
+        import fitz
+        doc = fitz.open()
+        page = doc.new_page(width=100, height=80)
+        page.draw_rect(fitz.Rect(10, 10, 60, 40), color=(1, 0, 0), fill=(1, 0, 0))
+        pdf_data = doc.tobytes()
+        doc.close()
+        
+        if 'src.pipeline.rasterizer' in sys.modules:
+            del sys.modules['src.pipeline.rasterizer']
+        
+        from src.pipeline.rasterizer import Rasterizer
+        
+        # Act
+        rgb = Rasterizer(dpi=72, grayscale=False).pdf_to_images(pdf_data)
+        gray = Rasterizer(dpi=72).pdf_to_images(pdf_data)
+        
+        # Assert
+        assert rgb[0].shape == (80, 100, 3)
+        assert gray[0].shape == (80, 100)
+        assert tuple(rgb[0][20, 20]) == (255, 0, 0)
+        assert gray[0][20, 20] < 128 < gray[0][70, 90]
+    
+    def test_pdf_to_images_should_accept_memoryview(self):
+        """Test that a memoryview over the downloaded buffer is rendered without a bytes copy."""
+        # Arrange
+        import fitz
+        doc = fitz.open()
+        doc.new_page(width=100, height=80)
+        pdf_data = bytearray(doc.tobytes())
+        doc.close()
+        
+        if 'src.pipeline.rasterizer' in sys.modules:
+            del sys.modules['src.pipeline.rasterizer']
+        
+        from src.pipeline.rasterizer import Rasterizer, _as_stream
+        
+        # Act
+        images = Rasterizer(dpi=72).pdf_to_images(memoryview(pdf_data))
+        
+        # Assert
+        assert images[0].shape == (80, 100)
+        assert _as_stream(memoryview(pdf_data)) is pdf_data
+        assert _as_stream(memoryview(pdf_data)[:10]) == bytes(pdf_data[:10])
+    
+    def test_iter_pages_should_yield_pages_lazily_in_order(self):
+        """Test that iter_pages renders on demand and yields pages in document order."""
+        # Arrange
+        import fitz
+        doc = fitz.open()
+        for width in (60, 70, 80):
+            doc.new_page(width=width, height=50)
+        pdf_data = doc.tobytes()
+        doc.close()
+        
+        if 'src.pipeline.rasterizer' in sys.modules:
+            del sys.modules['src.pipeline.rasterizer']
+        
+        from src.pipeline.rasterizer import Rasterizer
+        rasterizer = Rasterizer(dpi=72)
+        
+        # Act
+        with patch.object(fitz.Page, 'get_pixmap', autospec=True, side_effect=fitz.Page.get_pixmap) as mock_render:
+            pages = rasterizer.iter_pages(pdf_data)
+            first = next(pages)
+            rendered_before_rest = mock_render.call_count
+            rest = list(pages)
+        
+        # Assert
+        assert first.shape == (50, 60)
+        assert rendered_before_rest == 1
+        assert [page.shape for page in rest] == [(50, 70), (50, 80)]
@@ -54,6 +54,8 @@ class TestSettings:
         monkeypatch.delenv('CONFIDENCE_THRESHOLD', raising=False)
         monkeypatch.delenv('MODEL_VERSION', raising=False)
         monkeypatch.delenv('WORKER_CONCURRENCY', raising=False)
+        monkeypatch.delenv('WORKER_PREFETCH_MULTIPLIER', raising=False)
+        monkeypatch.delenv('WORKER_MAX_TASKS_PER_CHILD', raising=False)
         monkeypatch.delenv('TASK_ACKS_LATE', raising=False)
         monkeypatch.delenv('TASK_REJECT_ON_WORKER_LOST', raising=False)
         monkeypatch.delenv('TASK_MAX_RETRIES', raising=False)
@@ -69,6 +71,8 @@ class TestSettings:
         assert settings.confidence_threshold == 0.8
         assert settings.model_version == "1.0.0"
         assert settings.worker_concurrency == 4
+        assert settings.worker_prefetch_multiplier == 1
+        assert settings.worker_max_tasks_per_child == 5000
         assert settings.task_acks_late is True
         assert settings.task_reject_on_worker_lost is True
         assert settings.task_max_retries == 3
@@ -128,4 +132,45 @@ class TestSettings:
         
         # Assert
         assert settings.htr_onnx_enable is True
-
+    
+    
+    def test_settings_module_should_import_without_environment(self, monkeypatch):
+        """Test that importing settings is cheap and validation only runs on first use."""
+        # Arrange
+        import sys
+        monkeypatch.delenv('S3_ENDPOINT', raising=False)
+        if 'src.settings' in sys.modules:
+            monkeypatch.delitem(sys.modules, 'src.settings')
+        
+        # Act
+        import src.settings as settings_module
+        
+        # Assert
+        with pytest.raises(ValidationError):
+            settings_module.get_settings()
+    
+    @pytest.mark.parametrize("module", [
+        "src.pipeline.file_loader",
+        "src.pipeline.pdf_loader",
+        "src.pipeline.rasterizer",
+        "src.pipeline.persistence",
+        "src.pipeline.ocr_printed",
+        "src.pipeline.htr_handwritten",
+        "src.quantize_htr",
+    ])
+    def test_pipeline_module_should_import_with_empty_environment(self, module):
+        """Test that pipeline modules import in a clean interpreter with no environment variables."""
+        # Arrange
+        import subprocess
+        import sys
+        from pathlib import Path
+        app_root = Path(__file__).resolve().parent.parent
+        
+        # Act
+        result = subprocess.run(
+            [sys.executable, "-c", f"import {module}"],
+            cwd=app_root, env={}, capture_output=True, text=True, timeout=60
+        )
+        
+        # Assert
+        assert result.returncode == 0, result.stderr
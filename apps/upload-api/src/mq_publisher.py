@@ -21,31 +21,54 @@ class MQPublisher:
             task_serializer='json',
             accept_content=['json'],
             result_serializer='json',
-            task_default_queue='process_document',
+            task_default_queue=settings.queue_name,
             task_routes={
-                'process_document': {'queue': 'process_document'},
+                'process_document': {'queue': settings.queue_name},
             },
         )
         logger.info("Cliente Celery inicializado")
     
+    def select_queue(self, message: Dict[str, Any]) -> str:
+        """
+        Escolhe a fila pela estimativa de páginas do documento.
+        
+        Imagens têm sempre uma página e vão para a fila rápida; PDFs vão
+        para a fila padrão (prefetch 1), exceto os menores que
+        fast_queue_max_pdf_kb.
+        
+        Args:
+            message: Dicionário com dados da mensagem
+        
+        Returns:
+            Nome da fila
+        """
+        content_type = message.get('content_type') or ''
+        if content_type.startswith('image/'):
+            return settings.fast_queue_name
+        file_size = message.get('file_size')
+        if file_size is not None and file_size <= settings.fast_queue_max_pdf_kb * 1024:
+            return settings.fast_queue_name
+        return settings.queue_name
+    
     def publish_message(self, message: Dict[str, Any]) -> bool:
         """
         Publica uma mensagem na fila via Celery.
         
         Args:
             message: Dicionário com dados da mensagem
-            
+        
         Returns:
             True se sucesso, False caso contrário
         """
         try:
             # Chamar a task do worker
+            queue = self.select_queue(message)
             self.celery_app.send_task(
                 'process_document',
                 args=[message],
-                queue='process_document',
+                queue=queue,
             )
-            logger.info(f"Task enfileirada: {message.get('document_id')}")
+            logger.info(f"Task enfileirada: {message.get('document_id')} ({queue})")
             return True
         except Exception as e:
             logger.error(f"Erro ao enfileirar task: {e}")
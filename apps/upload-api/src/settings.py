@@ -33,6 +33,12 @@ class Settings(BaseSettings):
         "image/jpg"
     ]
     
+    # Filas do worker: documentos de uma página vão para a fila rápida,
+    # consumida com prefetch maior
+    queue_name: str = "process_document"
+    fast_queue_name: str = "process_document_fast"
+    fast_queue_max_pdf_kb: int = 0  # PDFs até este tamanho também (0 = apenas imagens)
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -67,6 +67,46 @@ class TestMQPublisher:
                 queue='process_document',
             )
     
+    @pytest.mark.parametrize("content_type, file_size, max_pdf_kb, expected", [
+        ("image/png", 5 * 1024 * 1024, 0, "process_document_fast"),
+        ("application/pdf", 1024, 0, "process_document"),
+        ("application/pdf", 100 * 1024, 256, "process_document_fast"),
+        ("application/pdf", 300 * 1024, 256, "process_document"),
+    ])
+    def test_publish_message_should_route_single_page_documents_to_fast_queue(
+        self, content_type, file_size, max_pdf_kb, expected
+    ):
+        """Test that images (and PDFs under the size threshold) go to the fast queue."""
+        # Arrange
+        mock_celery_app = Mock()
+        
+        if 'src.mq_publisher' in sys.modules:
+            del sys.modules['src.mq_publisher']
+        if 'src.settings' in sys.modules:
+            del sys.modules['src.settings']
+        
+        with patch('src.mq_publisher.Celery', create=True) as mock_celery:
+            mock_celery.return_value = mock_celery_app
+            from src.mq_publisher import MQPublisher, settings
+            publisher = MQPublisher()
+            
+            message = {
+                "document_id": "test-id",
+                "tenant": "test-tenant",
+                "object_key": "test-tenant/test-doc",
+                "sha256": "abc123def456",
+                "file_size": file_size,
+                "content_type": content_type
+            }
+            
+            with patch.object(settings, 'fast_queue_max_pdf_kb', max_pdf_kb):
+                # Act
+                result = publisher.publish_message(message)
+            
+            # Assert
+            assert result is True
+            assert mock_celery_app.send_task.call_args.kwargs['queue'] == expected
+    
     def test_publish_message_should_return_false_on_error(self):
         """Test that publish_message returns False on error."""
         # Arrange
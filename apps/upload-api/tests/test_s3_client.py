@@ -2,16 +2,7 @@
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 import sys
-
-# Mock ClientError if botocore is not available
-try:
-    from botocore.exceptions import ClientError
-except ImportError:
-    class ClientError(Exception):
-        def __init__(self, error_response, operation_name):
-            self.error_response = error_response
-            self.operation_name = operation_name
-            super().__init__(f"{operation_name}: {error_response}")
+from botocore.exceptions import ClientError
 
 
 class TestS3Client:
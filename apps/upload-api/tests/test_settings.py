@@ -52,6 +52,7 @@ class TestSettings:
         monkeypatch.delenv('APP_VERSION', raising=False)
         monkeypatch.delenv('MAX_FILE_SIZE_MB', raising=False)
         monkeypatch.delenv('ALLOWED_CONTENT_TYPES', raising=False)
+        monkeypatch.delenv('FAST_QUEUE_MAX_PDF_KB', raising=False)
         
         # Act
         settings = Settings()
@@ -68,6 +69,9 @@ class TestSettings:
             "image/jpeg",
             "image/jpg",
         ]
+        assert settings.queue_name == "process_document"
+        assert settings.fast_queue_name == "process_document_fast"
+        assert settings.fast_queue_max_pdf_kb == 0
     
     def test_settings_should_require_required_fields(self, monkeypatch):
         """Test that Settings requires all mandatory fields."""
@@ -48,3 +48,54 @@ app.kubernetes.io/name: {{ include "doc-worker.name" . }}
 app.kubernetes.io/instance: {{ .Release.Name }}
 {{- end }}
 
+
+{{/*
+Environment shared by the worker deployments (WORKER_PREFETCH_MULTIPLIER is set by each one)
+*/}}
+{{- define "doc-worker.env" -}}
+- name: S3_ENDPOINT
+  value: {{ .Values.env.S3_ENDPOINT | quote }}
+- name: S3_BUCKET
+  value: {{ .Values.env.S3_BUCKET | quote }}
+- name: S3_REGION
+  value: {{ .Values.env.S3_REGION | quote }}
+- name: S3_ACCESS_KEY
+  valueFrom:
+    secretKeyRef:
+      name: {{ include "doc-worker.fullname" . }}-secrets
+      key: S3_ACCESS_KEY
+- name: S3_SECRET_KEY
+  valueFrom:
+    secretKeyRef:
+      name: {{ include "doc-worker.fullname" . }}-secrets
+      key: S3_SECRET_KEY
+- name: RABBITMQ_URI
+  value: {{ .Values.env.RABBITMQ_URI | quote }}
+- name: DATABASE_URL
+  valueFrom:
+    secretKeyRef:
+      name: {{ include "doc-worker.fullname" . }}-secrets
+      key: DATABASE_URL
+- name: RASTER_DPI
+  value: {{ .Values.env.RASTER_DPI | quote }}
+- name: OCR_LANGS
+  value: {{ .Values.env.OCR_LANGS | quote }}
+- name: HTR_ONNX_ENABLE
+  value: {{ .Values.env.HTR_ONNX_ENABLE | quote }}
+- name: CONFIDENCE_THRESHOLD
+  value: {{ .Values.env.CONFIDENCE_THRESHOLD | quote }}
+- name: MODEL_VERSION
+  value: {{ .Values.env.MODEL_VERSION | quote }}
+- name: WORKER_CONCURRENCY
+  value: {{ .Values.env.WORKER_CONCURRENCY | quote }}
+- name: WORKER_MAX_TASKS_PER_CHILD
+  value: {{ .Values.env.WORKER_MAX_TASKS_PER_CHILD | quote }}
+{{- end }}
+
+{{/*
+Selector labels of the fast-queue worker
+*/}}
+{{- define "doc-worker.fastSelectorLabels" -}}
+app.kubernetes.io/name: {{ include "doc-worker.name" . }}-fast
+app.kubernetes.io/instance: {{ .Release.Name }}
+{{- end }}